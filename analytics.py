@@ -0,0 +1,209 @@
+"""
+Revenue analytics of the sales history: revenue per dish, 7- and 28-day moving averages of the daily revenue,
+weekday profiles, an ABC (Pareto) ranking of the dishes and the change against the period before.
+
+The whole history is read once into a dishes x days matrix of units sold (SalesHistory.load), every analysis is
+then a few NumPy reductions over a slice of it, so changing the date range costs milliseconds even over years of
+data. Analytics memoizes the history and the analyses by data version and date range. Archived years are only
+read once a range reaches back into them, see archive.py. Nothing here imports Qt.
+"""
+from collections import OrderedDict
+from datetime import date, timedelta
+
+import numpy as np
+
+from archive import use_archives
+
+SQL_SELECT_DISHES = "SELECT id, name, price FROM dish ORDER BY id;"
+
+SQL_SELECT_DAY_RANGE = "SELECT MIN(date), MAX(date) FROM dish_data WHERE date IS NOT NULL;"
+
+# Per dish its days, counted from the first one, and what it sold on them as two comma separated lists: NumPy parses
+# those a lot faster than Python takes one row per sale from SQLite. GROUP_CONCAT skips NULLs, so a NULL sell_num
+# counts as 0 rather than shifting the later numbers onto the wrong days
+SQL_SELECT_DAILY_SALES = """
+    SELECT dish_id, GROUP_CONCAT(CAST(julianday(date) - julianday(?) AS INTEGER)), GROUP_CONCAT(COALESCE(sell_num, 0))
+    FROM dish_data
+    WHERE date IS NOT NULL
+    GROUP BY dish_id;"""
+
+MOVING_AVERAGE_DAYS = (7, 28)
+# Shares of the revenue made by the A dishes, and by the A and B dishes together
+ABC_LIMITS = (0.8, 0.95)
+
+
+def window_start(start, end):
+    # First day an analysis of [start, end] reads: early enough for the moving averages and the period before
+    return start - timedelta(days=max(max(MOVING_AVERAGE_DAYS) - 1, (end - start).days + 1))
+
+
+def moving_average(daily, days, valid_from):
+    # Mean over the days days up to each day, NaN where those reach back before the first valid day
+    sums = np.cumsum(np.concatenate(([0.0], daily)))
+    averages = np.full(len(daily), np.nan)
+    averages[days - 1:] = (sums[days:] - sums[:-days]) / days
+    averages[:max(valid_from + days - 1, 0)] = np.nan
+    return averages
+
+
+def abc_classes(revenue):
+    """'A', 'B' or 'C' per dish: A the best sellers making ABC_LIMITS[0] of the revenue, C those past [1]."""
+    order = np.argsort(-revenue, kind="stable")
+    total = revenue.sum()
+    shares = revenue[order] / total if total > 0 else np.zeros(len(revenue))
+    # Share of the revenue made before each dish, so the dish crossing a limit still belongs to the class below it
+    before = np.cumsum(shares) - shares
+    classes = np.full(len(revenue), "C")
+    classes[order[before < ABC_LIMITS[1]]] = "B"
+    classes[order[before < ABC_LIMITS[0]]] = "A"
+    classes[revenue <= 0] = "C"
+    return classes
+
+
+class SalesHistory:
+    """
+    Units sold per dish (rows, in the order of dish_ids) and day (columns, from first_day on) at data version
+    version, with the names and prices of the dishes. Days before covered_from, unless None, are in archives the
+    history was loaded without.
+    """
+    def __init__(self, version, dish_ids, names, prices, first_day, units, covered_from=None):
+        self.version = version
+        self.covered_from = covered_from
+        self.dish_ids = dish_ids
+        self.names = names
+        self.prices = prices
+        self.first_day = first_day
+        self.units = units
+
+    @classmethod
+    def load(cls, connection, version, since=None):
+        # Every archived year from the one of since on is read along, all of them for None
+        covered_from = use_archives(connection, since)
+        dishes = connection.execute(SQL_SELECT_DISHES).fetchall()
+        dish_ids = np.array([row[0] for row in dishes], dtype=np.int64)
+        names = [row[1] for row in dishes]
+        prices = np.array([row[2] for row in dishes], dtype=np.float64)
+        first, last = connection.execute(SQL_SELECT_DAY_RANGE).fetchone()
+        if first is None:
+            return cls(version, dish_ids, names, prices, date.today(), np.zeros((len(dishes), 0), dtype=np.int64),
+                       covered_from)
+        first_day = date.fromisoformat(first)
+        units = np.zeros((len(dishes), (date.fromisoformat(last) - first_day).days + 1), dtype=np.int64)
+        for dish_id, days, sell_nums in connection.execute(SQL_SELECT_DAILY_SALES, (first,)):
+            row = np.searchsorted(dish_ids, dish_id)
+            if row < len(dish_ids) and dish_ids[row] == dish_id:
+                days = np.fromstring(days, dtype=np.int64, sep=",")
+                sell_nums = np.fromstring(sell_nums, dtype=np.int64, sep=",")
+                if len(days) != len(sell_nums):
+                    raise ValueError("Dish {} has {} sales days but {} numbers sold".format(
+                        dish_id, len(days), len(sell_nums)))
+                units[row, days] = sell_nums
+        return cls(version, dish_ids, names, prices, first_day, units, covered_from)
+
+    def window(self, start, end):
+        """Units of the days [start, end] as a dishes x days matrix, zero for the days without any history."""
+        first = (start - self.first_day).days
+        last = (end - self.first_day).days
+        window = np.zeros((len(self.dish_ids), last - first + 1), dtype=np.int64)
+        low, high = max(first, 0), min(last, self.units.shape[1] - 1)
+        if low <= high:
+            window[:, low - first:high - first + 1] = self.units[:, low:high + 1]
+        return window
+
+    def covers(self, start, end):
+        return self.covered_from is None or window_start(start, end) >= self.covered_from
+
+    def analyze(self, start, end):
+        return Analysis(self, start, end)
+
+
+class Analysis:
+    """Everything the analytics tab shows for the days [start, end], computed from a SalesHistory."""
+    def __init__(self, history, start, end):
+        self.start = start
+        self.end = end
+        self.dish_ids = history.dish_ids
+        self.names = history.names
+        self.prices = history.prices
+        days = (end - start).days + 1
+        first = window_start(start, end)
+        units = history.window(first, end)
+        current = units[:, -days:]
+        previous = units[:, -2 * days:-days]
+
+        self.units = current.sum(axis=1)
+        self.revenue = self.units * self.prices
+        self.total_units = int(self.units.sum())
+        self.total_revenue = float(self.revenue.sum())
+        self.previous_revenue = previous.sum(axis=1) * self.prices
+        self.revenue_delta = self.revenue - self.previous_revenue
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.revenue_change = np.where(self.previous_revenue > 0, self.revenue_delta / self.previous_revenue,
+                                           np.nan)
+        self.total_previous_revenue = float(self.previous_revenue.sum())
+
+        self.days = [start + timedelta(days=day) for day in range(days)]
+        daily = self.prices @ units
+        self.daily_revenue = daily[-days:]
+        # Days of the window before the history starts have no data, not zero sales
+        valid_from = (history.first_day - first).days
+        self.moving_averages = {
+            average_days: moving_average(daily, average_days, valid_from)[-days:]
+            for average_days in MOVING_AVERAGE_DAYS
+        }
+
+        weekdays = (np.arange(days) + start.weekday()) % 7
+        day_counts = np.bincount(weekdays, minlength=7)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.weekday_revenue = np.bincount(weekdays, weights=self.daily_revenue, minlength=7) / day_counts
+            # Mean units of each dish per weekday, dishes x 7
+            self.weekday_units = (current @ np.eye(7)[weekdays]) / day_counts
+        # Weekdays the range does not include are NaN, which argmax would pick
+        self.peak_weekdays = np.where(self.units > 0, np.argmax(np.nan_to_num(self.weekday_units, nan=-1), axis=1), -1)
+
+        self.abc = abc_classes(self.revenue)
+        self.shares = self.revenue / self.total_revenue if self.total_revenue > 0 else np.zeros(len(self.revenue))
+
+    def ranking(self):
+        """Row indexes of the dishes by revenue, highest first."""
+        return np.argsort(-self.revenue, kind="stable")
+
+
+class Analytics:
+    """
+    The last loaded SalesHistory and the latest CACHE_SIZE analyses, by data version and date range. The version
+    is whatever the caller counts changes of the data with; clear() when the data source itself changes.
+    """
+    CACHE_SIZE = 16
+
+    def __init__(self):
+        self.history = None
+        self.analyses = OrderedDict()
+
+    def cached(self, version, start, end):
+        """
+        The analysis of [start, end] at version if known or quick to compute, None if the history must be loaded,
+        from window_start(start, end) on.
+        """
+        key = (version, start, end)
+        if key in self.analyses:
+            self.analyses.move_to_end(key)
+            return self.analyses[key]
+        if self.history is None or self.history.version != version or not self.history.covers(start, end):
+            return None
+        return self.store(key, self.history.analyze(start, end))
+
+    def loaded(self, history, start, end):
+        if self.history is None or history.version >= self.history.version:
+            self.history = history
+        return self.store((history.version, start, end), history.analyze(start, end))
+
+    def store(self, key, analysis):
+        self.analyses[key] = analysis
+        while len(self.analyses) > self.CACHE_SIZE:
+            self.analyses.popitem(last=False)
+        return analysis
+
+    def clear(self):
+        self.history = None
+        self.analyses.clear()
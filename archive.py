@@ -0,0 +1,237 @@
+"""
+Yearly archives of the sales: closed years of dish_data move out of restaurant.db into files of their own, like
+restaurant-archive-2023.db next to it, so the live database only holds the years still being worked on.
+
+    python archive.py restaurant.db --through 2023
+
+An archive holds the dish_data rows of its year and the weekly and monthly rollups of just those rows, so a week
+across the new year has a part in both files and the parts add up. The live database lists its archives in the
+sales_archive table, and its triggers refuse sales of archived years (see database.py, migration 6).
+
+Reading a date range, use_archives attaches the archives of the years it reaches into, read-only, behind temporary
+views named like the tables, as branches.py does for branches, so the queries read them unchanged; a range within
+the live years detaches them again and reads the tables themselves. Writes go to main.dish_data explicitly, past
+the views. Connections without the sales_archive table, like the merged branches, read no archives.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import date
+
+import database
+
+ARCHIVE_FILE = "{stem}-archive-{year}.db"
+# PRAGMA application_id of the archive files, so an unfinished one is told apart from any other file
+ARCHIVE_APPLICATION_ID = 0x52414131
+ARCHIVE_SCHEMA_NAME = "archive{}"
+
+SQL_ARCHIVE_SCHEMA = [
+    """ CREATE TABLE dish_data (
+            dish_id integer NOT NULL,
+            date date NOT NULL,
+            sell_num integer DEFAULT 0,
+            PRIMARY KEY (dish_id, date)
+        ); """,
+    "CREATE INDEX dish_data_date_idx ON dish_data (date, dish_id, sell_num)",
+    """ CREATE TABLE dish_sales_weekly (
+            dish_id integer NOT NULL,
+            week date NOT NULL,
+            sell_num integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (dish_id, week)
+        ); """,
+    """ CREATE TABLE dish_sales_monthly (
+            dish_id integer NOT NULL,
+            month text NOT NULL,
+            sell_num integer NOT NULL DEFAULT 0,
+            PRIMARY KEY (dish_id, month)
+        ); """,
+    "CREATE INDEX dish_sales_weekly_week_idx ON dish_sales_weekly (week, dish_id, sell_num)",
+    "CREATE INDEX dish_sales_monthly_month_idx ON dish_sales_monthly (month, dish_id, sell_num)",
+]
+
+# Columns of the tables the archives split by year, the views over them have the same
+ARCHIVED_TABLES = {
+    "dish_data": "dish_id, date, sell_num",
+    "dish_sales_weekly": "dish_id, week, sell_num",
+    "dish_sales_monthly": "dish_id, month, sell_num",
+}
+
+SQL_SELECT_ARCHIVES = "SELECT year, file FROM sales_archive ORDER BY year;"
+
+SQL_HAS_ARCHIVES = "SELECT EXISTS (SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'sales_archive');"
+
+
+def archive_file(db_file, year):
+    stem = os.path.splitext(os.path.basename(db_file))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), ARCHIVE_FILE.format(stem=stem, year=year))
+
+
+def main_file(connection):
+    return connection.execute("PRAGMA database_list").fetchone()[2]
+
+
+def archives(connection):
+    """(year, file) of every archived year of the database connection has open, oldest first."""
+    if not connection.execute(SQL_HAS_ARCHIVES).fetchone()[0]:
+        return []
+    directory = os.path.dirname(main_file(connection))
+    return [(year, os.path.join(directory, file)) for year, file in connection.execute(SQL_SELECT_ARCHIVES)]
+
+
+def attached_years(connection):
+    prefix = ARCHIVE_SCHEMA_NAME.format("")
+    return [int(name[len(prefix):]) for _, name, _ in connection.execute("PRAGMA database_list")
+            if name.startswith(prefix) and name[len(prefix):].isdigit()]
+
+
+def attach(connection, year_files):
+    # Replace the attached archives and the views over them by those of year_files
+    for table in ARCHIVED_TABLES:
+        connection.execute("DROP VIEW IF EXISTS temp.{}".format(table))
+    for year in attached_years(connection):
+        connection.execute("DETACH DATABASE " + ARCHIVE_SCHEMA_NAME.format(year))
+    if not year_files:
+        return
+    limit = connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    if len(year_files) > limit:
+        raise sqlite3.DatabaseError("At most {} archived years can be read together, got {}".format(
+            limit, len(year_files)))
+    for year, file in year_files:
+        if not os.path.exists(file):
+            raise sqlite3.OperationalError("The archive of {} is missing: {}".format(year, file))
+        connection.execute("ATTACH DATABASE ? AS " + ARCHIVE_SCHEMA_NAME.format(year), (database.readonly_uri(file),))
+    for table, columns in ARCHIVED_TABLES.items():
+        connection.execute("CREATE TEMP VIEW {} AS {}".format(table, "\nUNION ALL\n".join(
+            "SELECT {} FROM {}.{}".format(columns, schema, table)
+            for schema in ["main"] + [ARCHIVE_SCHEMA_NAME.format(year) for year, _ in year_files])))
+
+
+def use_archives(connection, start=None, end=None):
+    """
+    Let the sales on connection include the archived years [start, end] reaches into, None for no limit, and no
+    other archived year. Returns the first day from which on no sales are missing, None if none are.
+    """
+    year_files = archives(connection)
+    wanted = [(year, file) for year, file in year_files
+              if (start is None or year >= start.year) and (end is None or year <= end.year)]
+    if [year for year, _ in wanted] != attached_years(connection):
+        attach(connection, wanted)
+    earlier = [year for year, _ in year_files if start is not None and year < start.year]
+    return date(earlier[-1] + 1, 1, 1) if earlier else None
+
+
+def write_archive(file, rows):
+    # A file of that name is only replaced when it is an archive left unfinished, no year refers to it then
+    if os.path.exists(file):
+        existing = sqlite3.connect(database.readonly_uri(file), uri=True)
+        try:
+            application_id = existing.execute("PRAGMA application_id").fetchone()[0]
+        except sqlite3.DatabaseError:
+            application_id = None
+        finally:
+            existing.close()
+        if application_id != ARCHIVE_APPLICATION_ID:
+            raise sqlite3.DatabaseError("{} exists and is not an archive, move it away first".format(file))
+        os.remove(file)
+    connection = sqlite3.connect(file)
+    try:
+        connection.execute("PRAGMA application_id = {:d}".format(ARCHIVE_APPLICATION_ID))
+        for statement in SQL_ARCHIVE_SCHEMA:
+            connection.execute(statement)
+        connection.executemany("INSERT INTO dish_data (dish_id, date, sell_num) VALUES (?, ?, ?)", rows)
+        for statement in database.SQL_REBUILD_ROLLUPS:
+            connection.execute(statement)
+        connection.commit()
+    finally:
+        connection.close()
+
+
+def archive_year(connection, year):
+    """
+    Move the sales of year from the database of connection, a database.connect one, into its archive file.
+    Returns the number of rows moved, 0 when there were none and nothing changed.
+
+    The live database stays locked for writing meanwhile, so nothing entered for that year gets lost. The archive
+    is written completely before the rows are deleted, in one transaction with the rollup rebuild and the
+    registration, and a year is only read from its archive once that transaction is committed.
+    """
+    first, last = date(year, 1, 1), date(year, 12, 31)
+    if last >= date.today():
+        raise ValueError("{} is not over yet".format(year))
+    db_file = main_file(connection)
+    file = archive_file(db_file, year)
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        if connection.execute("SELECT 1 FROM sales_archive WHERE year = ?", (year,)).fetchone():
+            raise ValueError("{} is archived already".format(year))
+        rows = connection.execute("SELECT dish_id, date, sell_num FROM main.dish_data WHERE date BETWEEN ? AND ?",
+                                  (first.isoformat(), last.isoformat())).fetchall()
+        if not rows:
+            connection.rollback()
+            return 0
+        write_archive(file, rows)
+        # The rollups of the year's weeks and months are rebuilt once, not row by row by the triggers
+        suspension_id = connection.execute(
+            "INSERT INTO rollup_suspension (started) VALUES (date('now', 'localtime'))").lastrowid
+        connection.execute("DELETE FROM main.dish_data WHERE date BETWEEN ? AND ?",
+                           (first.isoformat(), last.isoformat()))
+        for statement, params in database.rollup_rebuild_statements(first, last):
+            connection.execute(statement, params)
+        # The days of the year are rebuilt already, they need not be again when another suspension resumes
+        connection.execute("DELETE FROM rollup_dirty WHERE date BETWEEN ? AND ?", (first.isoformat(), last.isoformat()))
+        connection.execute("DELETE FROM rollup_suspension WHERE id = ?", (suspension_id,))
+        connection.execute("INSERT INTO sales_archive (year, file, archived) VALUES (?, ?, date('now', 'localtime'))",
+                           (year, os.path.basename(file)))
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+    return len(rows)
+
+
+def vacuum(connection):
+    """Give the space of the moved rows back to the file system."""
+    connection.execute("VACUUM")
+    connection.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move the sales of closed years into yearly archive files")
+    parser.add_argument("db_file", nargs="?", default="restaurant.db")
+    parser.add_argument("--through", type=int, default=date.today().year - 1,
+                        help="last year to archive, every year before it is too (default: last year)")
+    parser.add_argument("--no-vacuum", action="store_true", help="leave the live database at its size")
+    args = parser.parse_args(argv)
+    if args.through >= date.today().year:
+        parser.error("--through must be a year that is over")
+    connection = database.connect(args.db_file)
+    try:
+        archived = {year for year, _ in archives(connection)}
+        first = connection.execute("SELECT MIN(date) FROM main.dish_data WHERE date IS NOT NULL").fetchone()[0]
+        years = range(date.fromisoformat(first).year, args.through + 1) if first else []
+        moved = 0
+        for year in years:
+            if year in archived:
+                continue
+            rows = archive_year(connection, year)
+            if rows:
+                print("{}: {} rows -> {}".format(year, rows, archive_file(args.db_file, year)))
+            moved += rows
+        if moved and not args.no_vacuum:
+            before = os.path.getsize(args.db_file)
+            vacuum(connection)
+            print("{}: {:.1f} MiB -> {:.1f} MiB".format(args.db_file, before / 2 ** 20,
+                                                       os.path.getsize(args.db_file) / 2 ** 20))
+        if not moved:
+            print("nothing to archive through {}".format(args.through))
+    except (sqlite3.Error, ValueError) as error:
+        print(error, file=sys.stderr)
+        return 1
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""
+Benchmarks of the main window on a generated restaurant.db, run headless:
+
+    python benchmark.py --dishes 200 --days 365 --density 0.5 --save-baseline baseline.json
+    python benchmark.py --dishes 200 --days 365 --density 0.5 --compare baseline.json
+
+Every case drives the same methods the window calls on user input and waits until the worker thread has answered.
+A case is timed over --repeat runs and its median wall time is reported, then it runs once more under tracemalloc
+for its peak Python memory. --compare marks the cases that got slower than the baseline by more than --tolerance
+and exits with status 1 if there are any.
+"""
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import argparse
+import json
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtWidgets import QApplication
+
+import database
+
+
+def generate_db(db_file, dishes=100, days=365, density=0.6, seed=0):
+    """
+    Fill db_file with dishes dishes and their sales over the days days up to today. Each dish sold on a day with
+    probability density, 1 to 50 of it.
+    """
+    rng = random.Random(seed)
+    connection = database.connect(db_file)
+    try:
+        connection.executemany("INSERT INTO dish(name, price, remarks) VALUES (?, ?, ?)",
+                               (("菜品{}".format(dish_idx), rng.randint(500, 20000) / 100, "备注{}".format(dish_idx))
+                                for dish_idx in range(dishes)))
+        connection.commit()
+        dish_ids = [row[0] for row in connection.execute("SELECT id FROM dish ORDER BY id")]
+        last = date.today()
+        first = last - timedelta(days=days - 1)
+        # Bulk writes skip the rollup triggers, the rollups are rebuilt once at the end
+        suspension_id = database.suspend_rollups(connection)
+        connection.executemany(database.SQL_UPSERT_DISH_DATA, (
+            (dish_id, (first + timedelta(days=day_idx)).isoformat(), rng.randint(1, 50))
+            for day_idx in range(days) for dish_id in dish_ids if rng.random() < density))
+        connection.commit()
+        database.resume_rollups(connection, suspension_id, first, last)
+        return connection.execute("SELECT COUNT(*) FROM dish_data").fetchone()[0]
+    finally:
+        connection.close()
+
+
+class Case:
+    """A benchmark: run is timed, setup and teardown run before and after each timed run."""
+    def __init__(self, name, run, setup=None, teardown=None):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+
+
+class Bench:
+    def __init__(self, app, db_file):
+        import main
+        self.app = app
+        self.main = main
+        main.MainWindow.DB_FILE = db_file
+        self.window = None
+        self.new_window = None
+
+    def wait(self, window=None, timeout=60):
+        # Let the queued results arrive until the worker has nothing left to answer
+        window = window or self.window
+        deadline = time.perf_counter() + timeout
+        while True:
+            self.app.processEvents()
+            if window.startup_ms is not None and not window.db_worker.is_busy():
+                self.app.processEvents()
+                if not window.db_worker.is_busy():
+                    return
+            if time.perf_counter() > deadline:
+                raise RuntimeError("The database worker did not finish within {} s".format(timeout))
+            time.sleep(0.001)
+
+    def open_window(self):
+        window = self.main.MainWindow()
+        window.show()
+        self.wait(window)
+        return window
+
+    def close_window(self, window):
+        window.close()
+        self.app.processEvents()
+
+    def reset_filters(self):
+        self.window.dish_lineEdit.clear()
+        self.window.data_lineEdit.clear()
+        dish_proxy = self.window.dish_table_proxy
+        dish_proxy.set_col_number_filter(2, 0, 0)
+        dish_proxy.set_col_number_filter(3, 0, 0)
+        data_proxy = self.window.dish_data_table_proxy
+        data_proxy.set_col_date_filter(1, QDate.currentDate().addDays(-7), QDate.currentDate())
+        data_proxy.set_col_number_filter(3, 0, 0)
+        data_proxy.set_col_number_filter(4, 0, 0)
+        data_proxy.apply_sql_filter()
+        dish_proxy.sort(-1)
+        # The data table is ordered by the database, newest first unless sorted otherwise
+        data_proxy.sort(1, Qt.DescendingOrder)
+        self.wait()
+
+    def sql_filter(self, set_filter):
+        # Skip the debounce of typing, the query is what is measured
+        def run():
+            set_filter(self.window.dish_data_table_proxy)
+            self.window.dish_data_table_proxy.apply_sql_filter()
+            self.wait()
+        return run
+
+    def search(self, line_edit_name, text):
+        # From typing to the table filtered by the dishes found, searched afresh instead of read from the cache
+        def run():
+            self.window.search_cache.clear()
+            getattr(self.window, line_edit_name).setText(text)
+            self.wait()
+            self.window.dish_data_table_proxy.apply_sql_filter()
+            self.wait()
+        return run
+
+    def local_filter(self, set_filter):
+        def run():
+            set_filter(self.window.dish_table_proxy)
+            self.window.dish_table_proxy.rowCount()
+        return run
+
+    def sort(self, proxy_name, col):
+        def run():
+            getattr(self.window, proxy_name).sort(col, Qt.AscendingOrder)
+            self.wait()
+        return run
+
+    def check_all(self, state):
+        self.window.data_table_check_state(state, 5)
+        self.wait()
+
+    def show_graph(self):
+        self.window.tabWidget.setCurrentWidget(self.window.graph_tab)
+        while self.window.sales_chart.render_timer.isActive():
+            self.app.processEvents()
+
+    def show_analytics(self):
+        self.window.tabWidget.setCurrentWidget(self.window.analytics_tab)
+        self.wait()
+
+    def hide_analytics(self, forget=True):
+        self.window.tabWidget.setCurrentIndex(0)
+        if forget:
+            self.window.analytics.clear()
+        self.window.shown_analysis = None
+
+    def change_analytics_range(self):
+        # A range not analyzed yet, from the memoized history
+        self.window.lower_analytics_dateEdit.setDate(self.window.lower_analytics_dateEdit.date().addDays(-1))
+        self.wait()
+
+    def hide_graph(self):
+        self.window.tabWidget.setCurrentIndex(0)
+        # Choose the rows again so the chart has everything to redraw
+        self.check_all(0)
+        self.check_all(2)
+        self.app.processEvents()
+
+    def fill_new_dish_data(self):
+        self.window.modify_new_dish_data_popup_table()
+        self.wait()
+        model = self.window.new_dish_data_model
+        rng = random.Random(model.rowCount())
+        for row in range(model.rowCount()):
+            model.setData(model.index(row, model.SELL_NUM_COLUMN), rng.randint(0, 50))
+
+    def open_new_dish_data(self):
+        self.window.modify_new_dish_data_popup_table(show=True)
+        self.wait()
+
+    def close_new_dish_data(self, forget=True):
+        self.window.new_dish_data_popup.hide()
+        if forget:
+            self.window.new_dish_data_model.cache.clear()
+
+    def step_new_dish_data_date(self):
+        # To the day before, fetched ahead while the day shown was
+        date_edit = self.window.new_dish_data_popup.dateEdit
+        date_edit.setDate(date_edit.date().addDays(-1))
+        day = date_edit.date().toString("yyyy-MM-dd")
+        while self.window.new_dish_data_model.date != day:
+            self.app.processEvents()
+
+    def save_new_dish_data(self):
+        self.window.create_new_dish_data()
+        # Through to the rows written, not just queued
+        self.window.sales_queue.flush()
+        self.wait()
+
+    def start_window(self):
+        self.new_window = self.main.MainWindow()
+        self.new_window.show()
+        while self.new_window.startup_ms is None:
+            self.app.processEvents()
+
+    def stop_window(self):
+        self.wait(self.new_window)
+        self.close_window(self.new_window)
+        self.new_window = None
+
+    def cases(self):
+        window = self.window
+        days_ago = QDate.currentDate().addDays(-30)
+        cases = [
+            Case("first_paint", self.start_window, teardown=self.stop_window),
+            Case("load_dish_table", lambda: (window.load_dish_table(), self.wait())),
+            Case("load_dish_data_table", lambda: (window.load_dish_data_table(), self.wait())),
+            Case("filter_dish_name", self.search("dish_lineEdit", "1"), self.reset_filters),
+            Case("filter_dish_price", self.local_filter(lambda proxy: proxy.set_col_number_filter(2, 20, 100)),
+                 self.reset_filters),
+            Case("filter_dish_sell_num", self.local_filter(lambda proxy: proxy.set_col_number_filter(3, 10, 200)),
+                 self.reset_filters),
+            Case("filter_data_date", self.sql_filter(lambda proxy: proxy.set_col_date_filter(1, days_ago, -1)),
+                 self.reset_filters),
+            Case("filter_data_name", self.search("data_lineEdit", "1"), self.reset_filters),
+            Case("filter_data_price", self.sql_filter(lambda proxy: proxy.set_col_number_filter(3, 20, 100)),
+                 self.reset_filters),
+            Case("filter_data_sell_num", self.sql_filter(lambda proxy: proxy.set_col_number_filter(4, 10, 40)),
+                 self.reset_filters),
+        ]
+        for col, col_name in [(1, "name"), (2, "price"), (3, "sell_num"), (5, "remarks")]:
+            cases.append(Case("sort_dish_" + col_name, self.sort("dish_table_proxy", col), self.reset_filters))
+        for col, col_name in [(1, "date"), (2, "name"), (3, "price"), (4, "sell_num")]:
+            cases.append(Case("sort_data_" + col_name, self.sort("dish_data_table_proxy", col), self.reset_filters))
+        cases += [
+            Case("data_table_check_state", lambda: self.check_all(2), lambda: self.check_all(0)),
+            Case("data_table_invert_check", lambda: self.check_all(None), lambda: self.check_all(0)),
+            Case("update_graph", self.show_graph, self.hide_graph),
+            Case("analytics_load", self.show_analytics, teardown=self.hide_analytics),
+            Case("analytics_range", self.change_analytics_range, self.show_analytics,
+                 lambda: self.hide_analytics(forget=False)),
+            Case("new_dish_data_open", self.open_new_dish_data, teardown=self.close_new_dish_data),
+            Case("new_dish_data_step_date", self.step_new_dish_data_date, self.open_new_dish_data,
+                 lambda: self.close_new_dish_data(forget=False)),
+            Case("create_new_dish_data", self.save_new_dish_data, self.fill_new_dish_data),
+        ]
+        return cases
+
+    def measure(self, case, repeat):
+        times = []
+        for _ in range(repeat + 1):
+            if case.setup is not None:
+                case.setup()
+            traced = len(times) == repeat
+            if traced:
+                tracemalloc.start()
+            start = time.perf_counter()
+            case.run()
+            elapsed = time.perf_counter() - start
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+            else:
+                times.append(elapsed)
+            if case.teardown is not None:
+                case.teardown()
+        return {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000, "peak_kib": peak / 1024}
+
+    def run(self, repeat=5, only=None):
+        self.window = self.open_window()
+        results = {}
+        try:
+            for case in self.cases():
+                if only and case.name not in only:
+                    continue
+                results[case.name] = self.measure(case, repeat)
+                print_result(case.name, results[case.name])
+        finally:
+            self.close_window(self.window)
+        return results
+
+
+def print_result(name, result, baseline=None, tolerance=0.2):
+    line = "{:<24} {:>10.2f} ms {:>10.2f} ms {:>10.0f} KiB".format(
+        name, result["median_ms"], result["min_ms"], result["peak_kib"])
+    if baseline is not None and name in baseline:
+        ratio = result["median_ms"] / max(baseline[name]["median_ms"], 1e-6)
+        line += "  {:>6.2f}x{}".format(ratio, "  REGRESSION" if ratio > 1 + tolerance else "")
+    print(line, flush=True)
+
+
+def compare(results, baseline, tolerance):
+    print("\n{:<24} {:>13} {:>13} {:>14}  vs baseline".format("case", "median", "min", "peak memory"))
+    regressions = []
+    for name, result in results.items():
+        print_result(name, result, baseline["results"], tolerance)
+        if name in baseline["results"] and \
+                result["median_ms"] > baseline["results"][name]["median_ms"] * (1 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Time the main window on generated data")
+    parser.add_argument("--dishes", type=int, default=100, help="number of dishes (default: %(default)s)")
+    parser.add_argument("--days", type=int, default=365, help="days of sales up to today (default: %(default)s)")
+    parser.add_argument("--density", type=float, default=0.6,
+                        help="chance that a dish sold on a day (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db", help="keep the generated database here, it is reused if it exists")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (default: %(default)s)")
+    parser.add_argument("--case", action="append", dest="cases", help="only run this case, may be repeated")
+    parser.add_argument("--save-baseline", metavar="JSON", help="write the results here")
+    parser.add_argument("--compare", metavar="JSON", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="slowdown over the baseline reported as a regression (default: %(default)s)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scale = {"dishes": args.dishes, "days": args.days, "density": args.density, "seed": args.seed}
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["scale"] != scale:
+            print("Warning: the baseline was measured at {}".format(baseline["scale"]), file=sys.stderr)
+
+    app = QApplication(sys.argv[:1])
+    with tempfile.TemporaryDirectory() as temp_dir:
+        db_file = args.db or os.path.join(temp_dir, "restaurant.db")
+        if not os.path.exists(db_file):
+            start = time.perf_counter()
+            rows = generate_db(db_file, args.dishes, args.days, args.density, args.seed)
+            print("Generated {} dishes and {} sales rows in {:.1f} s".format(
+                args.dishes, rows, time.perf_counter() - start))
+        print("{:<24} {:>13} {:>13} {:>14}".format("case", "median", "min", "peak memory"))
+        results = Bench(app, db_file).run(args.repeat, args.cases)
+    peak_rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print("Peak process memory {:.1f} MiB".format(peak_rss_kib / 1024))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as file:
+            json.dump({"scale": scale, "peak_rss_kib": peak_rss_kib, "results": results}, file, indent=2)
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("Slower than the baseline: " + ", ".join(regressions), file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Several branch databases, copied to HQ, read together as one restaurant.
+
+BranchSet.connect opens them all read-only on one connection with ATTACH, behind temporary views named like the
+tables (dish, dish_data and the rollups), so the app's queries read the merged data unchanged. A dish is known
+by its id in the branch plus the branch's index shifted by BRANCH_ID_SHIFT bits, so the ids stay unique and the
+branch of a row follows from its dish id; the dish view also has a branch column holding the branch's name.
+
+Aggregates, the dish table and the reports, are instead computed by every branch on its own rollups: in parallel
+by a process pool when there are POOL_MIN_BRANCHES branches or more, so the set takes about as long as its slowest
+branch, and in the calling thread on the attached views otherwise. Nothing here imports Qt.
+"""
+import multiprocessing
+import os
+import sqlite3
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+import database
+import repository
+
+BRANCH_ID_SHIFT = 40
+
+# Views over the attached databases, {tables} is one SELECT per branch joined by UNION ALL
+SQL_BRANCH_VIEWS = {
+    "dish": "SELECT {name} AS branch, id + {offset} AS id, name, price, remarks FROM {schema}.dish",
+    "dish_data": "SELECT dish_id + {offset} AS dish_id, date, sell_num FROM {schema}.dish_data",
+    "dish_sales_weekly": "SELECT dish_id + {offset} AS dish_id, week, sell_num FROM {schema}.dish_sales_weekly",
+    "dish_sales_monthly": "SELECT dish_id + {offset} AS dish_id, month, sell_num FROM {schema}.dish_sales_monthly",
+    "rollup_suspension": "SELECT id, started FROM {schema}.rollup_suspension",
+}
+
+
+def sql_text(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+def branch_names(db_files):
+    # File names without extension, numbered where two branches' files have the same name
+    names = []
+    for db_file in db_files:
+        name = os.path.splitext(os.path.basename(db_file))[0]
+        candidate, number = name, 2
+        while candidate in names:
+            candidate = "{} ({})".format(name, number)
+            number += 1
+        names.append(candidate)
+    return names
+
+
+def branch_rows(db_file, query, args):
+    """rows of repository.<query>(connection, *args) on one branch, run in a pool process."""
+    try:
+        connection = database.connect_readonly(db_file)
+    except sqlite3.Error as error:
+        if db_file in str(error):
+            raise
+        raise type(error)("{}: {}".format(db_file, error)) from None
+    try:
+        return getattr(repository, query)(connection, *args).fetchall()
+    finally:
+        connection.close()
+
+
+class BranchSet:
+    POOL_MIN_BRANCHES = 3
+
+    def __init__(self, db_files, processes=None):
+        if not db_files:
+            raise ValueError("No branch databases given")
+        self.db_files = [os.path.abspath(db_file) for db_file in db_files]
+        self.names = branch_names(self.db_files)
+        self.processes = processes or min(len(self.db_files), os.cpu_count() or 1)
+        self.pool = None
+
+    def __len__(self):
+        return len(self.db_files)
+
+    def dish_id(self, branch_idx, dish_id):
+        return (branch_idx << BRANCH_ID_SHIFT) + dish_id
+
+    def branch_of(self, dish_id):
+        return self.names[int(dish_id) >> BRANCH_ID_SHIFT]
+
+    def search_schemas(self):
+        # (schema, dish id offset) of every branch on a connection from connect(), see search.matching_dish_ids
+        return [("branch{}".format(branch_idx), self.dish_id(branch_idx, 0)) for branch_idx in range(len(self))]
+
+    def connect(self):
+        """One read-only connection with every branch attached and the merged views over them."""
+        connection = sqlite3.connect(":memory:", uri=True, factory=database.CONNECTION_FACTORY)
+        limit = connection.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        if len(self.db_files) > limit:
+            connection.close()
+            raise sqlite3.DatabaseError("At most {} branches can be opened together, got {}".format(
+                limit, len(self.db_files)))
+        try:
+            for branch_idx, db_file in enumerate(self.db_files):
+                schema = "branch{}".format(branch_idx)
+                connection.execute("ATTACH DATABASE ? AS " + schema, (database.readonly_uri(db_file),))
+                version = connection.execute("PRAGMA {}.user_version".format(schema)).fetchone()[0]
+                if version != database.SCHEMA_VERSION:
+                    raise sqlite3.DatabaseError("{} has schema version {}, expected {}; open it with the app first"
+                                                .format(db_file, version, database.SCHEMA_VERSION))
+            database.configure(connection)
+            for view, select in SQL_BRANCH_VIEWS.items():
+                connection.execute("CREATE TEMP VIEW {} AS {}".format(view, "\nUNION ALL\n".join(
+                    select.format(name=sql_text(name), offset=self.dish_id(branch_idx, 0),
+                                  schema="branch{}".format(branch_idx))
+                    for branch_idx, name in enumerate(self.names))))
+        except sqlite3.Error:
+            connection.close()
+            raise
+        return connection
+
+    def map(self, query, *args):
+        """Per branch, the rows of repository.<query>(connection, *args), computed by the branches in parallel."""
+        if self.pool is None:
+            # Spawned, not forked, since the GUI process runs threads; the workers only import the database modules
+            self.pool = ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("spawn"))
+        return list(self.pool.map(branch_rows, self.db_files, [query] * len(self), [args] * len(self)))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def use_pool(self):
+        return len(self) >= self.POOL_MIN_BRANCHES and self.processes > 1
+
+    def dish_table(self, connection, start, end):
+        """Like repository.dish_table over every branch, connection being one from connect()."""
+        if not self.use_pool():
+            return repository.dish_table(connection, start, end).fetchall()
+        return [(self.dish_id(branch_idx, dish_id),) + tuple(row)
+                for branch_idx, rows in enumerate(self.map("dish_table", start, end))
+                for dish_id, *row in rows]
+
+    def rows(self, query, *args):
+        # In the pool, or one branch after the other when that is not worth it
+        if self.use_pool():
+            return self.map(query, *args)
+        return [branch_rows(db_file, query, args) for db_file in self.db_files]
+
+    def period_revenue(self, start, end, group="month"):
+        """(period, sell_num, revenue) of every branch together, see repository.period_revenue."""
+        totals = defaultdict(lambda: [0, 0.0])
+        for rows in self.rows("period_revenue", start, end, group):
+            for period, sell_num, revenue in rows:
+                totals[period][0] += sell_num
+                totals[period][1] += revenue
+        return [(period, sell_num, round(revenue, 2)) for period, (sell_num, revenue) in sorted(totals.items())]
+
+    def dish_totals(self, start, end):
+        """(branch, dish_id, name, price, sell_num, revenue) of every dish of every branch, dish_id in its branch."""
+        return [(name,) + tuple(row) for name, rows in zip(self.names, self.rows("dish_totals", start, end))
+                for row in rows]
+
+    def top_sellers(self, start, end, limit=10, by="sell_num"):
+        """(name, price, sell_num, revenue) of the dishes selling most over every branch, a dish by name and price."""
+        if by not in repository.TOP_SELLER_ORDERS:
+            raise ValueError("Unknown top seller order {!r}".format(by))
+        totals = defaultdict(lambda: [0, 0.0])
+        for rows in self.rows("dish_totals", start, end):
+            for dish_id, name, price, sell_num, revenue in rows:
+                totals[(name, price)][0] += sell_num
+                totals[(name, price)][1] += revenue
+        ranked = sorted(((name, price, sell_num, round(revenue, 2))
+                         for (name, price), (sell_num, revenue) in totals.items() if sell_num > 0),
+                        key=lambda row: (-row[2 if by == "sell_num" else 3], row[0], row[1]))
+        return ranked[:limit] if limit >= 0 else ranked
@@ -0,0 +1,315 @@
+import math
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from PyQt5.QtChart import QChart, QValueAxis, QBarCategoryAxis, QBarSeries, QBarSet, QDateTimeAxis, QLineSeries
+from PyQt5.QtCore import Qt, QTimer, QPointF
+from PyQt5.QtGui import QCursor
+from PyQt5.QtWidgets import QToolTip
+
+from diagnostics import timed
+
+DAY, WEEK, MONTH = "day", "week", "month"
+# Order of the bucket combo box, None picks the bucket from the span of the chosen dates
+BUCKETS = (None, DAY, WEEK, MONTH)
+BUCKET_NAMES = {DAY: "按日", WEEK: "按周", MONTH: "按月"}
+WEEKDAY_NAMES = ("周一", "周二", "周三", "周四", "周五", "周六", "周日")
+
+
+def bucket_of(day: str, bucket: str) -> str:
+    """Key of the bucket holding a "yyyy-MM-dd" day: the day itself, the Monday of its week or "yyyy-MM"."""
+    if bucket == MONTH:
+        return day[:7]
+    if bucket == WEEK:
+        monday = date.fromisoformat(day)
+        return (monday - timedelta(days=monday.weekday())).isoformat()
+    return day
+
+
+def bucket_label(key: str, bucket: str) -> str:
+    if bucket == MONTH:
+        return "{}年{}月".format(key[:4], key[5:7])
+    label = "{}年{}月{}日".format(key[:4], key[5:7], key[8:10])
+    return label + "起" if bucket == WEEK else label
+
+
+def bucket_count(first: str, last: str, bucket: str) -> int:
+    first, last = date.fromisoformat(first), date.fromisoformat(last)
+    if bucket == MONTH:
+        return (last.year - first.year) * 12 + last.month - first.month + 1
+    if bucket == WEEK:
+        return ((last - timedelta(days=last.weekday())) - (first - timedelta(days=first.weekday()))).days // 7 + 1
+    return (last - first).days + 1
+
+
+class SalesChart:
+    """
+    Bar chart of the chosen rows of the data table, one bar set per dish and one category per time bucket.
+
+    Values are added and removed as rows are chosen (set_values). Totals per bucket and dish are
+    kept up to date along the way, and rendering only patches the bars that changed unless the categories or
+    the shown dishes did. Days are grouped by day, week or month so there are at most MAX_BUCKETS categories,
+    and only the top_n dishes by total get a bar set of their own, the others are summed up in OTHERS.
+    """
+    MAX_BUCKETS = 31
+    OTHERS = "其他"
+
+    def __init__(self, title="售出图"):
+        self.title = title
+        self.chart = QChart(title=title)
+        self.chart.legend().setVisible(True)
+        self.chart.setAcceptHoverEvents(True)
+        self.axis_x = QBarCategoryAxis()
+        self.axis_x.setTitleText("日期")
+        self.axis_y = QValueAxis()
+        self.axis_y.setLabelFormat("%i")
+        self.axis_y.setTitleText("售出量")
+        self.axis_y.setMin(0)
+        self.series = QBarSeries()
+        self.series.hovered.connect(self.show_tooltip)
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.chart.addSeries(self.series)
+        self.series.attachAxis(self.axis_x)
+        self.series.attachAxis(self.axis_y)
+
+        self.bucket = None
+        self.top_n = 10
+        self.visible = False
+        # (set_name, "yyyy-MM-dd") -> sell number of every chosen row
+        self.values = {}
+        self.day_counts = Counter()
+        # Totals over the buckets of current_bucket
+        self.current_bucket = DAY
+        self.totals = {}
+        self.bucket_counts = Counter()
+        self.set_totals = Counter()
+        self.set_counts = Counter()
+        # What the chart shows, and the (set_name, bucket key) totals changed since
+        self.categories = []
+        self.shown = []
+        self.bar_sets = {}
+        self.dirty = set()
+        self.layout_dirty = True
+        self.render_timer = QTimer()
+        self.render_timer.setSingleShot(True)
+        self.render_timer.timeout.connect(self.render)
+
+    def pick_bucket(self):
+        if not self.day_counts:
+            return self.bucket or DAY
+        first, last = min(self.day_counts), max(self.day_counts)
+        for bucket in BUCKETS[BUCKETS.index(self.bucket or DAY):]:
+            if bucket_count(first, last, bucket) <= self.MAX_BUCKETS:
+                return bucket
+        return MONTH
+
+    def set_bucket(self, bucket):
+        self.bucket = bucket
+        self.rebuild_totals()
+
+    def set_top_n(self, top_n):
+        self.top_n = top_n
+        self.layout_dirty = True
+        self.schedule_render()
+
+    def set_visible(self, visible):
+        self.visible = visible
+        self.schedule_render()
+
+    def rebuild_totals(self):
+        self.current_bucket = self.pick_bucket()
+        self.totals = {}
+        self.bucket_counts.clear()
+        self.set_totals.clear()
+        self.set_counts.clear()
+        for (set_name, day), value in self.values.items():
+            self.add_total(set_name, bucket_of(day, self.current_bucket), value, 1)
+        self.layout_dirty = True
+        self.schedule_render()
+
+    def add_total(self, set_name, key, value, count):
+        bucket_totals = self.totals.setdefault(key, Counter())
+        bucket_totals[set_name] += value
+        self.bucket_counts[key] += count
+        self.set_totals[set_name] += value
+        self.set_counts[set_name] += count
+        if self.bucket_counts[key] <= 0:
+            del self.bucket_counts[key]
+            del self.totals[key]
+            self.layout_dirty = True
+        elif self.bucket_counts[key] == count > 0:
+            self.layout_dirty = True
+        if self.set_counts[set_name] <= 0:
+            del self.set_counts[set_name]
+            del self.set_totals[set_name]
+            self.layout_dirty = True
+        self.dirty.add((set_name, key))
+
+    def set_value(self, set_name, day, value):
+        """Show value as the sell number of set_name on day, None to drop it."""
+        self.set_values([(set_name, day, value)])
+
+    def set_values(self, values):
+        """set_value for every (set_name, day, value) of values, with the totals brought up to date once."""
+        changes = []
+        days_changed = False
+        for set_name, day, value in values:
+            old_value = self.values.get((set_name, day))
+            if old_value == value:
+                continue
+            if value is None:
+                del self.values[(set_name, day)]
+            else:
+                self.values[(set_name, day)] = value
+            if old_value is None or value is None:
+                days_changed = True
+                self.day_counts[day] += 1 if old_value is None else -1
+                if self.day_counts[day] <= 0:
+                    del self.day_counts[day]
+            changes.append((set_name, day, old_value, value))
+        if not changes:
+            return
+        if days_changed and self.pick_bucket() != self.current_bucket:
+            self.rebuild_totals()
+            return
+        for set_name, day, old_value, value in changes:
+            key = bucket_of(day, self.current_bucket)
+            if old_value is not None:
+                self.add_total(set_name, key, -old_value, -1)
+            if value is not None:
+                self.add_total(set_name, key, value, 1)
+        self.schedule_render()
+
+    def clear(self):
+        self.values = {}
+        self.day_counts.clear()
+        self.rebuild_totals()
+
+    def rename_series(self, old_name, new_name):
+        for set_name, day in [key for key in self.values if key[0] == old_name]:
+            self.values[(new_name, day)] = self.values.pop((old_name, day))
+        self.rebuild_totals()
+
+    def remove_series(self, set_name):
+        self.set_values([(name, day, None) for name, day in self.values if name == set_name])
+
+    def schedule_render(self):
+        # Coalesce the changes of one event loop pass, and skip rendering while the chart is not shown
+        if self.visible and not self.render_timer.isActive():
+            self.render_timer.start(0)
+
+    def bar_value(self, set_name, key):
+        bucket_totals = self.totals.get(key, {})
+        if set_name != self.OTHERS:
+            return bucket_totals.get(set_name, 0)
+        return sum(bucket_totals.values()) - sum(bucket_totals.get(name, 0) for name in self.shown)
+
+    @timed("chart.render")
+    def render(self):
+        if not self.visible or not (self.layout_dirty or self.dirty):
+            return
+        ranked = sorted(self.set_totals, key=lambda name: (-self.set_totals[name], name))
+        shown = ranked[:self.top_n]
+        if len(ranked) > self.top_n:
+            shown.append(self.OTHERS)
+        categories = sorted(self.totals)
+        if self.layout_dirty or shown != self.shown or categories != self.categories:
+            self.render_all(shown, categories)
+        else:
+            # Same dishes and buckets, only replace the bars whose totals changed
+            for set_name, key in self.dirty:
+                idx = self.categories.index(key)
+                name = set_name if set_name in self.bar_sets else self.OTHERS
+                if name in self.bar_sets:
+                    self.bar_sets[name].replace(idx, self.bar_value(name, key))
+            self.axis_y.setMax(max((bar_set.at(idx) for bar_set in self.bar_sets.values()
+                                    for idx in range(bar_set.count())), default=0) + 1)
+        self.dirty.clear()
+        self.layout_dirty = False
+
+    def render_all(self, shown, categories):
+        self.shown = shown
+        self.categories = categories
+        self.series.clear()
+        self.bar_sets = {}
+        max_num = 0
+        for set_name in shown:
+            bar_set = QBarSet(set_name)
+            values = [self.bar_value(set_name, key) for key in categories]
+            bar_set.append(values)
+            max_num = max([max_num] + values)
+            self.bar_sets[set_name] = bar_set
+        self.series.append(list(self.bar_sets.values()))
+        self.axis_x.setCategories([bucket_label(key, self.current_bucket) for key in categories])
+        self.axis_y.setMax(max_num + 1)
+        self.chart.setTitle("{}（{}）".format(self.title, BUCKET_NAMES[self.current_bucket]))
+
+    def show_tooltip(self, status, index, bar_set: QBarSet):
+        if status:
+            QToolTip.showText(QCursor.pos(), "{}\n日期: {}\n售出: {}".format(
+                bar_set.label(), self.axis_x.at(index), int(bar_set.at(index))))
+
+
+class RevenueTrendChart:
+    """Line chart of the daily revenue of an analytics.Analysis and its moving averages."""
+    def __init__(self, title="营业额趋势"):
+        self.chart = QChart(title=title)
+        self.chart.legend().setVisible(True)
+        self.axis_x = QDateTimeAxis()
+        self.axis_x.setFormat("MM-dd")
+        self.axis_x.setTitleText("日期")
+        self.axis_y = QValueAxis()
+        self.axis_y.setLabelFormat("%.0f")
+        self.axis_y.setTitleText("营业额")
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.series = {}
+        for key, name in [(None, "每日"), (7, "7日均线"), (28, "28日均线")]:
+            series = self.series[key] = QLineSeries()
+            series.setName(name)
+            self.chart.addSeries(series)
+            series.attachAxis(self.axis_x)
+            series.attachAxis(self.axis_y)
+
+    @timed("analytics.trend")
+    def show(self, analysis):
+        # One point per day, the days a moving average does not cover yet are left out
+        msecs = [datetime(day.year, day.month, day.day).timestamp() * 1000 for day in analysis.days]
+        max_value = 0.0
+        for key, series in self.series.items():
+            values = analysis.daily_revenue if key is None else analysis.moving_averages[key]
+            points = [QPointF(x, y) for x, y in zip(msecs, values.tolist()) if not math.isnan(y)]
+            series.replace(points)
+            max_value = max([max_value] + [point.y() for point in points])
+        self.axis_x.setFormat("MM-dd" if len(msecs) <= 366 else "yyyy-MM")
+        if msecs:
+            self.axis_x.setRange(datetime.fromtimestamp(msecs[0] / 1000), datetime.fromtimestamp(msecs[-1] / 1000))
+        self.axis_y.setRange(0, max_value * 1.05 + 1)
+
+
+class WeekdayChart:
+    """Bars of the mean daily revenue per weekday of an analytics.Analysis."""
+    def __init__(self, title="星期分布"):
+        self.chart = QChart(title=title)
+        self.chart.legend().setVisible(False)
+        self.axis_x = QBarCategoryAxis()
+        self.axis_x.setCategories(list(WEEKDAY_NAMES))
+        self.axis_y = QValueAxis()
+        self.axis_y.setLabelFormat("%.0f")
+        self.axis_y.setTitleText("日均营业额")
+        self.series = QBarSeries()
+        self.bar_set = QBarSet("日均营业额")
+        self.bar_set.append([0] * len(WEEKDAY_NAMES))
+        self.series.append(self.bar_set)
+        self.chart.addAxis(self.axis_x, Qt.AlignBottom)
+        self.chart.addAxis(self.axis_y, Qt.AlignLeft)
+        self.chart.addSeries(self.series)
+        self.series.attachAxis(self.axis_x)
+        self.series.attachAxis(self.axis_y)
+
+    def show(self, analysis):
+        values = [0.0 if math.isnan(value) else value for value in analysis.weekday_revenue.tolist()]
+        for idx, value in enumerate(values):
+            self.bar_set.replace(idx, value)
+        self.axis_y.setRange(0, max(values) * 1.05 + 1)
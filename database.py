@@ -0,0 +1,646 @@
+import argparse
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+SQL_SELECT_DISH_TABLE = """
+    SELECT dish.id, dish.name, dish.price, COALESCE(totals.sell_num, 0), dish.remarks
+    FROM dish LEFT JOIN ({totals}) AS totals
+    ON dish.id = totals.dish_id
+    ORDER BY dish.name, dish.price;"""
+
+SQL_SELECT_DISH_SALES_OF_DATE = """
+    SELECT dish.id, dish.name, dish.price, COALESCE(dish_data.sell_num, 0)
+    FROM dish LEFT JOIN dish_data
+    ON dish.id = dish_data.dish_id AND dish_data.date = ?
+    ORDER BY dish.name, dish.price;"""
+
+# Into the table of main itself, past the views archive.use_archives may have put in front of it
+SQL_UPSERT_DISH_DATA = """
+    INSERT INTO main.dish_data(dish_id, date, sell_num)
+    VALUES (?, ?, ?)
+    ON CONFLICT (dish_id, date) DO UPDATE SET sell_num = excluded.sell_num;"""
+
+# The sort orders of the data table: the table read first, which CROSS JOIN makes SQLite keep, and the ORDER BY,
+# {dir} being ASC or DESC. Read in that order an index hands out the rows already sorted, so a page stops after
+# its rows instead of sorting all of them. The keys after the first make every order total, so pages never
+# overlap; dish_id breaks the ties between branches selling the same dish, see branches.py
+SQL_DISH_DATA_ORDERS = {
+    "date": ("dish_data", "dish_data.date {dir}, dish.name, dish.price, dish_data.dish_id"),
+    "name": ("dish", "dish.name {dir}, dish.price {dir}, dish_data.date DESC, dish_data.dish_id"),
+    "price": ("dish", "dish.price {dir}, dish.name {dir}, dish_data.date DESC, dish_data.dish_id"),
+    "sell_num": ("dish_data", "dish_data.sell_num {dir}, dish_data.date {dir}, dish_data.dish_id {dir}"),
+    "branch": ("dish_data", "dish.branch {dir}, dish_data.date DESC, dish.name, dish.price, dish_data.dish_id"),
+}
+
+SQL_DISH_DATA_TABLES = {
+    "dish_data": "dish_data CROSS JOIN dish ON dish.id = dish_data.dish_id",
+    "dish": "dish CROSS JOIN dish_data ON dish_data.dish_id = dish.id",
+}
+
+SQL_SELECT_DISH_DATA = """
+    SELECT dish_data.dish_id, dish_data.date, dish.name, dish.price, dish_data.sell_num
+    FROM {tables}
+    WHERE dish_data.date IS NOT NULL{where}
+    ORDER BY {order}
+    LIMIT ? OFFSET ?;"""
+
+SQL_COUNT_DISH_DATA = """
+    SELECT COUNT(*)
+    FROM dish_data JOIN dish
+    ON dish_data.dish_id = dish.id
+    WHERE dish_data.date IS NOT NULL{where};"""
+
+# Sales of dishes deleted while foreign keys were off, which the data table's inner join would not show
+SQL_COUNT_ORPHAN_SALES = """
+    SELECT COUNT(DISTINCT dish_id), COUNT(*)
+    FROM dish_data
+    WHERE dish_id NOT IN (SELECT id FROM dish);"""
+
+# Gives such sales a dish again, named after its id and priced 0 so it shows and can be renamed or deleted
+SQL_ADOPT_ORPHAN_SALES = """
+    INSERT INTO dish (id, name, price)
+    SELECT DISTINCT dish_id, '已删除菜品 ' || dish_id, 0
+    FROM dish_data
+    WHERE dish_id NOT IN (SELECT id FROM dish);"""
+
+# Rows, in the order of SQL_SELECT_DISH_DATA, of one dish
+SQL_SELECT_DISH_DATA_ROWS_OF_DISH = """
+    SELECT row FROM (
+        SELECT dish_data.dish_id, ROW_NUMBER() OVER (ORDER BY {order}) - 1 AS row
+        FROM {tables}
+        WHERE dish_data.date IS NOT NULL{where})
+    WHERE dish_id = ?;"""
+
+
+def dish_data_order(key="date", descending=True):
+    """The tables and ORDER BY of SQL_SELECT_DISH_DATA sorted by key, one of SQL_DISH_DATA_ORDERS."""
+    first_table, order = SQL_DISH_DATA_ORDERS[key]
+    return {"tables": SQL_DISH_DATA_TABLES[first_table], "order": order.format(dir="DESC" if descending else "ASC")}
+
+
+# Keys of the rollup tables: weeks start on Monday, months are "yyyy-MM"
+SQL_WEEK_OF = "date({}, 'weekday 0', '-6 days')"
+SQL_MONTH_OF = "strftime('%Y-%m', {})"
+
+SQL_ROLLUP_ADD_NEW = """
+    INSERT INTO dish_sales_weekly (dish_id, week, sell_num)
+    SELECT new.dish_id, {week}, COALESCE(new.sell_num, 0) WHERE new.date IS NOT NULL
+    ON CONFLICT (dish_id, week) DO UPDATE SET sell_num = sell_num + excluded.sell_num;
+    INSERT INTO dish_sales_monthly (dish_id, month, sell_num)
+    SELECT new.dish_id, {month}, COALESCE(new.sell_num, 0) WHERE new.date IS NOT NULL
+    ON CONFLICT (dish_id, month) DO UPDATE SET sell_num = sell_num + excluded.sell_num;""".format(
+    week=SQL_WEEK_OF.format("new.date"), month=SQL_MONTH_OF.format("new.date"))
+
+SQL_ROLLUP_SUBTRACT_OLD = """
+    UPDATE dish_sales_weekly SET sell_num = sell_num - COALESCE(old.sell_num, 0)
+    WHERE dish_id = old.dish_id AND week = {week};
+    UPDATE dish_sales_monthly SET sell_num = sell_num - COALESCE(old.sell_num, 0)
+    WHERE dish_id = old.dish_id AND month = {month};""".format(
+    week=SQL_WEEK_OF.format("old.date"), month=SQL_MONTH_OF.format("old.date"))
+
+SQL_REBUILD_ROLLUPS = [
+    "DELETE FROM dish_sales_weekly",
+    "DELETE FROM dish_sales_monthly",
+    """ INSERT INTO dish_sales_weekly (dish_id, week, sell_num)
+        SELECT dish_id, {week}, SUM(sell_num) FROM dish_data
+        WHERE date IS NOT NULL
+        GROUP BY dish_id, {week}; """.format(week=SQL_WEEK_OF.format("date")),
+    """ INSERT INTO dish_sales_monthly (dish_id, month, sell_num)
+        SELECT dish_id, {month}, SUM(sell_num) FROM dish_data
+        WHERE date IS NOT NULL
+        GROUP BY dish_id, {month}; """.format(month=SQL_MONTH_OF.format("date")),
+]
+
+# Bulk writers suspend the rollup triggers and rebuild the affected periods once when they are done
+SQL_ROLLUP_TRIGGERS = [
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_insert
+        AFTER INSERT ON dish_data {when}
+        BEGIN
+            {add_new}
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_delete
+        AFTER DELETE ON dish_data {when}
+        BEGIN
+            {subtract_old}
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_update
+        AFTER UPDATE OF dish_id, date, sell_num ON dish_data {when}
+        BEGIN
+            {subtract_old}
+            {add_new}
+        END; """,
+]
+
+# While the rollup triggers are suspended every day written to is noted, whichever connection writes it, so
+# resume_rollups rebuilds exactly the weeks and months that changed meanwhile
+SQL_ROLLUP_DIRTY_TRIGGERS = [
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_dirty_insert
+        AFTER INSERT ON dish_data WHEN new.date IS NOT NULL AND EXISTS (SELECT 1 FROM rollup_suspension)
+        BEGIN
+            INSERT OR IGNORE INTO rollup_dirty (date) VALUES (new.date);
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_dirty_delete
+        AFTER DELETE ON dish_data WHEN old.date IS NOT NULL AND EXISTS (SELECT 1 FROM rollup_suspension)
+        BEGIN
+            INSERT OR IGNORE INTO rollup_dirty (date) VALUES (old.date);
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_rollup_dirty_update
+        AFTER UPDATE OF dish_id, date, sell_num ON dish_data WHEN EXISTS (SELECT 1 FROM rollup_suspension)
+        BEGIN
+            INSERT OR IGNORE INTO rollup_dirty (date) SELECT old.date WHERE old.date IS NOT NULL;
+            INSERT OR IGNORE INTO rollup_dirty (date) SELECT new.date WHERE new.date IS NOT NULL;
+        END; """,
+]
+
+# The sales of archived years are in their archive files, see archive.py, and cannot change anymore
+SQL_ARCHIVED_YEAR_OF = "{0} IS NOT NULL AND CAST(substr({0}, 1, 4) AS integer) IN (SELECT year FROM sales_archive)"
+
+SQL_ARCHIVED_YEAR_TRIGGERS = [
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_archived_insert
+        BEFORE INSERT ON dish_data WHEN {when}
+        BEGIN
+            SELECT RAISE(ABORT, 'The sales of this year are archived');
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_data_archived_update
+        BEFORE UPDATE OF date ON dish_data WHEN {when}
+        BEGIN
+            SELECT RAISE(ABORT, 'The sales of this year are archived');
+        END; """,
+]
+
+# The trigram index of the dish names and remarks, see search.py, and the pinyin initials of the names, which only
+# the app can work out: they are dropped on a rename and filled in again by search.index_initials
+SQL_DISH_SEARCH_TRIGGERS = [
+    """ CREATE TRIGGER IF NOT EXISTS dish_search_insert
+        AFTER INSERT ON dish
+        BEGIN
+            INSERT INTO dish_search (rowid, name, remarks) VALUES (new.id, new.name, new.remarks);
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_search_delete
+        AFTER DELETE ON dish
+        BEGIN
+            INSERT INTO dish_search (dish_search, rowid, name, remarks)
+            VALUES ('delete', old.id, old.name, old.remarks);
+            DELETE FROM dish_initials WHERE dish_id = old.id;
+        END; """,
+    """ CREATE TRIGGER IF NOT EXISTS dish_search_update
+        AFTER UPDATE OF id, name, remarks ON dish
+        BEGIN
+            INSERT INTO dish_search (dish_search, rowid, name, remarks)
+            VALUES ('delete', old.id, old.name, old.remarks);
+            INSERT INTO dish_search (rowid, name, remarks) VALUES (new.id, new.name, new.remarks);
+            DELETE FROM dish_initials WHERE dish_id = old.id AND (new.id != old.id OR new.name != old.name);
+        END; """,
+]
+
+SQL_SELECT_ROLLUP_PART = {
+    "month": "SELECT dish_id, sell_num FROM dish_sales_monthly WHERE month BETWEEN ? AND ?",
+    "week": "SELECT dish_id, sell_num FROM dish_sales_weekly WHERE week BETWEEN ? AND ?",
+    "day": "SELECT dish_id, sell_num FROM dish_data WHERE date BETWEEN ? AND ?",
+}
+
+SQL_SELECT_ROLLUP_PERIOD_PART = {
+    "month": "SELECT month AS period, dish_id, sell_num FROM dish_sales_monthly WHERE month BETWEEN ? AND ?",
+    "week": "SELECT week AS period, dish_id, sell_num FROM dish_sales_weekly WHERE week BETWEEN ? AND ?",
+    "day": "SELECT {day_period} AS period, dish_id, sell_num FROM dish_data WHERE date BETWEEN ? AND ?",
+}
+
+
+def next_month_start(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def split_weeks(low, high):
+    # Whole Monday-Sunday weeks in [low, high] and the days left over on either side of them
+    first_week = low + timedelta(days=(7 - low.weekday()) % 7)
+    weeks_count = ((high - first_week).days + 1) // 7
+    if weeks_count <= 0:
+        return [("day", low, high)]
+    after_weeks = first_week + timedelta(days=7 * weeks_count)
+    return [("day", low, first_week - timedelta(days=1)),
+            ("week", first_week, after_weeks - timedelta(days=7)),
+            ("day", after_weeks, high)]
+
+
+def split_months(low, high):
+    # Whole months in [low, high] and the days left over on either side of them
+    first_month = low if low.day == 1 else next_month_start(low)
+    after_months = first_month
+    while next_month_start(after_months) - timedelta(days=1) <= high:
+        after_months = next_month_start(after_months)
+    if after_months == first_month:
+        return [("day", low, high)]
+    return [("day", low, first_month - timedelta(days=1)),
+            ("month", first_month, after_months - timedelta(days=1)),
+            ("day", after_months, high)]
+
+
+def split_period(start, end):
+    """
+    Cover [start, end] with whole months, then whole weeks, then single days, as (kind, first, last)
+    parts. A week part runs from the first to the last Monday, a month part over the first days of months.
+    """
+    parts = []
+    for kind, first, last in split_months(start, end):
+        parts.extend(split_weeks(first, last) if kind == "day" else [(kind, first, last)])
+    return [(kind, first, last) for kind, first, last in parts if first <= last]
+
+
+def rollup_params(parts):
+    params = []
+    for kind, first, last in parts:
+        if kind == "month":
+            params.extend([first.strftime("%Y-%m"), last.strftime("%Y-%m")])
+        else:
+            params.extend([first.isoformat(), last.isoformat()])
+    return params
+
+
+def rollups_current(connection):
+    # While a bulk import has the triggers suspended the rollups lag behind dish_data
+    return not connection.execute("SELECT EXISTS (SELECT 1 FROM rollup_suspension)").fetchone()[0]
+
+
+def period_totals_query(start, end, use_rollups=True):
+    """Return (sql, params) selecting dish_id and total sell_num per dish sold within [start, end]."""
+    parts = (split_period(start, end) if use_rollups else []) or [("day", start, end)]
+    sql = " UNION ALL ".join(SQL_SELECT_ROLLUP_PART[kind] for kind, _, _ in parts)
+    return "SELECT dish_id, SUM(sell_num) AS sell_num FROM ({}) GROUP BY dish_id".format(sql), \
+        tuple(rollup_params(parts))
+
+
+def grouped_totals_query(start, end, group="month", use_rollups=True):
+    """
+    Return (sql, params) selecting period, dish_id and total sell_num per dish and period within [start, end].
+
+    Periods are days ("yyyy-MM-dd"), weeks (their Monday) or months ("yyyy-MM"). Whole weeks or months are read
+    from the rollups, only the days at the edges from dish_data.
+    """
+    if group == "month" and use_rollups:
+        parts = split_months(start, end)
+    elif group == "week" and use_rollups:
+        parts = split_weeks(start, end)
+    else:
+        parts = [("day", start, end)]
+    parts = [(kind, first, last) for kind, first, last in parts if first <= last]
+    day_period = {"month": SQL_MONTH_OF, "week": SQL_WEEK_OF}.get(group, "{}").format("date")
+    sql = " UNION ALL ".join(SQL_SELECT_ROLLUP_PERIOD_PART[kind].format(day_period=day_period)
+                             for kind, _, _ in parts)
+    return "SELECT period, dish_id, SUM(sell_num) AS sell_num FROM ({}) GROUP BY period, dish_id".format(sql), \
+        tuple(rollup_params(parts))
+
+
+def dish_table_query(start, end, use_rollups=True):
+    totals_sql, params = period_totals_query(start, end, use_rollups)
+    return SQL_SELECT_DISH_TABLE.format(totals=totals_sql), params
+
+
+class Migration:
+    """
+    One step of the schema, applied once when PRAGMA user_version is below its version.
+
+    hot_queries lists (sql, params) pairs the step is meant to serve. check_query_plans reports any of
+    them that still has to scan one of the tables in no_scan_tables, or to sort all its rows when ordered.
+    """
+
+    def __init__(self, version, description, statements, hot_queries=(), no_scan_tables=("dish_data",), ordered=False):
+        self.version = version
+        self.description = description
+        self.statements = statements
+        self.hot_queries = hot_queries
+        self.no_scan_tables = no_scan_tables
+        # The hot queries read their rows in ORDER BY order, check_query_plans also reports a sort of all of them
+        self.ordered = ordered
+
+
+MIGRATIONS = [
+    Migration(1, "Initial dish and dish_data tables", [
+        """ CREATE TABLE IF NOT EXISTS dish (
+                id integer PRIMARY KEY,
+                name text NOT NULL,
+                price numeric Not NULL,
+                remarks text,
+                UNIQUE (name, price)
+            ); """,
+        """ CREATE TABLE IF NOT EXISTS dish_data (
+                dish_id integer NOT NULL REFERENCES dish(id) ON DELETE CASCADE,
+                date date,
+                sell_num integer DEFAULT 0,
+                PRIMARY KEY (dish_id, date),
+                CONSTRAINT dish_fk
+                    FOREIGN KEY (dish_id)
+                    REFERENCES dish (id) ON DELETE CASCADE
+            ); """,
+        """ CREATE TRIGGER IF NOT EXISTS place_holder_data
+            AFTER INSERT ON dish
+            BEGIN
+                INSERT INTO dish_data (dish_id, date, sell_num) VALUES(new.id, null, 0);
+            END; """,
+    ]),
+    Migration(2, "Covering indexes for the date range and per dish queries", [
+        "DROP INDEX IF EXISTS dish_data_date_idx",
+        "CREATE INDEX IF NOT EXISTS dish_data_date_idx ON dish_data (date, dish_id, sell_num)",
+        "CREATE INDEX IF NOT EXISTS dish_data_dish_date_idx ON dish_data (dish_id, date, sell_num)",
+    ], hot_queries=[
+        (SQL_SELECT_DISH_SALES_OF_DATE, ("2020-01-01",)),
+        (SQL_SELECT_DISH_DATA.format(where=" AND dish_data.date BETWEEN ? AND ?", **dish_data_order()),
+         ("2020-01-01", "2020-01-08", 256, 0)),
+    ]),
+    Migration(3, "Weekly and monthly sales rollups kept current by triggers", [
+        """ CREATE TABLE IF NOT EXISTS dish_sales_weekly (
+                dish_id integer NOT NULL REFERENCES dish(id) ON DELETE CASCADE,
+                week date NOT NULL,
+                sell_num integer NOT NULL DEFAULT 0,
+                PRIMARY KEY (dish_id, week)
+            ); """,
+        """ CREATE TABLE IF NOT EXISTS dish_sales_monthly (
+                dish_id integer NOT NULL REFERENCES dish(id) ON DELETE CASCADE,
+                month text NOT NULL,
+                sell_num integer NOT NULL DEFAULT 0,
+                PRIMARY KEY (dish_id, month)
+            ); """,
+        "CREATE INDEX IF NOT EXISTS dish_sales_weekly_week_idx ON dish_sales_weekly (week, dish_id, sell_num)",
+        "CREATE INDEX IF NOT EXISTS dish_sales_monthly_month_idx ON dish_sales_monthly (month, dish_id, sell_num)",
+    ] + [trigger.format(when="", add_new=SQL_ROLLUP_ADD_NEW, subtract_old=SQL_ROLLUP_SUBTRACT_OLD)
+         for trigger in SQL_ROLLUP_TRIGGERS] + SQL_REBUILD_ROLLUPS, hot_queries=[
+        dish_table_query(date(2019, 11, 28), date(2020, 1, 28)),
+        dish_table_query(date(2020, 1, 1), date(2020, 1, 8)),
+    ]),
+    Migration(4, "Let bulk imports suspend the rollup triggers", [
+        """ CREATE TABLE IF NOT EXISTS rollup_suspension (
+                id integer PRIMARY KEY,
+                started date NOT NULL
+            ); """,
+        "DROP TRIGGER IF EXISTS dish_data_rollup_insert",
+        "DROP TRIGGER IF EXISTS dish_data_rollup_delete",
+        "DROP TRIGGER IF EXISTS dish_data_rollup_update",
+    ] + [trigger.format(when="WHEN NOT EXISTS (SELECT 1 FROM rollup_suspension)", add_new=SQL_ROLLUP_ADD_NEW,
+                        subtract_old=SQL_ROLLUP_SUBTRACT_OLD) for trigger in SQL_ROLLUP_TRIGGERS]),
+    Migration(5, "Indexes for sorting the data table by price and sell number", [
+        # The data table joins dish without LEFT now, sales of dishes deleted without foreign keys keep showing
+        SQL_ADOPT_ORPHAN_SALES,
+        "CREATE INDEX IF NOT EXISTS dish_price_idx ON dish (price, name)",
+        "CREATE INDEX IF NOT EXISTS dish_data_sell_num_idx ON dish_data (sell_num, date, dish_id)",
+    ], hot_queries=[
+        (SQL_SELECT_DISH_DATA.format(where="", **dish_data_order(key, descending)), (256, 0))
+        for key in ("date", "name", "price", "sell_num") for descending in (False, True)
+    ], no_scan_tables=(), ordered=True),
+    Migration(6, "Registry of the yearly sales archives, whose years take no more sales", [
+        """ CREATE TABLE IF NOT EXISTS sales_archive (
+                year integer PRIMARY KEY,
+                file text NOT NULL,
+                archived date NOT NULL
+            ); """,
+    ] + [trigger.format(when=SQL_ARCHIVED_YEAR_OF.format("new.date")) for trigger in SQL_ARCHIVED_YEAR_TRIGGERS]),
+    Migration(7, "Full-text search of the dishes by name, remarks and pinyin initials", [
+        """ CREATE VIRTUAL TABLE IF NOT EXISTS dish_search USING fts5(
+                name, remarks, content='dish', content_rowid='id', tokenize='trigram'
+            ); """,
+        "INSERT INTO dish_search (dish_search) VALUES ('rebuild')",
+        """ CREATE TABLE IF NOT EXISTS dish_initials (
+                dish_id integer PRIMARY KEY,
+                initials text NOT NULL
+            ); """,
+        "CREATE INDEX IF NOT EXISTS dish_initials_idx ON dish_initials (initials)",
+    ] + SQL_DISH_SEARCH_TRIGGERS, hot_queries=[
+        ("SELECT dish_id FROM dish_initials WHERE initials GLOB ?", ("gb*",)),
+    ], no_scan_tables=("dish_initials",)),
+    Migration(8, "Days written while the rollups are suspended, rebuilt when they resume", [
+        """ CREATE TABLE IF NOT EXISTS rollup_dirty (
+                date date PRIMARY KEY
+            ) WITHOUT ROWID; """,
+    ] + SQL_ROLLUP_DIRTY_TRIGGERS),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def schema_version(connection):
+    return connection.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(connection):
+    """Bring the database up to SCHEMA_VERSION, every migration runs in its own transaction."""
+    current_version = schema_version(connection)
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+        connection.execute("BEGIN")
+        try:
+            for statement in migration.statements:
+                connection.execute(statement)
+            connection.execute("PRAGMA user_version = {:d}".format(migration.version))
+        except sqlite3.Error:
+            connection.rollback()
+            raise
+        connection.commit()
+        current_version = migration.version
+    return current_version
+
+
+# Class of the connections connect() opens, diagnostics.enable swaps in one that times every statement
+CONNECTION_FACTORY = sqlite3.Connection
+
+# With WAL readers and the writer do not block each other, and synchronous = NORMAL is safe from corruption: a
+# power cut can only lose the last commits, instead of every commit waiting for the disk twice
+SQL_CONNECTION_PRAGMAS = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16384",  # KiB
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA temp_store = MEMORY",
+    # The WAL is copied back by checkpoint() between writes, not by whichever commit happens to cross the limit.
+    # Once copied it is cut back to 1 MiB, so its size tells how much is left to copy
+    "PRAGMA wal_autocheckpoint = 0",
+    "PRAGMA journal_size_limit = 1048576",
+]
+# Writers wait this long for the lock held by another writer, e.g. an import, before failing
+WRITE_TIMEOUT = 30
+WAL_CHECKPOINT_BYTES = 4 * 1024 * 1024
+
+
+def configure(connection):
+    for statement in SQL_CONNECTION_PRAGMAS:
+        connection.execute(statement)
+
+
+def connect(db_file):
+    connection = sqlite3.connect(db_file, timeout=WRITE_TIMEOUT, factory=CONNECTION_FACTORY)
+    connection.execute("PRAGMA journal_mode = WAL")
+    configure(connection)
+    connection.execute("PRAGMA FOREIGN_KEYS = on")
+    # Rows dropped by INSERT OR REPLACE fire the delete triggers too, keeping the rollups exact
+    connection.execute("PRAGMA RECURSIVE_TRIGGERS = on")
+    migrate(connection)
+    recover_rollups(connection)
+    return connection
+
+
+def readonly_uri(db_file):
+    return Path(db_file).resolve().as_uri() + "?mode=ro"
+
+
+def connect_readonly(db_file):
+    """
+    Open db_file for reading only, for reports and the reader connections of the app, which must not take a write
+    lock or change the schema.
+    """
+    connection = sqlite3.connect(readonly_uri(db_file), uri=True, factory=CONNECTION_FACTORY)
+    configure(connection)
+    version = schema_version(connection)
+    if version != SCHEMA_VERSION:
+        connection.close()
+        raise sqlite3.DatabaseError("{} has schema version {}, expected {}; open it with the app first".format(
+            db_file, version, SCHEMA_VERSION))
+    return connection
+
+
+def checkpoint(connection, min_wal_bytes=0):
+    """
+    Copy the WAL back into the database once it has grown to min_wal_bytes. PASSIVE never waits for readers or
+    writers, what they still use is copied by a later checkpoint. Returns whether a checkpoint ran.
+    """
+    db_file = connection.execute("PRAGMA database_list").fetchone()[2]
+    try:
+        if not db_file or os.path.getsize(db_file + "-wal") < max(min_wal_bytes, 1):
+            return False
+    except OSError:
+        return False
+    connection.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+    return True
+
+
+def rollup_rebuild_statements(first=None, last=None):
+    """(sql, params) recomputing the rollups of every week and month touching [first, last], or all of them."""
+    if first is None or last is None:
+        return [(statement, ()) for statement in SQL_REBUILD_ROLLUPS]
+    week_first = first - timedelta(days=first.weekday())
+    week_last = last - timedelta(days=last.weekday())
+    month_first = first.replace(day=1)
+    month_last = next_month_start(last) - timedelta(days=1)
+    return [
+        ("DELETE FROM dish_sales_weekly WHERE week BETWEEN ? AND ?", (week_first.isoformat(), week_last.isoformat())),
+        (""" INSERT INTO dish_sales_weekly (dish_id, week, sell_num)
+             SELECT dish_id, {week}, SUM(sell_num) FROM dish_data
+             WHERE date BETWEEN ? AND ?
+             GROUP BY dish_id, {week}; """.format(week=SQL_WEEK_OF.format("date")),
+         (week_first.isoformat(), (week_last + timedelta(days=6)).isoformat())),
+        ("DELETE FROM dish_sales_monthly WHERE month BETWEEN ? AND ?",
+         (month_first.strftime("%Y-%m"), month_last.strftime("%Y-%m"))),
+        (""" INSERT INTO dish_sales_monthly (dish_id, month, sell_num)
+             SELECT dish_id, {month}, SUM(sell_num) FROM dish_data
+             WHERE date BETWEEN ? AND ?
+             GROUP BY dish_id, {month}; """.format(month=SQL_MONTH_OF.format("date")),
+         (month_first.isoformat(), month_last.isoformat())),
+    ]
+
+
+def rebuild_rollups(connection, first=None, last=None):
+    """Recompute the weekly and monthly rollups from dish_data, in case they drifted."""
+    connection.execute("BEGIN")
+    try:
+        for statement, params in rollup_rebuild_statements(first, last):
+            connection.execute(statement, params)
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
+def suspend_rollups(connection):
+    """Stop the rollup triggers for every connection until resume_rollups, return the suspension id."""
+    cursor = connection.execute("INSERT INTO rollup_suspension (started) VALUES (date('now', 'localtime'))")
+    connection.commit()
+    return cursor.lastrowid
+
+
+def date_runs(days):
+    """Group "yyyy-MM-dd" days into (first, last) date ranges of consecutive days."""
+    runs = []
+    for day in sorted(date.fromisoformat(day) for day in days):
+        if runs and runs[-1][1] + timedelta(days=1) >= day:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def resume_rollups(connection, suspension_id, first=None, last=None):
+    """
+    Rebuild the rollups of [first, last], the range the bulk writer touched, and of every day any connection wrote
+    to while the triggers were suspended (see rollup_dirty), which covers what the front desk entered meanwhile.
+    Then switch the triggers back on.
+    """
+    connection.execute("BEGIN IMMEDIATE")
+    try:
+        dirty = [day for (day,) in connection.execute("SELECT date FROM rollup_dirty")]
+        statements = []
+        for run_first, run_last in date_runs(dirty):
+            statements += rollup_rebuild_statements(run_first, run_last)
+        if first is not None and last is not None:
+            statements += rollup_rebuild_statements(first, last)
+        for statement, params in statements:
+            connection.execute(statement, params)
+        connection.execute("DELETE FROM rollup_dirty")
+        connection.execute("DELETE FROM rollup_suspension WHERE id = ?", (suspension_id,))
+    except sqlite3.Error:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
+def recover_rollups(connection, max_age_days=1):
+    # A suspension older than any import could take was left behind by a crash, the rollups cannot be trusted
+    stale = connection.execute("DELETE FROM rollup_suspension WHERE started < date('now', 'localtime', ?)",
+                               ("-{:d} days".format(max_age_days),)).rowcount
+    connection.commit()
+    if stale:
+        rebuild_rollups(connection)
+        if not connection.execute("SELECT EXISTS (SELECT 1 FROM rollup_suspension)").fetchone()[0]:
+            connection.execute("DELETE FROM rollup_dirty")
+            connection.commit()
+
+
+def query_plan(connection, sql, params=()):
+    return [row[3] for row in connection.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def check_query_plans(connection, migrations=MIGRATIONS):
+    """Return (version, sql, plan step) for every hot query step that scans a table it should search, or sorts."""
+    full_scans = []
+    for migration in migrations:
+        for sql, params in migration.hot_queries:
+            for step in query_plan(connection, sql, params):
+                if any(step == "SCAN " + table or step.startswith("SCAN {} ".format(table))
+                       for table in migration.no_scan_tables) or migration.ordered and step.startswith(
+                        "USE TEMP B-TREE FOR ORDER BY"):
+                    full_scans.append((migration.version, sql, step))
+    return full_scans
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Upgrade restaurant.db in place and verify the hot query plans")
+    parser.add_argument("db_file", nargs="?", default="restaurant.db")
+    parser.add_argument("--rebuild-rollups", action="store_true", help="recompute the sales rollup tables")
+    parser.add_argument("--adopt-orphans", action="store_true",
+                        help="give the sales of deleted dishes a dish again, so the data table shows them")
+    args = parser.parse_args()
+    db_connection = connect(args.db_file)
+    print("schema version {}".format(schema_version(db_connection)))
+    if args.rebuild_rollups:
+        rebuild_rollups(db_connection)
+        print("rollups rebuilt")
+    if args.adopt_orphans:
+        adopted = db_connection.execute(SQL_ADOPT_ORPHAN_SALES).rowcount
+        db_connection.commit()
+        print("{} deleted dishes given back their sales".format(adopted))
+    orphan_dishes, orphan_sales = db_connection.execute(SQL_COUNT_ORPHAN_SALES).fetchone()
+    if orphan_sales:
+        print("{} sales rows of {} deleted dishes are not shown, see --adopt-orphans".format(
+            orphan_sales, orphan_dishes))
+    scans = check_query_plans(db_connection)
+    for version, sql, step in scans:
+        print("migration {}: '{}' in{}".format(version, step, sql))
+    sys.exit(1 if scans else 0)
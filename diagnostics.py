@@ -0,0 +1,337 @@
+"""
+Opt-in instrumentation for finding out why the app hangs, switched on by ``main.py --diagnostics``:
+
+- every SQL statement on the app's connections is timed with its parameter types and row count, the ones slower
+  than slow_query_ms are written to the log file (see TimedConnection);
+- functions decorated with @timed, the model rebuilds, filter invalidations and chart updates, are timed;
+- a watchdog thread notices when the event loop stalls longer than stall_ms and logs where the GUI thread was;
+- DiagnosticsLabel shows the counters live in the status bar.
+
+Until enable() is called none of this runs, @timed only checks a global and connections are plain sqlite3 ones.
+"""
+import functools
+import logging
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QLabel
+
+import database
+
+log = logging.getLogger("diagnostics")
+# The Instrumentation of enable(), None while diagnostics are off
+instrumentation = None
+
+
+class Section:
+    """Count, total and longest duration of one kind of timed work."""
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+
+class Instrumentation:
+    """Counters shared by the GUI and database threads, and the thresholds above which work gets logged."""
+    def __init__(self, slow_query_ms=100, stall_ms=200):
+        self.slow_query_ms = slow_query_ms
+        self.stall_ms = stall_ms
+        self.stall_detector = None
+        self.lock = threading.Lock()
+        self.sections = {}
+        self.slow_queries = 0
+        self.local = threading.local()
+
+    def add(self, name, ms):
+        with self.lock:
+            self.sections.setdefault(name, Section()).add(ms)
+
+    def snapshot(self):
+        with self.lock:
+            return {name: (section.count, section.total_ms, section.max_ms)
+                    for name, section in self.sections.items()}, self.slow_queries
+
+    def statement_done(self, statement):
+        self.add("sql", statement.ms)
+        if statement.ms >= self.slow_query_ms:
+            with self.lock:
+                self.slow_queries += 1
+            log.warning("slow query %.1f ms, %s rows, params %s%s, request %s: %s", statement.ms, statement.rows,
+                        statement.params, " (failed)" if statement.failed else "", statement.request,
+                        " ".join(statement.sql.split()))
+
+    def open_statements(self):
+        # Statements of this thread whose rows are still being fetched
+        if not hasattr(self.local, "statements"):
+            self.local.statements = []
+        return self.local.statements
+
+    def stall(self, ms, stack):
+        self.add("stall", ms)
+        log.warning("event loop stalled for %.0f ms%s", ms,
+                    ", GUI thread was at:\n" + stack if stack else "")
+
+
+def timed(name):
+    """Time every call of the decorated function under name while diagnostics are on."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if instrumentation is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                instrumentation.add(name, (time.perf_counter() - start) * 1000)
+        return wrapper
+    return decorator
+
+
+class Request:
+    """
+    Label the statements run inside the with block by the database request they belong to, and finish the ones
+    whose rows were not fetched to the end when it exits.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        if instrumentation is not None:
+            instrumentation.local.request = self.name
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if instrumentation is not None:
+            instrumentation.add("request", (time.perf_counter() - self.start) * 1000)
+            for statement in list(instrumentation.open_statements()):
+                statement.finish()
+            instrumentation.local.request = None
+
+
+def describe_params(params):
+    # Types only, the values may be names and numbers the log should not keep
+    if isinstance(params, dict):
+        return "{" + ", ".join("{}: {}".format(key, type(value).__name__) for key, value in params.items()) + "}"
+    return "(" + ", ".join(type(value).__name__ for value in params) + ")"
+
+
+class Statement:
+    def __init__(self, sql, params):
+        self.sql = sql
+        self.params = params
+        self.request = getattr(instrumentation.local, "request", None)
+        self.ms = 0.0
+        self.rows = 0
+        self.failed = False
+        self.done = False
+
+    def finish(self):
+        if self.done:
+            return
+        self.done = True
+        statements = instrumentation.open_statements()
+        if self in statements:
+            statements.remove(self)
+        instrumentation.statement_done(self)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor timing its statements, from execute until the last row is fetched or the cursor is done with."""
+    statement = None
+
+    def run(self, execute, sql, params, params_shape):
+        # params_shape may be a function, for parameters that are only known once they went through
+        self.finish()
+        statement = self.statement = Statement(sql, params_shape)
+        start = time.perf_counter()
+        try:
+            execute(sql, params)
+        except BaseException:
+            statement.failed = True
+            raise
+        finally:
+            statement.ms += (time.perf_counter() - start) * 1000
+            if callable(params_shape):
+                statement.params = params_shape()
+            if statement.failed or self.description is None:
+                # Not a query, nothing to fetch
+                statement.rows = max(self.rowcount, 0)
+                self.finish()
+            else:
+                instrumentation.open_statements().append(statement)
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self.run(super(TimedCursor, self).execute, sql, parameters, describe_params(parameters))
+
+    def executemany(self, sql, seq_of_parameters):
+        counted = [0, None]
+
+        def count(seq):
+            for params in seq:
+                counted[0] += 1
+                if counted[1] is None:
+                    counted[1] = describe_params(params)
+                yield params
+
+        return self.run(super(TimedCursor, self).executemany, sql, count(seq_of_parameters),
+                        lambda: "{} x {}".format(counted[0], counted[1] or "()"))
+
+    def executescript(self, sql_script):
+        return self.run(lambda sql, params: super(TimedCursor, self).executescript(sql), sql_script, (), "script")
+
+    def fetched(self, start, rows):
+        if self.statement is not None:
+            self.statement.ms += (time.perf_counter() - start) * 1000
+            self.statement.rows += int(rows)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super(TimedCursor, self).fetchone()
+        self.fetched(start, row is not None)
+        if row is None:
+            self.finish()
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super(TimedCursor, self).fetchmany(self.arraysize if size is None else size)
+        self.fetched(start, len(rows))
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super(TimedCursor, self).fetchall()
+        self.fetched(start, len(rows))
+        self.finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super(TimedCursor, self).__next__()
+        except StopIteration:
+            self.finish()
+            raise
+        self.fetched(start, 1)
+        return row
+
+    def close(self):
+        self.finish()
+        super(TimedCursor, self).close()
+
+    def finish(self):
+        if self.statement is not None:
+            # The statement object is finished once, also when its request ended first
+            self.statement.finish()
+            self.statement = None
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose cursors are TimedCursors, including the ones behind the execute shortcuts."""
+    def cursor(self, factory=TimedCursor):
+        return super(TimedConnection, self).cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+class StallDetector:
+    """
+    A timer on the GUI thread beats every few milliseconds. When a beat comes more than stall_ms late the event
+    loop was stuck, and the watchdog thread has taken the GUI thread's stack meanwhile, which is logged with it.
+    """
+    def __init__(self, stall_ms):
+        self.stall_ms = stall_ms
+        self.gui_thread_id = threading.get_ident()
+        self.heartbeat = time.perf_counter()
+        self.stack = None
+        self.timer = QTimer()
+        self.timer.setInterval(max(10, int(stall_ms) // 4))
+        self.timer.timeout.connect(self.beat)
+        self.stopped = threading.Event()
+        self.watchdog = threading.Thread(target=self.watch, name="stall watchdog", daemon=True)
+
+    def start(self):
+        self.heartbeat = time.perf_counter()
+        self.timer.start()
+        self.watchdog.start()
+
+    def stop(self):
+        self.timer.stop()
+        self.stopped.set()
+
+    def beat(self):
+        now = time.perf_counter()
+        late_ms = (now - self.heartbeat) * 1000 - self.timer.interval()
+        if late_ms > self.stall_ms and instrumentation is not None:
+            instrumentation.stall(late_ms, self.stack)
+        self.heartbeat = now
+        self.stack = None
+
+    def watch(self):
+        while not self.stopped.wait(self.stall_ms / 2000):
+            late_ms = (time.perf_counter() - self.heartbeat) * 1000 - self.timer.interval()
+            if self.stack is None and late_ms > self.stall_ms:
+                frame = sys._current_frames().get(self.gui_thread_id)
+                self.stack = "".join(traceback.format_stack(frame)) if frame is not None else ""
+
+
+class DiagnosticsLabel(QLabel):
+    """Status bar counters of the queries and stalls, refreshed every second, with every section in its tooltip."""
+    def __init__(self, parent=None):
+        super(DiagnosticsLabel, self).__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def refresh(self):
+        if instrumentation is None:
+            self.hide()
+            return
+        sections, slow_queries = instrumentation.snapshot()
+        sql = sections.get("sql", (0, 0.0, 0.0))
+        stall = sections.get("stall", (0, 0.0, 0.0))
+        self.setText(self.tr("SQL {} 条（慢 {}）· 卡顿 {} 次，最长 {:.0f} ms".format(
+            sql[0], slow_queries, stall[0], stall[2])))
+        self.setToolTip("\n".join("{}: {} 次，共 {:.1f} ms，最长 {:.1f} ms".format(name, *sections[name])
+                                  for name in sorted(sections)))
+
+
+def enable(log_file, slow_query_ms=100, stall_ms=200):
+    """Switch the instrumentation on from the GUI thread, before the window opens its database connections."""
+    global instrumentation
+    if instrumentation is not None:
+        return instrumentation
+    handler = logging.FileHandler(log_file, encoding="utf-8")
+    handler.setFormatter(logging.Formatter("%(asctime)s %(threadName)s %(message)s"))
+    log.addHandler(handler)
+    log.setLevel(logging.INFO)
+    log.propagate = False
+    instrumentation = Instrumentation(slow_query_ms, stall_ms)
+    database.CONNECTION_FACTORY = TimedConnection
+    instrumentation.stall_detector = StallDetector(stall_ms)
+    instrumentation.stall_detector.start()
+    log.info("diagnostics on, slow queries >= %s ms, stalls > %s ms", slow_query_ms, stall_ms)
+    return instrumentation
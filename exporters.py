@@ -0,0 +1,189 @@
+"""
+Export of the sales the data table shows, with the same filters and order, as CSV or XLSX for the books.
+
+Rows are fetched CHUNK_SIZE at a time and written straight into the file, so memory stays the same however many
+rows there are. XLSX files are written without a library: a workbook is a zip of XML files, and the sheets are
+streamed into it as they are compressed, XLSX_MAX_ROWS rows to a sheet. Nothing here imports Qt.
+"""
+import csv
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from archive import use_archives
+from database import dish_data_order
+
+COLUMNS = ("日期", "菜品", "价格", "售出", "营业额")
+BRANCH_COLUMN = "分店"
+
+# The rows of database.SQL_SELECT_DISH_DATA without paging, and the revenue of each
+SQL_EXPORT_DISH_DATA = """
+    SELECT dish_data.date, dish.name, dish.price, dish_data.sell_num,
+           ROUND(dish.price * dish_data.sell_num, 2){branch}
+    FROM {tables}
+    WHERE dish_data.date IS NOT NULL{where}
+    ORDER BY {order};"""
+
+CHUNK_SIZE = 5000
+# Rows of an Excel sheet, the header included
+XLSX_MAX_ROWS = 1048576
+XLSX_SHEET_NAME = "流水"
+
+XLSX_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" \
+ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+{sheets}
+</Types>"""
+
+XLSX_CONTENT_TYPE_SHEET = """<Override PartName="/xl/worksheets/sheet{number}.xml" \
+ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>"""
+
+XLSX_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" \
+Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+XLSX_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" \
+xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{sheets}</sheets>
+</workbook>"""
+
+XLSX_WORKBOOK_SHEET = """<sheet name="{name}" sheetId="{number}" r:id="rId{number}"/>"""
+
+XLSX_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}
+</Relationships>"""
+
+XLSX_WORKBOOK_REL_SHEET = """<Relationship Id="rId{number}" \
+Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" \
+Target="worksheets/sheet{number}.xml"/>"""
+
+XLSX_SHEET_START = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>"""
+
+XLSX_SHEET_END = "</sheetData></worksheet>"
+# Characters XML 1.0 cannot hold even escaped, such as the control characters a pasted name may carry
+XLSX_INVALID_CHARS = re.compile("[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+
+def xlsx_cell(value):
+    if value is None:
+        return "<c/>"
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return "<c><v>{!r}</v></c>".format(value)
+    return '<c t="inlineStr"><is><t>{}</t></is></c>'.format(escape(XLSX_INVALID_CHARS.sub("", str(value))))
+
+
+class CsvWriter:
+    def __init__(self, file_name, columns):
+        # With the BOM Excel reads the Chinese text as UTF-8
+        self.file = open(file_name, "w", newline="", encoding="utf-8-sig")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(columns)
+
+    def write_rows(self, rows):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxWriter:
+    def __init__(self, file_name, columns):
+        self.columns = columns
+        self.zip_file = zipfile.ZipFile(file_name, "w", zipfile.ZIP_DEFLATED)
+        self.sheet = None
+        self.sheet_count = 0
+        self.sheet_rows = 0
+
+    def start_sheet(self):
+        self.end_sheet()
+        self.sheet_count += 1
+        # The size is not known up front, zip64 lets a sheet grow past 2 GiB
+        self.sheet = self.zip_file.open("xl/worksheets/sheet{}.xml".format(self.sheet_count), "w", force_zip64=True)
+        self.sheet.write(XLSX_SHEET_START.encode("utf-8"))
+        self.sheet_rows = 0
+        self.write_rows([self.columns])
+
+    def end_sheet(self):
+        if self.sheet is not None:
+            self.sheet.write(XLSX_SHEET_END.encode("utf-8"))
+            self.sheet.close()
+            self.sheet = None
+
+    def write_rows(self, rows):
+        rows = list(rows)
+        while rows:
+            if self.sheet is None or self.sheet_rows == XLSX_MAX_ROWS:
+                self.start_sheet()
+            count = min(len(rows), XLSX_MAX_ROWS - self.sheet_rows)
+            self.sheet.write("".join("<row>{}</row>".format("".join(xlsx_cell(value) for value in row))
+                                     for row in rows[:count]).encode("utf-8"))
+            self.sheet_rows += count
+            rows = rows[count:]
+
+    def close(self):
+        if self.sheet is None:
+            self.start_sheet()
+        self.end_sheet()
+        numbers = range(1, self.sheet_count + 1)
+        names = [XLSX_SHEET_NAME if number == 1 else "{} ({})".format(XLSX_SHEET_NAME, number) for number in numbers]
+        self.zip_file.writestr("[Content_Types].xml", XLSX_CONTENT_TYPES.format(
+            sheets="\n".join(XLSX_CONTENT_TYPE_SHEET.format(number=number) for number in numbers)))
+        self.zip_file.writestr("_rels/.rels", XLSX_ROOT_RELS)
+        self.zip_file.writestr("xl/workbook.xml", XLSX_WORKBOOK.format(sheets="".join(
+            XLSX_WORKBOOK_SHEET.format(name=escape(name), number=number) for number, name in zip(numbers, names))))
+        self.zip_file.writestr("xl/_rels/workbook.xml.rels", XLSX_WORKBOOK_RELS.format(
+            sheets="\n".join(XLSX_WORKBOOK_REL_SHEET.format(number=number) for number in numbers)))
+        self.zip_file.close()
+
+
+WRITERS = {".csv": CsvWriter, ".xlsx": XlsxWriter}
+
+
+def export_sales(connection, file_name, where="", params=(), order=None, date_range=(None, None), branches=False,
+                 progress=None):
+    """
+    Write the sales of the data table to file_name, CSV or XLSX by its extension, and return the number of rows.
+
+    where, params, order and date_range are those of the table's query (see DishDataTableModel.query), order
+    being a dish_data_order(); branches adds the 分店 column of the merged branches. progress(rows) is called
+    after every chunk. The file is written under a temporary name and only replaces file_name once complete.
+    """
+    writer_class = WRITERS.get(os.path.splitext(file_name)[1].lower())
+    if writer_class is None:
+        raise ValueError("Cannot export to {}, only to {}".format(file_name, ", ".join(sorted(WRITERS))))
+    use_archives(connection, *date_range)
+    sql = SQL_EXPORT_DISH_DATA.format(where=where, branch=", dish.branch" if branches else "",
+                                      **(order or dish_data_order()))
+    part_file = file_name + ".part"
+    cursor = connection.execute(sql, params)
+    try:
+        writer = writer_class(part_file, COLUMNS + ((BRANCH_COLUMN,) if branches else ()))
+        try:
+            rows = 0
+            while True:
+                chunk = cursor.fetchmany(CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write_rows(chunk)
+                rows += len(chunk)
+                if progress is not None:
+                    progress(rows)
+        finally:
+            writer.close()
+        os.replace(part_file, file_name)
+    except BaseException:
+        if os.path.exists(part_file):
+            os.remove(part_file)
+        raise
+    finally:
+        cursor.close()
+    return rows
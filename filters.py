@@ -1,13 +1,287 @@
+import json
 import re
-from PyQt5.QtCore import QSortFilterProxyModel, QModelIndex, QDate
+from datetime import date
+from functools import lru_cache
+
+from PyQt5.QtCore import Qt, QSortFilterProxyModel, QModelIndex, QDate, QTimer
+
+from diagnostics import timed
+
+try:
+    import numpy as np
+except ImportError:  # Fall back to checking row by row in filterAcceptsRow
+    np = None
+
+JULIAN_DAY_OFFSET = 1721425
+# Role of the typed value (int, float, str) a TableFilter sorts a column by, instead of parsing its text
+SORT_ROLE = Qt.UserRole + 1
+
+
+@lru_cache(maxsize=64)
+def compile_regex(pattern):
+    return re.compile(pattern)
+
+
+def sql_regexp(pattern, text):
+    # Implementation of the SQLite REGEXP operator, register with connection.create_function
+    if text is None:
+        return False
+    return compile_regex(pattern).search(text) is not None
+
+
+def parse_number(data):
+    try:
+        return float(data)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def parse_date(data):
+    # Julian day number of a "yyyy-MM-dd" text, comparable with QDate.toJulianDay()
+    try:
+        return date.fromisoformat(data).toordinal() + JULIAN_DAY_OFFSET
+    except (TypeError, ValueError):
+        return -1
+
+
+class TypedColumn:
+    """
+    One source column kept in typed form for vectorized filtering.
+
+    Numbers are stored as floats and dates as julian day numbers. Texts are dictionary encoded, so a
+    regex only has to be run once per distinct text and is then broadcast over the rows by their codes.
+    Values live in a list, so single row inserts stay cheap, and are turned into a NumPy array on demand.
+    """
+
+    def __init__(self, method, data=()):
+        self.method = method
+        self.texts = []
+        self.text_codes = {}
+        self.values = self.encode(data)
+        self._array = None
+
+    def encode(self, data):
+        if self.method == "Number":
+            return [parse_number(item) for item in data]
+        elif self.method == "Date":
+            return [parse_date(item) for item in data]
+        return [self.text_code(item) for item in data]
+
+    def text_code(self, text):
+        text = "" if text is None else text
+        code = self.text_codes.get(text)
+        if code is None:
+            code = self.text_codes[text] = len(self.texts)
+            self.texts.append(text)
+        return code
+
+    def array(self, first=0, last=None):
+        if first == 0 and last is None:
+            if self._array is None:
+                self._array = np.array(self.values, dtype=np.float64 if self.method == "Number" else np.int64)
+            return self._array
+        values = self.values[first:None if last is None else last + 1]
+        return np.array(values, dtype=np.float64 if self.method == "Number" else np.int64)
+
+    def insert(self, first, data):
+        self.values[first:first] = self.encode(data)
+        self._array = None
+
+    def remove(self, first, last):
+        del self.values[first:last + 1]
+        self._array = None
+
+    def update(self, first, data):
+        values = self.encode(data)
+        self.values[first:first + len(values)] = values
+        self._array = None
+
+    def mask(self, criteria, first=0, last=None):
+        values = self.array(first, last)
+        if self.method == "Number":
+            min_number, max_number = criteria
+            if max_number > 0 and max_number > min_number:
+                return (values >= min_number) & (values <= max_number)
+            return None
+        elif self.method == "Date":
+            min_date, max_date = criteria
+            return (values >= min_date.toJulianDay()) & (values <= max_date.toJulianDay())
+        elif self.method in ("Set", "Match"):
+            if self.method == "Set" and not criteria:
+                return None
+            matched = np.fromiter((text in criteria for text in self.texts), dtype=bool, count=len(self.texts))
+            return matched[values]
+        matched = np.fromiter((criteria.search(text) is not None for text in self.texts), dtype=bool,
+                              count=len(self.texts))
+        return matched[values]
 
 
 class TableFilter(QSortFilterProxyModel):
+    SQL_FILTER_DELAY = 250
 
     def __init__(self, parent=None):
         super(TableFilter, self).__init__(parent)
+        self.setSortRole(SORT_ROLE)
         self.filter_column = {}
         self.filter_method = {}
+        # Columns whose filters are answered by the database instead of filterAcceptsRow
+        self.sql_columns = {}
+        self.sql_filter_timer = QTimer(self)
+        self.sql_filter_timer.setSingleShot(True)
+        self.sql_filter_timer.setInterval(self.SQL_FILTER_DELAY)
+        self.sql_filter_timer.timeout.connect(self.apply_sql_filter)
+        # Typed copies of the filtered source columns and the rows they currently accept
+        self.typed_columns = {}
+        self.filter_mask = None
+
+    def setSourceModel(self, source_model):
+        # Connect before the proxy does, so the typed columns are in sync when it calls filterAcceptsRow
+        old_model = self.sourceModel()
+        if old_model is not None:
+            for signal, slot in self.source_model_slots(old_model):
+                signal.disconnect(slot)
+        self.reset_typed_columns()
+        if source_model is not None:
+            for signal, slot in self.source_model_slots(source_model):
+                signal.connect(slot)
+        super(TableFilter, self).setSourceModel(source_model)
+
+    def source_model_slots(self, source_model):
+        return [
+            (source_model.rowsInserted, self.source_rows_inserted),
+            (source_model.rowsRemoved, self.source_rows_removed),
+            (source_model.dataChanged, self.source_data_changed),
+            (source_model.modelReset, self.reset_typed_columns),
+            (source_model.layoutChanged, self.reset_typed_columns),
+            (source_model.rowsMoved, self.reset_typed_columns),
+        ]
+
+    def reset_typed_columns(self, *args):
+        self.typed_columns = {}
+        self.filter_mask = None
+
+    def source_column_data(self, col, first, last):
+        model = self.sourceModel()
+        role = self.filter_role(col)
+        return [model.data(model.index(row, col), role) for row in range(first, last + 1)]
+
+    def filter_role(self, col):
+        # Match filters compare the typed values, the ids of a search are numbers like those in SQL
+        return SORT_ROLE if self.filter_method.get(col) == "Match" else Qt.DisplayRole
+
+    def source_rows_inserted(self, parent, first, last):
+        if parent.isValid():
+            return
+        for col, column in self.typed_columns.items():
+            column.insert(first, self.source_column_data(col, first, last))
+        if self.filter_mask is not None:
+            self.filter_mask[first:first] = self.compute_filter_mask(first, last)
+
+    def source_rows_removed(self, parent, first, last):
+        if parent.isValid():
+            return
+        for column in self.typed_columns.values():
+            column.remove(first, last)
+        if self.filter_mask is not None:
+            del self.filter_mask[first:last + 1]
+
+    def source_data_changed(self, top_left, bottom_right, roles=()):
+        if roles and Qt.DisplayRole not in roles and Qt.EditRole not in roles:
+            return
+        first, last = top_left.row(), bottom_right.row()
+        changed = False
+        for col in range(top_left.column(), bottom_right.column() + 1):
+            if col in self.typed_columns:
+                self.typed_columns[col].update(first, self.source_column_data(col, first, last))
+                changed = True
+        if changed and self.filter_mask is not None:
+            self.filter_mask[first:last + 1] = self.compute_filter_mask(first, last)
+
+    def typed_column(self, col):
+        column = self.typed_columns.get(col)
+        if column is None or column.method != self.filter_method[col]:
+            data = self.source_column_data(col, 0, self.sourceModel().rowCount() - 1)
+            column = self.typed_columns[col] = TypedColumn(self.filter_method[col], data)
+        return column
+
+    def compute_filter_mask(self, first=0, last=None):
+        # One boolean per source row in [first, last], combined over every column filtered in memory
+        row_count = (self.sourceModel().rowCount() if last is None else last + 1) - first
+        mask = np.ones(row_count, dtype=bool)
+        for col, criteria in self.filter_column.items():
+            if col in self.sql_columns:
+                continue
+            col_mask = self.typed_column(col).mask(criteria, first, last)
+            if col_mask is not None:
+                mask &= col_mask
+        # Python bools index faster than NumPy scalars in the per-row callbacks from the proxy
+        return mask.tolist()
+
+    def set_sql_columns(self, sql_columns):
+        """
+        Push the filters of the given columns down into the source model's query.
+
+        sql_columns maps a column index to the SQL expression it is read from. The source model has to
+        provide set_filter(where, params, date_range), date_range being the first and last day the date filters let
+        through. Filter changes are debounced into one re-query.
+        """
+        self.sql_columns = dict(sql_columns)
+        self.apply_sql_filter()
+
+    @timed("filter.invalidate")
+    def filter_changed(self, col):
+        if col in self.sql_columns:
+            self.sql_filter_timer.start()
+        else:
+            self.filter_mask = None
+            self.invalidateFilter()
+
+    def sql_filter(self):
+        clauses = []
+        params = []
+        for col, expression in sorted(self.sql_columns.items()):
+            if col not in self.filter_column:
+                continue
+            method = self.filter_method[col]
+            if method == "Number":
+                min_number, max_number = self.filter_column[col]
+                if max_number > 0 and max_number > min_number:
+                    clauses.append("{} BETWEEN ? AND ?".format(expression))
+                    params.extend([min_number, max_number])
+            elif method == "Date":
+                min_date, max_date = self.filter_column[col]
+                clauses.append("{} BETWEEN ? AND ?".format(expression))
+                params.extend([min_date.toString("yyyy-MM-dd"), max_date.toString("yyyy-MM-dd")])
+            elif method == "Regex":
+                pattern = self.filter_column[col].pattern
+                if pattern:
+                    clauses.append("{} REGEXP ?".format(expression))
+                    params.append(pattern)
+            elif method == "Set":
+                values = sorted(self.filter_column[col])
+                if values:
+                    clauses.append("{} IN ({})".format(expression, ", ".join("?" * len(values))))
+                    params.extend(values)
+            elif method == "Match":
+                # One parameter however many values, a search may find thousands of dishes
+                clauses.append("{} IN (SELECT value FROM json_each(?))".format(expression))
+                params.append(json.dumps(sorted(self.filter_column[col])))
+        return " AND ".join(clauses), tuple(params)
+
+    def sql_date_range(self):
+        # First and last day of the rows the date filters pushed down let through, None where unlimited
+        first, last = None, None
+        for col in self.sql_columns:
+            if self.filter_method.get(col) == "Date" and col in self.filter_column:
+                min_date, max_date = (day.toPyDate() for day in self.filter_column[col])
+                first = min_date if first is None else max(first, min_date)
+                last = max_date if last is None else min(last, max_date)
+        return first, last
+
+    def apply_sql_filter(self):
+        self.sql_filter_timer.stop()
+        if self.sql_columns and self.sourceModel() is not None:
+            self.sourceModel().set_filter(*self.sql_filter(), self.sql_date_range())
 
     def set_col_number_filter(self, col, min_number, max_number):
         self.filter_method[col] = "Number"
@@ -19,14 +293,40 @@ class TableFilter(QSortFilterProxyModel):
         if max_number != -1:
             max_num = max_number
         self.filter_column[col] = (min_num, max_num)
-        self.invalidateFilter()
+        self.filter_changed(col)
 
     def set_col_regex_filter(self, col, regex):
         self.filter_method[col] = "Regex"
         if isinstance(regex, str):
-            regex = re.compile(regex)
+            try:
+                regex = compile_regex(regex)
+            except re.error:
+                # Half typed, like "(", the text is taken as it is until it is a valid pattern
+                regex = compile_regex(re.escape(regex))
         self.filter_column[col] = regex
-        self.invalidateFilter()
+        self.filter_changed(col)
+
+    def set_col_set_filter(self, col, values):
+        # Only rows whose text is one of values, every row when values is empty
+        self.filter_method[col] = "Set"
+        if values:
+            self.filter_column[col] = frozenset(values)
+        else:
+            self.filter_column.pop(col, None)
+        self.filter_changed(col)
+
+    def set_col_match_filter(self, col, values):
+        # Only rows whose typed value (SORT_ROLE) is one of values, none when values is empty and every row for None
+        if values is not None:
+            values = frozenset(values)
+        if self.filter_method.get(col) == "Match" and self.filter_column.get(col) == values:
+            return
+        self.filter_method[col] = "Match"
+        if values is None:
+            self.filter_column.pop(col, None)
+        else:
+            self.filter_column[col] = values
+        self.filter_changed(col)
 
     def set_col_date_filter(self, col, lower_date, higher_date):
         self.filter_method[col] = "Date"
@@ -38,13 +338,29 @@ class TableFilter(QSortFilterProxyModel):
         if isinstance(higher_date, QDate):
             high_date = higher_date
         self.filter_column[col] = (low_date, high_date)
-        self.invalidateFilter()
+        self.filter_changed(col)
+
+    @timed("filter.sort")
+    def sort(self, column, order=Qt.AscendingOrder):
+        # A source model reading its rows from the database orders them there, with the same SQL as the filters
+        source_model = self.sourceModel()
+        if self.sql_columns and hasattr(source_model, "set_order"):
+            source_model.set_order(column, order)
+            return
+        super(TableFilter, self).sort(column, order)
 
     def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if np is not None and not source_parent.isValid():
+            if self.filter_mask is None:
+                self.filter_mask = self.compute_filter_mask()
+            if source_row < len(self.filter_mask):
+                return self.filter_mask[source_row]
         for col, item in self.filter_column.items():
+            if col in self.sql_columns:
+                continue
             index = self.sourceModel().index(source_row, col, source_parent)
             if index.isValid():
-                data = self.sourceModel().data(index)
+                data = self.sourceModel().data(index, self.filter_role(col))
                 method = self.filter_method[col]
                 if method == "Number" and not self.col_number_in_range(col, float(data)):
                     return False
@@ -52,26 +368,13 @@ class TableFilter(QSortFilterProxyModel):
                     return False
                 elif method == "Date" and not self.col_date_in_range(col, QDate.fromString(data, "yyyy-MM-dd")):
                     return False
+                elif method == "Set" and item and data not in item:
+                    return False
+                elif method == "Match" and data not in item:
+                    return False
 
         return True
 
-    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
-        left_data = self.sourceModel().data(left)
-        right_data = self.sourceModel().data(right)
-
-        col = left.column()
-        if col in self.filter_method:
-            method = self.filter_method[col]
-            if method == "Number":
-                return float(left_data) < float(right_data)
-            elif method == "Regex":
-                return left_data < right_data
-            elif method == "Date":
-                left_data = QDate.fromString(left_data, "yyyy-MM-dd")
-                right_data = QDate.fromString(right_data, "yyyy-MM-dd")
-                return left_data < right_data
-        return False
-
     def col_number_in_range(self, col, number):
         min_number, max_number = self.filter_column[col]
         if max_number > 0 and max_number > min_number:
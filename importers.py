@@ -0,0 +1,242 @@
+import csv
+import math
+import re
+import sqlite3
+from datetime import date, datetime
+from itertools import islice
+
+import database
+import search
+
+SKIP, UPSERT, ABORT = "skip", "upsert", "abort"
+DUPLICATE_POLICIES = (SKIP, UPSERT, ABORT)
+
+SQL_INSERT_DISH = """
+    INSERT INTO dish(name, price, remarks)
+    VALUES (?, ?, ?)"""
+
+SQL_UPDATE_DISH_REMARKS = """
+    UPDATE dish SET remarks = ?
+    WHERE name = ? AND price = ?"""
+
+
+class ImportResult:
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.updated = 0
+        self.skipped = 0
+        # (line number, message) of rejected rows, at most MAX_ERRORS of them are kept
+        self.errors = []
+        self.error_count = 0
+        # Whether the import was called off without writing anything
+        self.aborted = False
+
+    MAX_ERRORS = 1000
+
+    def add_error(self, line_no, message):
+        self.error_count += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line_no, message))
+
+    def summary(self):
+        if self.aborted:
+            return "第{}行: {}".format(*self.errors[0]) if self.error_count == 1 else \
+                "共{}处错误，未导入任何数据".format(self.error_count)
+        summary = "共{}行: 新增{}, 更新{}, 跳过{}".format(self.rows, self.inserted, self.updated, self.skipped)
+        return summary + ("，{}行有误".format(self.error_count) if self.error_count else "")
+
+
+def parse_menu_row(row):
+    """Return (name, price, remark) of a "菜品,价格[,备注]" CSV row, raise ValueError with the reason."""
+    if len(row) == 2:
+        name, price = row
+        remark = ""
+    elif len(row) == 3:
+        name, price, remark = row
+    else:
+        raise ValueError('格式为"菜品,价格"或者"菜品,价格,备注"')
+    name = name.strip()
+    if not name:
+        raise ValueError("菜品名为空")
+    try:
+        price = float(price)
+    except ValueError:
+        raise ValueError("价格输入有误")
+    if not math.isfinite(price) or price < 0:
+        raise ValueError("价格输入有误")
+    return name, round(price, 2), remark
+
+
+def iter_csv(file_name, parse_row, result, header=False):
+    """
+    Yield (line number,) + parse_row(row) for the valid rows and record the others in result.
+
+    With header set, a first row that does not parse is taken for column titles and skipped silently.
+    """
+    with open(file_name, "r", newline="") as file:
+        for line_no, row in enumerate(csv.reader(file, delimiter=","), 1):
+            if not row:
+                continue
+            try:
+                yield (line_no,) + parse_row(row)
+            except ValueError as error:
+                if not (header and line_no == 1):
+                    result.add_error(line_no, str(error))
+
+
+def dish_keys(connection):
+    return {(name, round(float(price), 2)) for name, price in connection.execute("SELECT name, price FROM dish")}
+
+
+def validate_menu_csv(connection, file_name, policy=SKIP, preview_size=100, progress=None):
+    """
+    Read the whole file once and report every bad row, without writing anything.
+
+    Returns (result, preview) where preview holds the first preview_size valid rows. With the ABORT policy a
+    dish that is already on the menu, or repeated in the file, counts as a bad row.
+    """
+    result = ImportResult()
+    preview = []
+    seen = dish_keys(connection)
+    for line_no, name, price, remark in iter_csv(file_name, parse_menu_row, result):
+        result.rows += 1
+        if len(preview) < preview_size:
+            preview.append((name, price, remark))
+        if (name, price) in seen:
+            if policy == ABORT:
+                result.add_error(line_no, "菜品价格组合重复")
+            elif policy == UPSERT:
+                result.updated += 1
+            else:
+                result.skipped += 1
+        else:
+            seen.add((name, price))
+            result.inserted += 1
+        if progress is not None and line_no % 1000 == 0:
+            progress(line_no)
+    result.errors.sort()
+    result.aborted = bool(result.error_count)
+    return result, preview
+
+
+def import_menu_csv(connection, file_name, policy=SKIP, chunk_size=1000, progress=None):
+    """
+    Validate then import a menu CSV in one transaction, streaming it in chunks through executemany.
+
+    Nothing is written if any row is bad, see validate_menu_csv. Duplicates are skipped, update the remarks of
+    the existing dish, or abort the import, depending on policy.
+    """
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError("Unknown duplicate policy {!r}".format(policy))
+    result = ImportResult()
+    cursor = connection.cursor()
+    # Hold the write lock from validation on, so no other writer can add a duplicate in between
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        result, _ = validate_menu_csv(connection, file_name, policy, preview_size=0)
+        if result.aborted:
+            connection.rollback()
+            return result
+
+        seen = dish_keys(connection)
+        rows = iter_csv(file_name, parse_menu_row, ImportResult())
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            inserts = []
+            updates = []
+            for line_no, name, price, remark in chunk:
+                if (name, price) not in seen:
+                    seen.add((name, price))
+                    inserts.append((name, price, remark))
+                elif policy == UPSERT:
+                    updates.append((remark, name, price))
+            cursor.executemany(SQL_INSERT_DISH, inserts)
+            cursor.executemany(SQL_UPDATE_DISH_REMARKS, updates)
+            if progress is not None:
+                progress(chunk[-1][0])
+    except sqlite3.Error as error:
+        connection.rollback()
+        result.add_error(0, str(error))
+        result.aborted = True
+        return result
+    finally:
+        cursor.close()
+    connection.commit()
+    search.index_initials(connection)
+    return result
+
+
+SALES_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%Y%m%d", "%Y.%m.%d")
+SELL_NUM_PATTERN = re.compile(r"(\d+)(?:\.0*)?")
+
+
+def parse_sales_date(text):
+    text = text.strip()
+    for date_format in SALES_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError("日期输入有误")
+
+
+def parse_sales_row(row):
+    """Return (date, name, price, sell_num) of a "日期,菜品,价格,售出" POS export row, raise ValueError otherwise."""
+    if len(row) != 4:
+        raise ValueError('格式为"日期,菜品,价格,售出"')
+    sell_date = parse_sales_date(row[0])
+    name, price, _ = parse_menu_row(row[1:3])
+    # A whole number of units, "3.00" as some POS write it is fine but "2.7" or "1e3" are not
+    match = SELL_NUM_PATTERN.fullmatch(row[3].strip())
+    if match is None:
+        raise ValueError("售出数量须为非负整数")
+    return sell_date, name, price, int(match.group(1))
+
+
+def import_sales_csv(connection, file_name, chunk_size=10000, progress=None):
+    """
+    Import daily sales from a POS export into dish_data, chunk_size rows per transaction.
+
+    Every row is the total of one dish on one day, so a repeated (date, dish) replaces the earlier number as in
+    the sales popup. Dishes are resolved by (name, price) from an in-memory lookup of the menu; rows naming an
+    unknown dish, or that do not parse, are skipped and reported. Memory stays bounded by the menu and one chunk.
+    The rollup triggers are suspended meanwhile and the touched weeks and months rebuilt once at the end.
+    """
+    result = ImportResult()
+    dish_ids = {(name, round(float(price), 2)): dish_id
+                for dish_id, name, price in connection.execute("SELECT id, name, price FROM dish")}
+    first_date = last_date = None
+    rows = iter_csv(file_name, parse_sales_row, result, header=True)
+    suspension_id = database.suspend_rollups(connection)
+    cursor = connection.cursor()
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            records = []
+            for line_no, sell_date, name, price, sell_num in chunk:
+                dish_id = dish_ids.get((name, price))
+                if dish_id is None:
+                    result.add_error(line_no, "菜品{}({:.2f})不存在".format(name, price))
+                    continue
+                records.append((dish_id, sell_date.isoformat(), sell_num))
+                first_date = sell_date if first_date is None else min(first_date, sell_date)
+                last_date = sell_date if last_date is None else max(last_date, sell_date)
+            result.rows += len(chunk)
+            cursor.executemany(database.SQL_UPSERT_DISH_DATA, records)
+            connection.commit()
+            result.inserted += len(records)
+            if progress is not None:
+                progress(chunk[-1][0])
+    except sqlite3.Error as error:
+        connection.rollback()
+        result.add_error(0, str(error))
+    finally:
+        cursor.close()
+        database.resume_rollups(connection, suspension_id, first_date, last_date)
+    result.errors.sort()
+    return result
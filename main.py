@@ -1,85 +1,93 @@
-import csv
+import time
+
+# Startup is measured from here, before the Qt imports, to the first paint of the window
+STARTED = time.perf_counter()
+
+import argparse
 import os
 import sqlite3
 from datetime import datetime, timedelta
 from typing import Union
 
 import sys
-from PyQt5 import QtCore, uic
-from PyQt5.QtChart import QChart, QChartView, QValueAxis, QBarCategoryAxis, QBarSeries, QBarSet
-from PyQt5.QtCore import Qt, QDate, QDateTime
-from PyQt5.QtGui import QStandardItemModel, QStandardItem, QPainter, QCursor
-from PyQt5.QtWidgets import (QMainWindow, QApplication, QWidget, QFileDialog, QMessageBox, QTableWidgetItem, QSpinBox,
-                             QHeaderView, QToolTip)
-
-from filters import TableFilter
-from models import DishTableDelegateCell, DishDataTableDelegateCell
-
-
-def str_type(text):
-    try:
-        int(text)
-        return int
-    except ValueError:
-        try:
-            float(text)
-            return float
-        except ValueError:
-            try:
-                complex(text)
-                return complex
-            except ValueError:
-                return str
-
-
-def create_dish_data_table_row(dish_id: int, date: str, dish_name: str, dish_price: float,
-                               sell_num: Union[int, str], choose=0):
-    # ID
-    row = [QStandardItem(str(dish_id))]
-    # Data Date
-    date_item = QStandardItem(date)
-    date_item.setTextAlignment(Qt.AlignCenter)
-    row.append(date_item)
-    # Dish Name
-    name_item = QStandardItem(dish_name)
-    name_item.setTextAlignment(Qt.AlignCenter)
-    row.append(name_item)
-    # Dish Price
-    price_item = QStandardItem("{:.2f}".format(dish_price if dish_price else -0.01))
-    price_item.setTextAlignment(Qt.AlignCenter)
-    row.append(price_item)
-    # Dish Sell Number on date
-    sell_item = QStandardItem(str(sell_num))
-    sell_item.setTextAlignment(Qt.AlignCenter)
-    row.append(sell_item)
-    # Choose
-    row.append(QStandardItem(str(choose)))
-    return row
-
-
-def create_dish_table_row(dish_id: int, dish_name: str, dish_price: float, sell_num: Union[int, str], dish_remark: str):
+from PyQt5 import QtCore
+from PyQt5.QtChart import QChartView
+from PyQt5.QtCore import Qt, QDate, QEvent, QModelIndex, QTimer, pyqtSignal
+from PyQt5.QtGui import QStandardItem, QStandardItemModel, QPainter
+from PyQt5.QtWidgets import (QMainWindow, QApplication, QWidget, QFileDialog, QMessageBox, QTableWidgetItem,
+                             QHeaderView, QLabel, QProgressDialog)
+
+import database
+import diagnostics
+import exporters
+import importers
+import repository
+import search
+from branches import BranchSet
+from charts import SalesChart, RevenueTrendChart, WeekdayChart, BUCKETS, WEEKDAY_NAMES
+from filters import TableFilter, SORT_ROLE, sql_regexp
+from models import (DishTableModel, DishTableDelegateCell, DishDataTableDelegateCell, DishDataTableModel,
+                    NewDishDataTableDelegateCell, NewDishDataTableModel)
+from uiloader import setup_ui
+from workers import DatabaseTask, DatabaseWorker, SalesWriteQueue
+
+try:
+    import analytics
+except ImportError:  # The analytics tab needs NumPy
+    analytics = None
+
+
+def init_worker_connection(connection):
+    # Runs on the worker thread, the proxy filters of the data tab use REGEXP in SQL
+    connection.create_function("REGEXP", 2, sql_regexp, deterministic=True)
+
+
+def create_sort_item(text, sort_value):
+    # Item showing text, sorted by the typed sort_value
+    item = QStandardItem(text)
+    item.setData(sort_value, SORT_ROLE)
+    return item
+
+
+def create_dish_table_row(dish_id: int, dish_name: str, dish_price: float, sell_num: Union[int, str], dish_remark: str,
+                          branch: str = ""):
     # ID
-    row = [QStandardItem(str(dish_id))]
+    row = [create_sort_item(str(dish_id), int(dish_id))]
     # Dish Name
-    name_item = QStandardItem(dish_name)
+    name_item = create_sort_item(dish_name, dish_name)
     name_item.setTextAlignment(Qt.AlignCenter)
     row.append(name_item)
     # Dish Price
-    price_item = QStandardItem("{:.2f}".format(dish_price))
+    price_item = create_sort_item("{:.2f}".format(dish_price), float(dish_price))
     price_item.setTextAlignment(Qt.AlignCenter)
     row.append(price_item)
     # Dish Week Sell Number
-    sell_item = QStandardItem(str(sell_num))
+    sell_item = create_sort_item(str(sell_num), int(sell_num))
     sell_item.setTextAlignment(Qt.AlignCenter)
     row.append(sell_item)
     # Dish Manipulation Button
     row.append(None)
     # Dish Remark
-    row.append(QStandardItem(dish_remark))
+    row.append(create_sort_item(dish_remark, dish_remark))
+    # Branch, with several branches open
+    branch_item = create_sort_item(branch, branch)
+    branch_item.setTextAlignment(Qt.AlignCenter)
+    row.append(branch_item)
     return row
 
 
+def create_analytics_item(value):
+    # Numbers are kept as numbers so the view sorts them as such, None shows as an empty cell
+    item = QStandardItem()
+    item.setData(value, Qt.DisplayRole)
+    item.setTextAlignment(Qt.AlignCenter)
+    return item
+
+
 class MainWindow(QMainWindow):
+    # Milliseconds from STARTED to the first paint of the window
+    first_painted = pyqtSignal(float)
+
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     MAIN_UI_FILE = os.path.join(BASE_DIR, "main.ui")
     NEW_DISH_POPUP_UI_FILE = os.path.join(BASE_DIR, "new_dish_popup.ui")
@@ -87,31 +95,49 @@ class MainWindow(QMainWindow):
     NEW_DISH_DATA_POPUP_UI_FILE = os.path.join(BASE_DIR, "new_dish_data_popup.ui")
     MODIFY_DISH_POPUP_UI_FILE = os.path.join(BASE_DIR, "modify_dish_popup.ui")
     DB_FILE = os.path.join(BASE_DIR, "restaurant.db")
+    # Longest a saved sale waits before it is written, see SalesWriteQueue
+    SALES_FLUSH_MS = SalesWriteQueue.FLUSH_MS
 
     def __init__(self):
         super(MainWindow, self).__init__()
         # Initialize variable
-        self.db_connection = None
-        self.new_dish_popup = QWidget()
-        self.new_dish_multi_popup = QWidget()
-        self.new_dish_data_popup = QWidget()
-        self.modify_dish_popup = QWidget()
-        self.dish_table_model = QStandardItemModel(0, 6)
+        self.db_worker = None
+        self.sales_queue = None
+        # The branch databases shown together instead of DB_FILE, see open_branches
+        self.branch_set = None
+        self.loading_label = QLabel("正在加载…")
+        # The sales of the date shown in the new dish data popup, and of the dates next to it fetched ahead
+        self.new_dish_data_model = NewDishDataTableModel()
+        self.prefetching_dates = set()
+        # Popups are built the first time they are used, see the properties below
+        self._new_dish_popup = None
+        self._new_dish_multi_popup = None
+        self._new_dish_data_popup = None
+        self._modify_dish_popup = None
+        self.dish_table_model = DishTableModel(0, 7)
         self.dish_table_proxy = TableFilter()
-        self.dish_data_table_model = QStandardItemModel(0, 6)
+        self.dish_data_table_model = DishDataTableModel()
         self.dish_data_table_proxy = TableFilter()
-        self.graph_chart = None
-        self.graph_series = {}
-
-        # Load UI designs
-        uic.loadUi(self.MAIN_UI_FILE, self)
-        uic.loadUi(self.NEW_DISH_POPUP_UI_FILE, self.new_dish_popup)
-        uic.loadUi(self.NEW_DISH_MULTI_POPUP_UI_FILE, self.new_dish_multi_popup)
-        uic.loadUi(self.NEW_DISH_DATA_POPUP_UI_FILE, self.new_dish_data_popup)
-        uic.loadUi(self.MODIFY_DISH_POPUP_UI_FILE, self.modify_dish_popup)
+        self.sales_chart = None
+        self.analytics = analytics.Analytics() if analytics is not None else None
+        self.analytics_model = QStandardItemModel(0, 9)
+        self.shown_analysis = None
+        self.search_cache = search.SearchCache()
+        self.revenue_trend_chart = None
+        self.weekday_chart = None
+        self.menu_import_file = None
+        self.menu_import_task = None
+        self.sales_import_task = None
+        self.export_task = None
+        self.export_progress = None
+        self.startup_ms = None
+
+        # Load UI design
+        setup_ui(self, self.MAIN_UI_FILE)
         self.init_dish_table()
         self.init_dish_data_table()
         self.init_graph()
+        self.init_analytics()
 
         # Connect to database
         self.init_db_connection()
@@ -120,12 +146,15 @@ class MainWindow(QMainWindow):
         self.action_new_dish.triggered.connect(self.show_new_dish_popup)
         self.action_new_dish_multi.triggered.connect(self.show_new_dish_multi_popup)
         self.action_new_data_multi.triggered.connect(lambda: self.modify_new_dish_data_popup_table(show=True))
+        self.action_import_sales.triggered.connect(self.import_sales)
+        self.action_export_sales.triggered.connect(self.export_sales)
+        self.action_open_branches.triggered.connect(self.choose_branches)
+        self.action_open_own.triggered.connect(lambda: self.open_branches(None))
         self.tabWidget.currentChanged.connect(self.update_graph)
+        self.tabWidget.currentChanged.connect(lambda index: self.update_analytics())
 
         # Dish Table filter bind
-        self.dish_lineEdit.textChanged.connect(
-            lambda text, col_idx=1: self.dish_table_proxy.set_col_regex_filter(col_idx, text)
-        )
+        self.dish_lineEdit.textChanged.connect(lambda text: self.update_search("dish"))
         self.lower_price_doubleSpinBox.valueChanged.connect(
             lambda value, col_idx=2: self.dish_table_proxy.set_col_number_filter(col_idx, value, -1)
         )
@@ -138,6 +167,10 @@ class MainWindow(QMainWindow):
         self.higher_week_sell_spinBox.valueChanged.connect(
             lambda value, col_idx=3: self.dish_table_proxy.set_col_number_filter(col_idx, -1, value)
         )
+        self.dish_branch_comboBox.currentIndexChanged.connect(
+            lambda idx, col_idx=6: self.dish_table_proxy.set_col_set_filter(
+                col_idx, [self.dish_branch_comboBox.currentText()] if idx > 0 else [])
+        )
 
         # Dish Data Table filter bind
         self.lower_data_dateEdit.dateChanged.connect(
@@ -146,9 +179,7 @@ class MainWindow(QMainWindow):
         self.higher_data_dateEdit.dateChanged.connect(
             lambda date, col_idx=1: self.dish_data_table_proxy.set_col_date_filter(col_idx, -1, date)
         )
-        self.data_lineEdit.textChanged.connect(
-            lambda text, col_idx=2: self.dish_data_table_proxy.set_col_regex_filter(col_idx, text)
-        )
+        self.data_lineEdit.textChanged.connect(lambda text: self.update_search("data"))
         self.lower_data_doubleSpinBox.valueChanged.connect(
             lambda value, col_idx=3: self.dish_data_table_proxy.set_col_number_filter(col_idx, value, -1)
         )
@@ -161,128 +192,310 @@ class MainWindow(QMainWindow):
         self.higher_data_spinBox.valueChanged.connect(
             lambda value, col_idx=4: self.dish_data_table_proxy.set_col_number_filter(col_idx, -1, value)
         )
+        self.data_branch_comboBox.currentIndexChanged.connect(
+            lambda idx, col_idx=6: self.dish_data_table_proxy.set_col_set_filter(
+                col_idx, [self.data_branch_comboBox.currentText()] if idx > 0 else [])
+        )
         self.data_all_check_checkBox.stateChanged.connect(
             lambda state, col_idx=5: self.data_table_check_state(state, col_idx)
         )
-        self.dish_data_table_model.itemChanged.connect(self.update_series)
-
-        # Popup bind action triggers
-        self.new_dish_popup.create_new_dish_btn.clicked.connect(self.create_new_dish)
-        self.new_dish_multi_popup.pushButton_ok.clicked.connect(self.create_new_dish_multi)
-        self.new_dish_data_popup.dateEdit.dateChanged.connect(self.modify_new_dish_data_popup_table)
-        self.new_dish_data_popup.pushButton_ok.clicked.connect(self.create_new_dish_data)
-
-        # Get current dishes
-        self.load_dish_table()
-        self.load_dish_data_table()
-        self.new_dish_data_popup.dateEdit.setDate(QtCore.QDate.currentDate())
+        self.data_invert_check_btn.clicked.connect(lambda: self.data_table_check_state(None, 5))
+        self.data_clear_check_btn.clicked.connect(self.clear_data_table_check_state)
+        self.dish_data_table_model.dataChanged.connect(self.update_series)
+
+    @property
+    def new_dish_popup(self):
+        if self._new_dish_popup is None:
+            self._new_dish_popup = setup_ui(QWidget(), self.NEW_DISH_POPUP_UI_FILE)
+            self._new_dish_popup.create_new_dish_btn.clicked.connect(self.create_new_dish)
+        return self._new_dish_popup
+
+    @property
+    def new_dish_multi_popup(self):
+        if self._new_dish_multi_popup is None:
+            self._new_dish_multi_popup = setup_ui(QWidget(), self.NEW_DISH_MULTI_POPUP_UI_FILE)
+            self._new_dish_multi_popup.pushButton_ok.clicked.connect(self.create_new_dish_multi)
+        return self._new_dish_multi_popup
+
+    @property
+    def new_dish_data_popup(self):
+        if self._new_dish_data_popup is None:
+            self._new_dish_data_popup = setup_ui(QWidget(), self.NEW_DISH_DATA_POPUP_UI_FILE)
+            self._new_dish_data_popup.dateEdit.setDate(QtCore.QDate.currentDate())
+            self._new_dish_data_popup.dateEdit.dateChanged.connect(self.modify_new_dish_data_popup_table)
+            self._new_dish_data_popup.pushButton_ok.clicked.connect(self.create_new_dish_data)
+            self._new_dish_data_popup.pushButton_cancel.clicked.connect(self.new_dish_data_model.discard_edits)
+            table_view = self._new_dish_data_popup.tableView
+            table_view.setModel(self.new_dish_data_model)
+            # Numbers are typed into the cells, no spin box is created per row
+            table_view.setItemDelegateForColumn(NewDishDataTableModel.SELL_NUM_COLUMN,
+                                                NewDishDataTableDelegateCell(table_view))
+            table_view.setColumnHidden(0, True)
+        return self._new_dish_data_popup
+
+    @property
+    def modify_dish_popup(self):
+        if self._modify_dish_popup is None:
+            self._modify_dish_popup = setup_ui(QWidget(), self.MODIFY_DISH_POPUP_UI_FILE)
+        return self._modify_dish_popup
+
+    def event(self, event):
+        if event.type() == QEvent.Paint and self.startup_ms is None:
+            self.startup_ms = (time.perf_counter() - STARTED) * 1000
+            # Get current dishes once the empty window is on screen
+            QTimer.singleShot(0, self.load_dish_table)
+            QTimer.singleShot(0, self.load_dish_data_table)
+            self.first_painted.emit(self.startup_ms)
+        return super(MainWindow, self).event(event)
 
     def init_dish_table(self):
         self.dish_tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
         # Set Header data and stretch
-        for col, col_name in enumerate(["ID", "菜品", "价格", "近7天总售出", "操作", "备注"]):
+        for col, col_name in enumerate(["ID", "菜品", "价格", "近7天总售出", "操作", "备注", "分店"]):
             self.dish_table_model.setHeaderData(col, Qt.Horizontal, col_name, Qt.DisplayRole)
         self.dish_table_proxy.setSourceModel(self.dish_table_model)
         self.dish_tableView.setModel(self.dish_table_proxy)
         self.dish_tableView.setColumnHidden(0, True)
-        for (col, method) in [(1, "Regex"), (2, "Number"), (3, "Number"), (5, "Regex")]:
+        self.dish_tableView.setItemDelegateForColumn(
+            4, DishTableDelegateCell(self.show_modify_dish_popup, self.delete_dish, self.dish_tableView))
+        for (col, method) in [(1, "Regex"), (2, "Number"), (3, "Number"), (5, "Regex"), (6, "Set")]:
             self.dish_table_proxy.filter_method[col] = method
 
     def init_dish_data_table(self):
         self.data_tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-        for col, col_name in enumerate(["Dish_ID", "日期", "菜品", "价格", "售出", "选择"]):
+        for col, col_name in enumerate(["Dish_ID", "日期", "菜品", "价格", "售出", "选择", "分店"]):
             self.dish_data_table_model.setHeaderData(col, Qt.Horizontal, col_name, Qt.DisplayRole)
         self.dish_data_table_proxy.setSourceModel(self.dish_data_table_model)
+        self.dish_data_table_model.load_failed.connect(
+            lambda error: self.statusbar.showMessage(self.tr("流水加载失败：{}".format(error)), 10000))
         self.data_tableView.setModel(self.dish_data_table_proxy)
         self.data_tableView.setColumnHidden(0, True)
-        for (col, method) in [(1, "Date"), (2, "Regex"), (3, "Number"), (4, "Number")]:
+        for (col, method) in [(1, "Date"), (2, "Regex"), (3, "Number"), (4, "Number"), (6, "Set")]:
             self.dish_data_table_proxy.filter_method[col] = method
+        self.dish_data_table_proxy.sql_columns = {
+            0: "dish_data.dish_id", 1: "dish_data.date", 2: "dish.name", 3: "dish.price", 4: "dish_data.sell_num"
+        }
 
     def init_graph(self):
-        self.graph_chart = QChart(title="售出图")
-        self.graph_chart.legend().setVisible(True)
-        self.graph_chart.setAcceptHoverEvents(True)
+        self.sales_chart = SalesChart()
+        self.graph_bucket_comboBox.currentIndexChanged.connect(lambda idx: self.sales_chart.set_bucket(BUCKETS[idx]))
+        self.graph_top_spinBox.valueChanged.connect(self.sales_chart.set_top_n)
+        self.sales_chart.set_top_n(self.graph_top_spinBox.value())
 
-        graph_view = QChartView(self.graph_chart)
+        graph_view = QChartView(self.sales_chart.chart)
         graph_view.setRenderHint(QPainter.Antialiasing)
         self.gridLayout_5.addWidget(graph_view)
 
+    def init_analytics(self):
+        if self.analytics is None:
+            self.tabWidget.removeTab(self.tabWidget.indexOf(self.analytics_tab))
+            return
+        for col, col_name in enumerate(["菜品", "价格", "售出", "营业额", "占比(%)", "ABC", "上期营业额", "环比(%)",
+                                        "高峰日"]):
+            self.analytics_model.setHeaderData(col, Qt.Horizontal, col_name, Qt.DisplayRole)
+        self.analytics_tableView.setModel(self.analytics_model)
+        self.analytics_tableView.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.analytics_tableView.sortByColumn(3, Qt.DescendingOrder)
+        self.revenue_trend_chart = RevenueTrendChart()
+        self.weekday_chart = WeekdayChart()
+        for chart in (self.revenue_trend_chart, self.weekday_chart):
+            chart_view = QChartView(chart.chart)
+            chart_view.setRenderHint(QPainter.Antialiasing)
+            self.horizontalLayout_analytics_charts.addWidget(chart_view)
+        self.horizontalLayout_analytics_charts.setStretch(0, 2)
+        self.horizontalLayout_analytics_charts.setStretch(1, 1)
+        self.lower_analytics_dateEdit.setDate(QDate.currentDate().addDays(-27))
+        self.higher_analytics_dateEdit.setDate(QDate.currentDate())
+        self.lower_analytics_dateEdit.dateChanged.connect(lambda date: self.update_analytics())
+        self.higher_analytics_dateEdit.dateChanged.connect(lambda date: self.update_analytics())
+
     def init_db_connection(self):
-        self.db_connection = sqlite3.connect(self.DB_FILE)
-        cursor = self.db_connection.cursor()
-        # check create table if not exist
-        sql_create_dish_table = """ CREATE TABLE IF NOT EXISTS dish (
-                                        id integer PRIMARY KEY,
-                                        name text NOT NULL,
-                                        price numeric Not NULL,
-                                        remarks text,
-                                        UNIQUE (name, price)
-                                    ); """
-        sql_create_dish_data_table = """ CREATE TABLE IF NOT EXISTS dish_data (
-                                            dish_id integer NOT NULL REFERENCES dish(id) ON DELETE CASCADE,
-                                            date date,
-                                            sell_num integer DEFAULT 0,
-                                            PRIMARY KEY (dish_id, date),
-                                            CONSTRAINT dish_fk 
-                                                FOREIGN KEY (dish_id) 
-                                                REFERENCES dish (id) ON DELETE CASCADE 
-                                        ); """
-        sql_trigger = """
-            CREATE TRIGGER IF NOT EXISTS place_holder_data
-            AFTER INSERT ON dish
-            BEGIN
-                INSERT INTO dish_data (dish_id, date, sell_num) VALUES(new.id, null, 0);
-            END;
-        """
-        cursor.execute(sql_create_dish_table)
-        cursor.execute(sql_create_dish_data_table)
-        cursor.execute("PRAGMA FOREIGN_KEYS = on")
-        cursor.execute(sql_trigger)
-
-        cursor.close()
+        self.statusbar.addPermanentWidget(self.loading_label)
+        self.loading_label.hide()
+        self.start_db_worker()
+        # Sales entered in the popup are written behind, in batches; a journal next to the database keeps them
+        # until then, and what a crash left in it is written now
+        self.sales_queue = SalesWriteQueue(self.DB_FILE + "-pending", self.write_sales, self.SALES_FLUSH_MS,
+                                           parent=self)
+        self.sales_queue.write_failed.connect(lambda error: QMessageBox.warning(self, "保存失败", error))
+        self.new_dish_data_model.queued = self.sales_queue.sell_num
+        recovered = self.sales_queue.recover()
+        if recovered:
+            self.statusbar.showMessage(self.tr("已恢复{}条未保存的流水".format(recovered)), 10000)
+        self.update_branch_mode()
+        if diagnostics.instrumentation is not None:
+            self.statusbar.addPermanentWidget(diagnostics.DiagnosticsLabel(self))
+
+    def start_db_worker(self):
+        # Every query runs on the worker thread, which creates or upgrades the schema in place when it connects
+        self.db_worker = DatabaseWorker(self.DB_FILE, on_connect=init_worker_connection, parent=self,
+                                        branch_set=self.branch_set)
+        self.db_worker.busy_changed.connect(self.loading_label.setVisible)
+        self.db_worker.failed.connect(
+            lambda error: self.statusbar.showMessage(self.tr("数据库操作失败：{}".format(error)), 10000))
+        # Catch up with the writes in the background while the analytics are shown
+        self.db_worker.busy_changed.connect(lambda busy: busy or self.update_analytics())
+        # and search again, a new or renamed dish may match now
+        self.db_worker.busy_changed.connect(lambda busy: busy or self.update_searches())
+        if self.branch_set is None:
+            # Dishes added by other programs have no initials yet
+            self.db_worker.submit(None, search.index_initials)
+
+    def choose_branches(self):
+        file_names = QFileDialog().getOpenFileNames(None, "选择分店数据库", "", self.tr("数据库文件 (*.db)"))[0]
+        if file_names:
+            self.open_branches(file_names)
+
+    def open_branches(self, db_files):
+        """Show the branch databases db_files together and read-only, or DB_FILE again for None."""
+        branch_set = None
+        if db_files:
+            branch_set = BranchSet(db_files)
+            try:
+                # Fail here on a file that is not a branch database, rather than on every query
+                branch_set.connect().close()
+            except sqlite3.Error as error:
+                QMessageBox.warning(self, "打开失败", str(error))
+                return
+        self.sales_queue.drain()
+        self.db_worker.stop()
+        # Nothing is read until the new worker runs, with the filters of the new mode
+        self.dish_data_table_model.set_worker(None)
+        if self.branch_set is not None:
+            self.branch_set.close()
+        self.branch_set = branch_set
+        self.start_db_worker()
+        # Dish ids mean something else now
+        self.dish_data_table_model.checked.clear()
+        self.sales_chart.clear()
+        if self.analytics is not None:
+            self.analytics.clear()
+            self.shown_analysis = None
+        self.search_cache.clear()
+        self.new_dish_data_model.clear()
+        self.prefetching_dates.clear()
+        self.update_branch_mode()
+        self.load_dish_table()
+        self.dish_data_table_model.set_worker(self.db_worker)
+        self.update_searches()
+        self.update_analytics()
+
+    def update_branch_mode(self):
+        branches = self.branch_set is not None
+        names = self.branch_set.names if branches else []
+        self.setWindowTitle("流水管理系统 - {} 家分店".format(len(names)) if branches else "流水管理系统")
+        for combo_box in (self.dish_branch_comboBox, self.data_branch_comboBox):
+            combo_box.setCurrentIndex(0)
+            while combo_box.count() > 1:
+                combo_box.removeItem(1)
+            combo_box.addItems(names)
+        for widget in (self.label_15, self.dish_branch_comboBox, self.label_16, self.data_branch_comboBox):
+            widget.setVisible(branches)
+        self.dish_tableView.setColumnHidden(6, not branches)
+        self.data_tableView.setColumnHidden(6, not branches)
+        # Copies of the branches are only read, nothing can be added, changed or deleted
+        self.dish_tableView.setColumnHidden(4, branches)
+        for action in (self.action_new_dish, self.action_new_dish_multi, self.action_new_data_multi,
+                       self.action_import_sales):
+            action.setEnabled(not branches)
+        self.dish_data_table_model.branch_of = self.branch_set.branch_of if branches else None
+        if branches:
+            self.dish_data_table_proxy.sql_columns[6] = "dish.branch"
+        else:
+            self.dish_data_table_proxy.sql_columns.pop(6, None)
+            if self.data_tableView.horizontalHeader().sortIndicatorSection() == 6:
+                # The own database has no branches to sort by
+                self.data_tableView.sortByColumn(1, Qt.DescendingOrder)
+        self.dish_data_table_proxy.apply_sql_filter()
+
+    def update_searches(self):
+        for table in ("dish", "data"):
+            self.update_search(table)
+
+    def update_search(self, table):
+        # The boxes above the tables filter by the ids of the dishes the text finds, see search.py
+        line_edit, proxy = ((self.dish_lineEdit, self.dish_table_proxy) if table == "dish" else
+                            (self.data_lineEdit, self.dish_data_table_proxy))
+        text = line_edit.text()
+        key = table + "_search"
+        if not text.split():
+            self.db_worker.cancel(key)
+            proxy.set_col_match_filter(0, None)
+            return
+        version = self.db_worker.writes_done
+        dish_ids = self.search_cache.get(version, text)
+        if dish_ids is not None:
+            self.db_worker.cancel(key)
+            proxy.set_col_match_filter(0, dish_ids)
+            return
+        def found(dish_ids):
+            self.search_cache.store(version, text, dish_ids)
+            # Applied from the cache, unless a write since the search was submitted makes it search again
+            self.update_search(table)
+
+        schemas = self.branch_set.search_schemas() if self.branch_set is not None else search.MAIN_SCHEMA
+        self.db_worker.submit(key, lambda connection: search.matching_dish_ids(connection, text, schemas), found)
+
+    def closeEvent(self, event):
+        if self.export_task is not None:
+            # Leave no half written file behind
+            self.export_task.cancel()
+            self.export_task.wait()
+        self.sales_queue.drain()
+        self.db_worker.stop()
+        if self.branch_set is not None:
+            self.branch_set.close()
+        super(MainWindow, self).closeEvent(event)
 
     def load_dish_table(self):
-        today = datetime.today()
-        sql_select_query = """
-            SELECT dish.id, dish.name, dish.price, COALESCE(SUM(dish_data.sell_num), 0), dish.remarks
-            FROM dish LEFT JOIN dish_data 
-            ON dish.id = dish_data.dish_id
-            WHERE dish_data.date IS NULL OR dish_data.date BETWEEN date('{}') and date('{}')
-            GROUP BY dish.id
-            ORDER BY dish.name, dish.price;""".format(
-            (today - timedelta(days=7)).strftime("%Y-%m-%d"), today.strftime("%Y-%m-%d")
-        )
-        cursor = self.db_connection.cursor()
-        cursor.execute(sql_select_query)
-        records = cursor.fetchall()
+        today = datetime.today().date()
+        # Weekly sell numbers are read from the rollups, only the days around them from dish_data
+        week_start = today - timedelta(days=7)
+        branch_set = self.branch_set
+        if branch_set is None:
+            self.db_worker.submit(
+                "dish_table", lambda connection: repository.dish_table(connection, week_start, today).fetchall(),
+                self.fill_dish_table
+            )
+        else:
+            # Every branch sums up its own week, in parallel
+            self.db_worker.submit(
+                "dish_table", lambda connection: branch_set.dish_table(connection, week_start, today),
+                self.fill_dish_table
+            )
+
+    @diagnostics.timed("dish_table.rebuild")
+    def fill_dish_table(self, records):
+        # Sort and filter once after the bulk append instead of once per row
+        self.dish_table_proxy.setDynamicSortFilter(False)
+        self.dish_table_model.removeRows(0, self.dish_table_model.rowCount())
+        branch_of = self.branch_set.branch_of if self.branch_set is not None else None
         for row_idx, record in enumerate(records):
-            self.dish_table_model.appendRow(create_dish_table_row(*record))
-        cursor.close()
-        self.dish_tableView.setItemDelegateForColumn(
-            4, DishTableDelegateCell(self.show_modify_dish_popup, self.delete_dish, self.dish_tableView))
+            self.dish_table_model.appendRow(create_dish_table_row(*record, branch_of(record[0]) if branch_of else ""))
+        self.dish_table_proxy.setDynamicSortFilter(True)
+        self.dish_table_proxy.invalidate()
 
     def load_dish_data_table(self):
-        sql_select_query = """
-            SELECT dish_data.dish_id, dish_data.date, dish.name, dish.price, dish_data.sell_num
-            FROM dish_data LEFT JOIN dish  
-            ON dish_data.dish_id = dish.id
-            WHERE dish_data.date IS NOT NULL
-            ORDER BY dish_data.date DESC, dish.name, dish.price, dish_data.sell_num;"""
-        cursor = self.db_connection.cursor()
-        cursor.execute(sql_select_query)
-        records = cursor.fetchall()
-        for row_idx, record in enumerate(records):
-            self.dish_data_table_model.appendRow(create_dish_data_table_row(*record))
-        cursor.close()
         self.lower_data_dateEdit.setDate(QDate.currentDate().addDays(-7))
         self.higher_data_dateEdit.setDate(QDate.currentDate())
+        # Filters are answered by the query, rows are paged in from the database as the view scrolls
+        self.dish_data_table_proxy.apply_sql_filter()
+        self.dish_data_table_model.set_worker(self.db_worker)
         self.data_tableView.setItemDelegateForColumn(5, DishDataTableDelegateCell(self.data_tableView))
 
     def data_table_check_state(self, state, col):
-        for row in range(self.dish_data_table_proxy.rowCount()):
-            index = self.dish_data_table_proxy.mapToSource(self.dish_data_table_proxy.index(row, col))
-            if index.isValid():
-                self.dish_data_table_model.setData(index, str(state), Qt.DisplayRole)
+        # Checks, unchecks or for None inverts the rows shown at once, the chart is updated for all of them together
+        proxy = self.dish_data_table_proxy
+        self.dish_data_table_model.set_checked(
+            [proxy.mapToSource(proxy.index(row, col)).row() for row in range(proxy.rowCount())], state)
+
+    def clear_data_table_check_state(self):
+        self.dish_data_table_model.clear_checked()
+        # Rows checked before they were filtered out or their page was evicted are in the chart too
+        self.sales_chart.clear()
+        self.data_all_check_checkBox.blockSignals(True)
+        self.data_all_check_checkBox.setChecked(False)
+        self.data_all_check_checkBox.blockSignals(False)
 
     def show_new_dish_popup(self):
         # Move popup to center
@@ -296,144 +509,240 @@ class MainWindow(QMainWindow):
         file_name = QFileDialog().getOpenFileName(None, "选择文件", "", self.tr("CSV文件 (*.csv)"))[0]
         self.new_dish_multi_popup.tableWidget.setRowCount(0)
         if file_name:
-            with open(file_name, "r") as file:
-                csv_reader = csv.reader(file, delimiter=",")
-                for idx, row_data in enumerate(csv_reader):
-                    if len(row_data) == 2:
-                        name, price = row_data
-                        remark = ""
-                    elif len(row_data) == 3:
-                        name, price, remark = row_data
-                    else:
-                        QMessageBox.warning(
-                            self, "格式错误",
-                            self.tr('格式为"菜品 价格"或者"菜品 价格 备注"\n第{}行输入有误'.format(idx))
-                        )
-                        return
-                    self.new_dish_multi_popup.tableWidget.insertRow(self.new_dish_multi_popup.tableWidget.rowCount())
-                    self.new_dish_multi_popup.tableWidget.setItem(idx, 0, QTableWidgetItem(name))
-                    price_type = str_type(price)
-                    if price_type == str or (isinstance(price_type, (float, int)) and float(price) < 0):
-                        QMessageBox.warning(self, "格式错误", self.tr('第{}行价格输入有误'.format(idx+1)))
-                        return
-                    self.new_dish_multi_popup.tableWidget.setItem(idx, 1,
-                                                                  QTableWidgetItem("{:.2f}".format(float(price))))
-                    self.new_dish_multi_popup.tableWidget.setItem(idx, 2, QTableWidgetItem(remark))
-            self.new_dish_multi_popup.show()
+            # Validate the whole file off the UI thread, the popup only previews its first rows
+            self.menu_import_file = file_name
+            self.menu_import_task = DatabaseTask(self.DB_FILE, importers.validate_menu_csv, file_name)
+            self.menu_import_task.succeeded.connect(self.preview_new_dish_multi)
+            self.menu_import_task.failed.connect(lambda message: QMessageBox.warning(self, "读取失败", message))
+            self.menu_import_task.start()
+
+    def preview_new_dish_multi(self, validation):
+        result, preview = validation
+        if result.aborted:
+            self.show_import_errors(result)
+            return
+        self.new_dish_multi_popup.tableWidget.setRowCount(len(preview))
+        for row_idx, (name, price, remark) in enumerate(preview):
+            self.new_dish_multi_popup.tableWidget.setItem(row_idx, 0, QTableWidgetItem(name))
+            self.new_dish_multi_popup.tableWidget.setItem(row_idx, 1, QTableWidgetItem("{:.2f}".format(price)))
+            self.new_dish_multi_popup.tableWidget.setItem(row_idx, 2, QTableWidgetItem(remark))
+        self.new_dish_multi_popup.summary_label.setText(self.tr("共{}行，{}行与已有菜品重复{}".format(
+            result.rows, result.skipped, "，仅显示前{}行".format(len(preview)) if len(preview) < result.rows else "")))
+        self.new_dish_multi_popup.progressBar.setMaximum(max(result.rows, 1))
+        self.new_dish_multi_popup.progressBar.setValue(0)
+        self.new_dish_multi_popup.progressBar.hide()
+        self.new_dish_multi_popup.pushButton_ok.setEnabled(True)
+        self.new_dish_multi_popup.show()
+
+    def show_import_errors(self, result, max_lines=30):
+        lines = ["第{}行: {}".format(line_no, message) for line_no, message in result.errors[:max_lines]]
+        if result.error_count > max_lines:
+            lines.append("……共{}处错误".format(result.error_count))
+        heading = "未导入任何数据" if result.aborted else result.summary() + "，以下行已跳过"
+        QMessageBox.warning(self, "格式错误", self.tr(heading + "\n" + "\n".join(lines)))
+
+    def import_sales(self):
+        file_name = QFileDialog().getOpenFileName(None, "选择POS导出文件", "", self.tr("CSV文件 (*.csv)"))[0]
+        if not file_name or self.sales_import_task is not None:
+            return
+        self.action_import_sales.setEnabled(False)
+        # The import writes on a connection of its own, after what is still queued
+        self.sales_queue.drain()
+        self.sales_import_task = DatabaseTask(self.DB_FILE, importers.import_sales_csv, file_name)
+        self.sales_import_task.progress.connect(
+            lambda line_no: self.statusbar.showMessage(self.tr("正在导入销售记录，已读取{}行".format(line_no))))
+        self.sales_import_task.succeeded.connect(self.finish_import_sales)
+        self.sales_import_task.failed.connect(lambda message: self.finish_import_sales(None, message))
+        self.sales_import_task.start()
+
+    def finish_import_sales(self, result, error_message=""):
+        self.sales_import_task = None
+        self.action_import_sales.setEnabled(True)
+        self.statusbar.clearMessage()
+        if result is None:
+            QMessageBox.warning(self, "导入失败", error_message)
+            return
+        # Refresh the views once for the whole import
+        self.load_dish_table()
+        self.dish_data_table_model.refresh()
+        if result.error_count:
+            self.show_import_errors(result)
+        else:
+            self.statusbar.showMessage(self.tr(result.summary()), 10000)
+
+    def export_sales(self):
+        file_name, name_filter = QFileDialog().getSaveFileName(None, "导出流水", "流水.xlsx",
+                                                               self.tr("Excel文件 (*.xlsx);;CSV文件 (*.csv)"))
+        if not file_name or self.export_task is not None:
+            return
+        if os.path.splitext(file_name)[1].lower() not in exporters.WRITERS:
+            file_name += ".csv" if name_filter.startswith("CSV") else ".xlsx"
+        # The rows of the data table as filtered and sorted, including the filter still being typed and the sales
+        # still queued
+        self.dish_data_table_proxy.apply_sql_filter()
+        self.sales_queue.drain()
+        where, params, order, date_range = self.dish_data_table_model.query()
+        branch_set = self.branch_set
+        db_file = self.DB_FILE
+
+        def connect():
+            connection = branch_set.connect() if branch_set is not None else database.connect_readonly(db_file)
+            init_worker_connection(connection)
+            return connection
+
+        self.export_task = DatabaseTask(db_file, exporters.export_sales, file_name, where, params, order, date_range,
+                                        branch_set is not None, connect=connect)
+        self.export_progress = QProgressDialog(self.tr("正在导出流水…"), self.tr("取消"), 0, 0, self)
+        self.export_progress.setWindowTitle("导出")
+        self.export_progress.canceled.connect(self.export_task.cancel)
+        self.export_task.progress.connect(
+            lambda rows: self.export_progress.setLabelText(self.tr("正在导出流水，已写出{}行".format(rows))))
+        self.export_task.succeeded.connect(lambda rows: self.finish_export_sales(file_name, rows))
+        self.export_task.failed.connect(lambda message: self.finish_export_sales(file_name, None, message))
+        self.export_task.cancelled.connect(lambda: self.finish_export_sales(file_name, None))
+        self.export_task.start()
+
+    def finish_export_sales(self, file_name, rows, error_message=""):
+        self.export_task = None
+        # Not close(), which would emit canceled
+        self.export_progress.reset()
+        self.export_progress.deleteLater()
+        self.export_progress = None
+        if error_message:
+            QMessageBox.warning(self, "导出失败", error_message)
+        elif rows is not None:
+            self.statusbar.showMessage(self.tr("已导出{}行到{}".format(rows, file_name)), 10000)
 
     def modify_new_dish_data_popup_table(self, *args, show=False):
-        sql_select_query = """
-                    SELECT id, name, price, dish_data.sell_num
-                    FROM dish LEFT JOIN dish_data
-                    ON dish.id=dish_data.dish_id
-                    WHERE dish_data.date IS NULL OR dish_data.date = date('{}')
-                    GROUP BY id, name, price
-                    ORDER BY dish.name, dish.price;""".format(
-            self.new_dish_data_popup.dateEdit.date().toString("yyyy-MM-dd"))
-
-        cursor = self.db_connection.cursor()
-        cursor.execute(sql_select_query)
-        records = cursor.fetchall()
-        self.new_dish_data_popup.tableWidget.setRowCount(len(records))
-        self.new_dish_data_popup.tableWidget.setColumnHidden(0, True)
-        for row_idx, record in enumerate(records):
-            dish_id, name, price, sell_num = record
-            self.new_dish_data_popup.tableWidget.setItem(row_idx, 0, QTableWidgetItem(str(dish_id)))
-            self.new_dish_data_popup.tableWidget.setItem(row_idx, 1, QTableWidgetItem(name))
-            self.new_dish_data_popup.tableWidget.setItem(row_idx, 2, QTableWidgetItem("{:.2f}".format(price)))
-            spin_box = QSpinBox()
-            spin_box.setMaximum(9999)
-            spin_box.setValue(sell_num)
-            self.new_dish_data_popup.tableWidget.setCellWidget(row_idx, 3, spin_box)
-        cursor.close()
+        current_date = self.new_dish_data_popup.dateEdit.date().toString("yyyy-MM-dd")
+        records = self.new_dish_data_model.cached(self.db_worker.writes_done, current_date)
+        if records is not None:
+            self.db_worker.cancel("dish_sales_of_date")
+            self.fill_new_dish_data_popup_table(current_date, records, show)
+            return
+
+        def fetched(records):
+            # Unless a date found in the cache was shown meanwhile
+            if self.new_dish_data_popup.dateEdit.date().toString("yyyy-MM-dd") == current_date:
+                self.fill_new_dish_data_popup_table(current_date, records, show)
+
+        # A newer date replaces the query of the previous one if it has not returned yet
+        self.fetch_sales_of_date("dish_sales_of_date", current_date, fetched)
+
+    def fetch_sales_of_date(self, key, day, on_result=None, on_error=None):
+        db_worker = self.db_worker
+        model = self.new_dish_data_model
+
+        def fetched(records):
+            if db_worker is not self.db_worker:
+                return
+            # A read that ran alongside a write is run again, so it saw every write done by now
+            model.store(db_worker.writes_done, day, records)
+            if on_result is not None:
+                on_result(records)
+
+        self.db_worker.submit(key, lambda connection: repository.sales_of_date(connection, day).fetchall(), fetched,
+                              on_error)
+
+    def prefetch_sales_of_dates(self, current_date):
+        # The days before and after, so stepping through the dates one by one shows them at once
+        day = QDate.fromString(current_date, "yyyy-MM-dd")
+        for offset in (-1, 1):
+            other = day.addDays(offset).toString("yyyy-MM-dd")
+            if other in self.prefetching_dates or \
+                    self.new_dish_data_model.cached(self.db_worker.writes_done, other) is not None:
+                continue
+            self.prefetching_dates.add(other)
+            self.fetch_sales_of_date(("sales_of_date", other), other,
+                                     lambda records, other=other: self.prefetching_dates.discard(other),
+                                     lambda error, other=other: self.prefetching_dates.discard(other))
+
+    def fill_new_dish_data_popup_table(self, current_date, records, show=False):
+        self.new_dish_data_model.show_date(current_date, records)
         if show:
             self.new_dish_data_popup.show()
+        self.prefetch_sales_of_dates(current_date)
 
     def create_new_dish(self):
-        cursor = self.db_connection.cursor()
-        sql_insert = """ INSERT INTO dish(name, price, remarks)
-                         VALUES(?,?,?)"""
         dish_name = self.new_dish_popup.dish_name.text()
         dish_price = self.new_dish_popup.dish_price.value()
         dish_remark = self.new_dish_popup.dish_remark.toPlainText()
-        try:
-            cursor.execute(sql_insert, (dish_name, dish_price, dish_remark))
-            new_dish_id = cursor.lastrowid
-            cursor.close()
-            self.db_connection.commit()
+
+        def inserted(new_dish_id):
             # Update dish table and dish comboBox in UI
             self.dish_table_model.appendRow(create_dish_table_row(new_dish_id, dish_name, dish_price, 0, dish_remark))
             self.new_dish_popup.hide()
-        except sqlite3.Error:
-            cursor.close()
-            QMessageBox.warning(self, "菜品价格重复", self.tr('菜品价格组合重复，请检查'))
+
+        self.db_worker.submit(None,
+                              lambda connection: repository.insert_dish(connection, dish_name, dish_price, dish_remark),
+                              inserted, lambda error: QMessageBox.warning(self, "菜品价格重复", self.tr('菜品价格组合重复，请检查')))
 
     def create_new_dish_multi(self):
-        cursor = self.db_connection.cursor()
-        sql_insert = """ 
-            INSERT INTO dish(name, price, remarks)     
-            VALUES (?, ?, ?)"""
-        for row in range(self.new_dish_multi_popup.tableWidget.rowCount()):
-            dish_name = self.new_dish_multi_popup.tableWidget.item(row, 0).text()
-            dish_price = float(self.new_dish_multi_popup.tableWidget.item(row, 1).text())
-            dish_remark = self.new_dish_multi_popup.tableWidget.item(row, 2).text()
-            try:
-                cursor.execute(sql_insert, (dish_name, dish_price, dish_remark))
-                new_dish_id = cursor.lastrowid
-                self.dish_table_model.appendRow(create_dish_table_row(
-                    new_dish_id, dish_name, dish_price, 0, dish_remark))
-            except sqlite3.Error:
-                cursor.close()
-                QMessageBox.warning(self, "菜品价格重复", self.tr(
-                    '前{}行已插入。\n第{}行菜品价格组合重复，请检查'.format(row, row+1)))
-                return
-        cursor.close()
-        self.db_connection.commit()
-        self.new_dish_multi_popup.hide()
+        policy = importers.DUPLICATE_POLICIES[self.new_dish_multi_popup.policy_comboBox.currentIndex()]
+        self.new_dish_multi_popup.pushButton_ok.setEnabled(False)
+        self.new_dish_multi_popup.progressBar.show()
+        self.menu_import_task = DatabaseTask(self.DB_FILE, importers.import_menu_csv, self.menu_import_file, policy)
+        self.menu_import_task.progress.connect(self.new_dish_multi_popup.progressBar.setValue)
+        self.menu_import_task.succeeded.connect(self.finish_new_dish_multi)
+        self.menu_import_task.failed.connect(lambda message: self.finish_new_dish_multi(None, message))
+        self.menu_import_task.start()
+
+    def finish_new_dish_multi(self, result, error_message=""):
+        self.new_dish_multi_popup.pushButton_ok.setEnabled(True)
+        self.new_dish_multi_popup.progressBar.hide()
+        if result is None:
+            QMessageBox.warning(self, "导入失败", error_message)
+        elif result.aborted:
+            self.show_import_errors(result)
+        else:
+            self.new_dish_multi_popup.hide()
+            self.load_dish_table()
+            self.statusbar.showMessage(self.tr(result.summary()), 10000)
 
     def create_new_dish_data(self):
-        current_date = self.new_dish_data_popup.dateEdit.date().toString("yyyy-MM-dd")
-        table_filter = TableFilter()
-        table_filter.setSourceModel(self.dish_data_table_model)
-        table_filter.set_col_regex_filter(1, current_date)
-        for row in range(table_filter.rowCount()):
-            index = table_filter.mapToSource(table_filter.index(0, 1))
-            if index.isValid():
-                self.dish_data_table_model.removeRow(index.row())
-        del table_filter
-        cursor = self.db_connection.cursor()
-        sql_insert = """ 
-            INSERT OR REPLACE INTO dish_data(dish_id, date, sell_num)     
-            VALUES (?, ?, ?)"""
-        for row in range(self.new_dish_data_popup.tableWidget.rowCount()):
-            dish_id = int(self.new_dish_data_popup.tableWidget.item(row, 0).text())
-            name = self.new_dish_data_popup.tableWidget.item(row, 1).text()
-            price = float(self.new_dish_data_popup.tableWidget.item(row, 2).text())
-            sell_num = self.new_dish_data_popup.tableWidget.cellWidget(row, 3).value()
-            cursor.execute(sql_insert, (dish_id, current_date, sell_num))
-            self.dish_data_table_model.appendRow(create_dish_data_table_row(
-                dish_id, current_date, name, price, sell_num))
-        cursor.close()
-        self.db_connection.commit()
+        # The date the table was filled for, the date edit may already point at a date still loading
+        model = self.new_dish_data_model
+        if model.date is None:
+            return
+        dishes = {dish_id: (name, price) for dish_id, name, price, _ in model.records}
+        records = model.take_edits()
+        chart_values = []
+        for dish_id, day, sell_num in records:
+            # Keep already chosen rows of these dates in sync with the graph
+            if (dish_id, day) in self.dish_data_table_model.checked and dish_id in dishes:
+                name, price = dishes[dish_id]
+                chart_values.append((name + "(" + "{:.2f}".format(price) + ")", day, sell_num))
+
+        self.sales_chart.set_values(chart_values)
+        if records:
+            self.sales_queue.put(records)
         self.new_dish_data_popup.hide()
 
+    def write_sales(self, records, on_result, on_error):
+        # A batch of the sales queue, only the rows of its dates change in the data table
+        def write(connection):
+            return repository.save_sales(connection, records)
+
+        if self.dish_data_table_model.db_worker is None:
+            # Recovered before the data table is loaded
+            self.db_worker.submit(None, write, on_result, on_error)
+        else:
+            self.dish_data_table_model.replace_dates(write, {date for _, date, _ in records}, on_result, on_error)
+
     def delete_dish(self, dish_id):
-        cursor = self.db_connection.cursor()
-        sql_delete = """ DELETE FROM dish WHERE id=?"""
-        cursor.execute(sql_delete, tuple([dish_id]))
-        cursor.close()
-        self.db_connection.commit()
-
-        # Update dish table and dish comboBox in UI
-        for row in self.dish_data_table_model.findItems(str(dish_id)):
-            index = row.index()
-            if index.isValid():
-                self.dish_data_table_model.removeRow(index.row())
-
-        for row in self.dish_table_model.findItems(str(dish_id)):
-            index = row.index()
-            if index.isValid():
-                self.dish_table_model.removeRow(index.row())
+        def deleted(result):
+            row_idx = self.dish_table_model.row_of(dish_id)
+            if row_idx >= 0:
+                self.sales_chart.remove_series(self.dish_table_model.item(row_idx, 1).text() + "(" +
+                                               self.dish_table_model.item(row_idx, 2).text() + ")")
+            self.dish_table_model.remove_dishes([dish_id])
+
+        self.sales_queue.discard_dish(dish_id)
+        self.new_dish_data_model.remove_dish(dish_id)
+        # Update dish table and data table in UI, only the rows of the dish are removed
+        self.dish_data_table_model.remove_dish(lambda connection: repository.delete_dish(connection, dish_id), dish_id,
+                                               deleted,
+                                               lambda error: QMessageBox.warning(self, "删除失败", error))
 
     def show_modify_dish_popup(self, dish_id):
         point = self.rect().center()
@@ -441,12 +750,11 @@ class MainWindow(QMainWindow):
         self.modify_dish_popup.move(global_point - QtCore.QPoint(self.modify_dish_popup.width() // 2,
                                                                  self.modify_dish_popup.height() // 2))
         # Find the row and get necessary info
-        index = self.dish_table_model.match(self.dish_table_model.index(0, 0), Qt.DisplayRole, str(dish_id))
-        if index:
-            row_idx = index[0]
-            dish_name = self.dish_table_model.data(row_idx.siblingAtColumn(1))
-            dish_price = self.dish_table_model.data(row_idx.siblingAtColumn(2))
-            dish_remark = self.dish_table_model.data(row_idx.siblingAtColumn(5))
+        row_idx = self.dish_table_model.row_of(dish_id)
+        if row_idx >= 0:
+            dish_name = self.dish_table_model.item(row_idx, 1).text()
+            dish_price = self.dish_table_model.item(row_idx, 2).text()
+            dish_remark = self.dish_table_model.item(row_idx, 5).text()
             self.modify_dish_popup.dish_name.setText(dish_name)
             self.modify_dish_popup.dish_price.setValue(float(dish_price))
             self.modify_dish_popup.dish_remark.setText(dish_remark)
@@ -456,114 +764,151 @@ class MainWindow(QMainWindow):
             except TypeError:
                 pass
             self.modify_dish_popup.modify_dish_btn.clicked.connect(
-                lambda: self.modify_dish(row_idx, dish_id)
+                lambda: self.modify_dish(dish_id)
             )
             self.modify_dish_popup.show()
 
-    def modify_dish(self, row, dish_id):
-        cursor = self.db_connection.cursor()
-        sql_update = """ UPDATE dish
-                         SET name = ?, price = ?, remarks = ?
-                         WHERE id=?"""
+    def modify_dish(self, dish_id):
         dish_name = self.modify_dish_popup.dish_name.text()
         dish_price = self.modify_dish_popup.dish_price.value()
         dish_remark = self.modify_dish_popup.dish_remark.toPlainText()
-        cursor.execute(sql_update, (dish_name, dish_price, dish_remark, dish_id))
-        cursor.close()
-        self.db_connection.commit()
-        self.modify_dish_popup.hide()
 
-        # Update dish table and dish comboBox in UI
-        old_name = self.dish_table_model.data(row.siblingAtColumn(1))
-        old_price = self.dish_table_model.data(row.siblingAtColumn(2))
-        sell_num = self.dish_table_model.data(row.siblingAtColumn(3))
-        row_idx = row.row()
-        self.dish_table_model.removeRow(row_idx)
-        self.dish_table_model.insertRow(
-            row_idx, create_dish_table_row(dish_id, dish_name, dish_price, sell_num, dish_remark)
+        self.db_worker.submit(
+            None, lambda connection: repository.update_dish(connection, dish_id, dish_name, dish_price, dish_remark),
+            lambda result: self.dish_modified(dish_id, dish_name, dish_price, dish_remark),
+            lambda error: QMessageBox.warning(self, "菜品价格重复", self.tr('菜品价格组合重复，请检查'))
         )
+        self.modify_dish_popup.hide()
 
-        for row in self.dish_data_table_model.findItems(str(dish_id)):
-            index = row.index()
-            if index.isValid():
-                self.dish_data_table_model.setData(index.siblingAtColumn(2), dish_name)
-                self.dish_data_table_model.setData(index.siblingAtColumn(3), "{:.2f}".format(dish_price))
-        old_key = old_name + '(' + old_price + ')'
-        if old_key in self.graph_line_series:
-            self.graph_line_series[dish_name + '(' + str(dish_price) + ')'] = self.graph_line_series[old_key]
-            del self.graph_line_series[old_key]
-
-    def update_series(self, item: QStandardItem):
-        if item.column() == 5:  # check for checkbox column
-            item_idx = item.index()
-            date = self.dish_data_table_model.data(item_idx.siblingAtColumn(1))
-            dish_name = self.dish_data_table_model.data(item_idx.siblingAtColumn(2))
-            dish_price = self.dish_data_table_model.data(item_idx.siblingAtColumn(3))
-            sell_num = self.dish_data_table_model.data(item_idx.siblingAtColumn(4))
-            set_name = dish_name + "(" + dish_price + ")"
-            key = str(QDateTime(QDate.fromString(date, "yyyy-MM-dd")).toSecsSinceEpoch())
-            if key not in self.graph_series:
-                self.graph_series[key] = {}
-
-            if int(item.text()) == 0:
-                if set_name in self.graph_series[key]:
-                    del self.graph_series[key][set_name]
-                if not self.graph_series[key]:
-                    del self.graph_series[key]
-            else:
-                self.graph_series[key][set_name] = int(sell_num)
-
+    def dish_modified(self, dish_id, dish_name, dish_price, dish_remark):
+        row_idx = self.dish_table_model.row_of(dish_id)
+        if row_idx < 0:
+            return
+        # Update the dish row in place
+        old_name = self.dish_table_model.item(row_idx, 1).text()
+        old_price = self.dish_table_model.item(row_idx, 2).text()
+        self.dish_table_model.set_dish(dish_id, {1: (dish_name, dish_name),
+                                                 2: ("{:.2f}".format(dish_price), float(dish_price)),
+                                                 5: (dish_remark, dish_remark)})
+
+        # The rows of the dish may move since the data table is ordered by name and price
+        self.dish_data_table_model.refresh()
+        self.sales_chart.rename_series(old_name + '(' + old_price + ')',
+                                       dish_name + '(' + "{:.2f}".format(dish_price) + ')')
+
+    def update_series(self, top_left: QModelIndex, bottom_right: QModelIndex, roles=None):
+        model = self.dish_data_table_model
+        if not top_left.column() <= model.CHOOSE_COLUMN <= bottom_right.column():
+            return
+        values = []
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            # Rows of pages not cached did not change
+            record = model.record(row, load=False)
+            if record is None:
+                continue
+            dish_id, date, dish_name, dish_price, sell_num = record
+            # Named as the rows show the dish, see DishDataTableModel.data
+            set_name = dish_name + "(" + "{:.2f}".format(dish_price if dish_price else -0.01) + ")"
+            if model.branch_of is not None:
+                set_name += "·" + model.branch_of(dish_id)
+            values.append((set_name, date, sell_num if (dish_id, date) in model.checked else None))
+        self.sales_chart.set_values(values)
+
+    @diagnostics.timed("update_graph")
     def update_graph(self, index):
-        if index == 2:
-            self.graph_chart.removeAllSeries()
-
-            axis_x = QBarCategoryAxis()
-            axis_x.setTitleText("日期")
-            if self.graph_chart.axisX():
-                self.graph_chart.removeAxis(self.graph_chart.axisX())
-            self.graph_chart.addAxis(axis_x, Qt.AlignBottom)
-
-            axis_y = QValueAxis()
-            axis_y.setLabelFormat("%i")
-            axis_y.setTitleText("售出量")
-            if self.graph_chart.axisY():
-                self.graph_chart.removeAxis(self.graph_chart.axisY())
-            self.graph_chart.addAxis(axis_y, Qt.AlignLeft)
-
-            max_num = 0
-            total_date = 0
-            set_dict = {}
-            for key, data in sorted(self.graph_series.items(), key=lambda i: int(i[0])):
-                axis_x.append(QDateTime.fromSecsSinceEpoch(int(key)).toString("yyyy年MM月dd日"))
-                for set_name, value in data.items():
-                    if set_name not in set_dict:
-                        set_dict[set_name] = QBarSet(set_name)
-                        for _ in range(total_date):
-                            set_dict[set_name].append(0)
-                    set_dict[set_name].append(value)
-                    max_num = max(max_num, value)
-                total_date += 1
-                for _, bar_set in set_dict.items():
-                    if bar_set.count() < total_date:
-                        bar_set.append(0)
-            bar_series = QBarSeries()
-            for _, bar_set in set_dict.items():
-                bar_series.append(bar_set)
-            bar_series.hovered.connect(self.graph_tooltip)
-            axis_y.setMax(max_num+1)
-            axis_y.setMin(0)
-            self.graph_chart.addSeries(bar_series)
-            bar_series.attachAxis(axis_x)
-            bar_series.attachAxis(axis_y)
-
-    def graph_tooltip(self, status, index, bar_set: QBarSet):
-        if status:
-            QToolTip.showText(QCursor.pos(), "{}\n日期: {}\n售出: {}".format(
-                bar_set.label(), self.graph_chart.axisX().at(index), int(bar_set.at(index))))
+        # The chart is patched while it is shown and catches up when its tab is opened
+        self.sales_chart.set_visible(self.tabWidget.widget(index) is self.graph_tab)
+
+    def update_analytics(self):
+        # Only while the tab is shown; the history is loaded again once writes were made since it was
+        if self.analytics is None or self.tabWidget.currentWidget() is not self.analytics_tab:
+            return
+        start = self.lower_analytics_dateEdit.date().toPyDate()
+        end = self.higher_analytics_dateEdit.date().toPyDate()
+        if start > end:
+            return
+        version = self.db_worker.writes_done
+        analysis = self.analytics.cached(version, start, end)
+        if analysis is not None:
+            self.show_analysis(analysis)
+            return
+        db_worker = self.db_worker
+        self.db_worker.submit(
+            "analytics", lambda connection: analytics.SalesHistory.load(connection, version,
+                                                                        analytics.window_start(start, end)),
+            lambda history: db_worker is self.db_worker and self.history_loaded(history, start, end)
+        )
+
+    def history_loaded(self, history, start, end):
+        self.analytics.loaded(history, start, end)
+        # The dates may have changed meanwhile, those are analyzed from the memo now
+        self.update_analytics()
+
+    @diagnostics.timed("analytics.show")
+    def show_analysis(self, analysis):
+        if analysis is self.shown_analysis:
+            return
+        self.shown_analysis = analysis
+        branch_of = self.branch_set.branch_of if self.branch_set is not None else None
+        self.analytics_tableView.setSortingEnabled(False)
+        self.analytics_model.removeRows(0, self.analytics_model.rowCount())
+        for idx in analysis.ranking().tolist():
+            name = analysis.names[idx]
+            if branch_of is not None:
+                name += "·" + branch_of(analysis.dish_ids[idx])
+            change = analysis.revenue_change[idx]
+            peak = analysis.peak_weekdays[idx]
+            self.analytics_model.appendRow([
+                create_analytics_item(name),
+                create_analytics_item(round(float(analysis.prices[idx]), 2)),
+                create_analytics_item(int(analysis.units[idx])),
+                create_analytics_item(round(float(analysis.revenue[idx]), 2)),
+                create_analytics_item(round(float(analysis.shares[idx]) * 100, 1)),
+                create_analytics_item(str(analysis.abc[idx])),
+                create_analytics_item(round(float(analysis.previous_revenue[idx]), 2)),
+                create_analytics_item(None if change != change else round(float(change) * 100, 1)),
+                create_analytics_item(WEEKDAY_NAMES[peak] if peak >= 0 else None),
+            ])
+        # Sorts once by the column sorted before
+        self.analytics_tableView.setSortingEnabled(True)
+        delta = analysis.total_revenue - analysis.total_previous_revenue
+        self.analytics_summary_label.setText("营业额 {:.2f}，售出 {} 份，上期 {:.2f}（{}{:.2f}{}）".format(
+            analysis.total_revenue, analysis.total_units, analysis.total_previous_revenue, "+" if delta >= 0 else "",
+            delta, "，{:+.1f}%".format(delta / analysis.total_previous_revenue * 100)
+            if analysis.total_previous_revenue > 0 else ""))
+        self.revenue_trend_chart.show(analysis)
+        self.weekday_chart.show(analysis)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="中小餐饮流水统计程序")
+    parser.add_argument("--branches", nargs="+", metavar="DB", help="open these branch databases together")
+    parser.add_argument("--startup-time", action="store_true",
+                        help="print the time to the first paint of the window and quit")
+    parser.add_argument("--diagnostics", nargs="?", const=os.path.join(MainWindow.BASE_DIR, "diagnostics.log"),
+                        metavar="LOG", help="log slow queries and UI stalls to LOG (default: diagnostics.log)")
+    parser.add_argument("--slow-query-ms", type=float, default=100,
+                        help="log queries taking at least this long (default: %(default)s)")
+    parser.add_argument("--stall-ms", type=float, default=200,
+                        help="log event loop stalls longer than this (default: %(default)s)")
+    parser.add_argument("--write-behind-ms", type=int, default=MainWindow.SALES_FLUSH_MS,
+                        help="longest a saved sale waits to be written in a batch (default: %(default)s)")
+    # Everything else is left to Qt
+    return parser.parse_known_args(argv[1:])
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    args, qt_args = parse_args(sys.argv)
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.diagnostics:
+        diagnostics.enable(args.diagnostics, args.slow_query_ms, args.stall_ms)
+    MainWindow.SALES_FLUSH_MS = args.write_behind_ms
     window = MainWindow()
+    if args.branches:
+        window.open_branches(args.branches)
+    if args.startup_time:
+        # Print the time to first paint and quit, for comparing startup times
+        window.first_painted.connect(lambda ms: print("{:.1f} ms".format(ms)))
+        window.first_painted.connect(window.close, Qt.QueuedConnection)
     window.show()
     sys.exit(app.exec_())
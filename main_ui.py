@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file '/root/package/main.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_MainWindow(object):
+    def setupUi(self, MainWindow):
+        MainWindow.setObjectName("MainWindow")
+        MainWindow.resize(941, 713)
+        self.centralwidget = QtWidgets.QWidget(MainWindow)
+        self.centralwidget.setObjectName("centralwidget")
+        self.gridLayout = QtWidgets.QGridLayout(self.centralwidget)
+        self.gridLayout.setObjectName("gridLayout")
+        self.tabWidget = QtWidgets.QTabWidget(self.centralwidget)
+        self.tabWidget.setObjectName("tabWidget")
+        self.dish_table_tab = QtWidgets.QWidget()
+        self.dish_table_tab.setObjectName("dish_table_tab")
+        self.gridLayout_2 = QtWidgets.QGridLayout(self.dish_table_tab)
+        self.gridLayout_2.setObjectName("gridLayout_2")
+        self.dish_tableView = QtWidgets.QTableView(self.dish_table_tab)
+        self.dish_tableView.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.dish_tableView.setLocale(QtCore.QLocale(QtCore.QLocale.Chinese, QtCore.QLocale.China))
+        self.dish_tableView.setSizeAdjustPolicy(QtWidgets.QAbstractScrollArea.AdjustToContents)
+        self.dish_tableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.dish_tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.dish_tableView.setSortingEnabled(True)
+        self.dish_tableView.setObjectName("dish_tableView")
+        self.dish_tableView.horizontalHeader().setStretchLastSection(True)
+        self.dish_tableView.verticalHeader().setDefaultSectionSize(50)
+        self.gridLayout_2.addWidget(self.dish_tableView, 1, 0, 1, 1)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.label_15 = QtWidgets.QLabel(self.dish_table_tab)
+        self.label_15.setObjectName("label_15")
+        self.horizontalLayout.addWidget(self.label_15)
+        self.dish_branch_comboBox = QtWidgets.QComboBox(self.dish_table_tab)
+        self.dish_branch_comboBox.setObjectName("dish_branch_comboBox")
+        self.dish_branch_comboBox.addItem("")
+        self.horizontalLayout.addWidget(self.dish_branch_comboBox)
+        self.label = QtWidgets.QLabel(self.dish_table_tab)
+        self.label.setAlignment(QtCore.Qt.AlignCenter)
+        self.label.setObjectName("label")
+        self.horizontalLayout.addWidget(self.label)
+        self.dish_lineEdit = QtWidgets.QLineEdit(self.dish_table_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.dish_lineEdit.sizePolicy().hasHeightForWidth())
+        self.dish_lineEdit.setSizePolicy(sizePolicy)
+        self.dish_lineEdit.setLocale(QtCore.QLocale(QtCore.QLocale.Chinese, QtCore.QLocale.China))
+        self.dish_lineEdit.setObjectName("dish_lineEdit")
+        self.horizontalLayout.addWidget(self.dish_lineEdit)
+        self.label_2 = QtWidgets.QLabel(self.dish_table_tab)
+        self.label_2.setAlignment(QtCore.Qt.AlignCenter)
+        self.label_2.setWordWrap(True)
+        self.label_2.setObjectName("label_2")
+        self.horizontalLayout.addWidget(self.label_2)
+        self.lower_price_doubleSpinBox = QtWidgets.QDoubleSpinBox(self.dish_table_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lower_price_doubleSpinBox.sizePolicy().hasHeightForWidth())
+        self.lower_price_doubleSpinBox.setSizePolicy(sizePolicy)
+        self.lower_price_doubleSpinBox.setMaximum(9999.0)
+        self.lower_price_doubleSpinBox.setObjectName("lower_price_doubleSpinBox")
+        self.horizontalLayout.addWidget(self.lower_price_doubleSpinBox)
+        self.label_3 = QtWidgets.QLabel(self.dish_table_tab)
+        self.label_3.setLayoutDirection(QtCore.Qt.LeftToRight)
+        self.label_3.setAlignment(QtCore.Qt.AlignCenter)
+        self.label_3.setWordWrap(True)
+        self.label_3.setObjectName("label_3")
+        self.horizontalLayout.addWidget(self.label_3)
+        self.higher_price_doubleSpinBox = QtWidgets.QDoubleSpinBox(self.dish_table_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.higher_price_doubleSpinBox.sizePolicy().hasHeightForWidth())
+        self.higher_price_doubleSpinBox.setSizePolicy(sizePolicy)
+        self.higher_price_doubleSpinBox.setMaximum(9999.0)
+        self.higher_price_doubleSpinBox.setObjectName("higher_price_doubleSpinBox")
+        self.horizontalLayout.addWidget(self.higher_price_doubleSpinBox)
+        self.label_4 = QtWidgets.QLabel(self.dish_table_tab)
+        self.label_4.setAlignment(QtCore.Qt.AlignCenter)
+        self.label_4.setObjectName("label_4")
+        self.horizontalLayout.addWidget(self.label_4)
+        self.lower_week_sell_spinBox = QtWidgets.QSpinBox(self.dish_table_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lower_week_sell_spinBox.sizePolicy().hasHeightForWidth())
+        self.lower_week_sell_spinBox.setSizePolicy(sizePolicy)
+        self.lower_week_sell_spinBox.setMaximum(999999)
+        self.lower_week_sell_spinBox.setObjectName("lower_week_sell_spinBox")
+        self.horizontalLayout.addWidget(self.lower_week_sell_spinBox)
+        self.label_5 = QtWidgets.QLabel(self.dish_table_tab)
+        self.label_5.setAlignment(QtCore.Qt.AlignCenter)
+        self.label_5.setWordWrap(True)
+        self.label_5.setObjectName("label_5")
+        self.horizontalLayout.addWidget(self.label_5)
+        self.higher_week_sell_spinBox = QtWidgets.QSpinBox(self.dish_table_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.higher_week_sell_spinBox.sizePolicy().hasHeightForWidth())
+        self.higher_week_sell_spinBox.setSizePolicy(sizePolicy)
+        self.higher_week_sell_spinBox.setMaximum(999999)
+        self.higher_week_sell_spinBox.setObjectName("higher_week_sell_spinBox")
+        self.horizontalLayout.addWidget(self.higher_week_sell_spinBox)
+        self.gridLayout_2.addLayout(self.horizontalLayout, 0, 0, 1, 1)
+        self.tabWidget.addTab(self.dish_table_tab, "")
+        self.dish_data_tab = QtWidgets.QWidget()
+        self.dish_data_tab.setObjectName("dish_data_tab")
+        self.gridLayout_3 = QtWidgets.QGridLayout(self.dish_data_tab)
+        self.gridLayout_3.setObjectName("gridLayout_3")
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.label_16 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_16.setObjectName("label_16")
+        self.horizontalLayout_2.addWidget(self.label_16)
+        self.data_branch_comboBox = QtWidgets.QComboBox(self.dish_data_tab)
+        self.data_branch_comboBox.setObjectName("data_branch_comboBox")
+        self.data_branch_comboBox.addItem("")
+        self.horizontalLayout_2.addWidget(self.data_branch_comboBox)
+        self.label_7 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_7.setObjectName("label_7")
+        self.horizontalLayout_2.addWidget(self.label_7)
+        self.lower_data_dateEdit = QtWidgets.QDateEdit(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lower_data_dateEdit.sizePolicy().hasHeightForWidth())
+        self.lower_data_dateEdit.setSizePolicy(sizePolicy)
+        self.lower_data_dateEdit.setCurrentSection(QtWidgets.QDateTimeEdit.MonthSection)
+        self.lower_data_dateEdit.setCalendarPopup(True)
+        self.lower_data_dateEdit.setObjectName("lower_data_dateEdit")
+        self.horizontalLayout_2.addWidget(self.lower_data_dateEdit)
+        self.label_8 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_8.setObjectName("label_8")
+        self.horizontalLayout_2.addWidget(self.label_8)
+        self.higher_data_dateEdit = QtWidgets.QDateEdit(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.higher_data_dateEdit.sizePolicy().hasHeightForWidth())
+        self.higher_data_dateEdit.setSizePolicy(sizePolicy)
+        self.higher_data_dateEdit.setCurrentSection(QtWidgets.QDateTimeEdit.DaySection)
+        self.higher_data_dateEdit.setCalendarPopup(True)
+        self.higher_data_dateEdit.setObjectName("higher_data_dateEdit")
+        self.horizontalLayout_2.addWidget(self.higher_data_dateEdit)
+        self.label_6 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_6.setObjectName("label_6")
+        self.horizontalLayout_2.addWidget(self.label_6)
+        self.data_lineEdit = QtWidgets.QLineEdit(self.dish_data_tab)
+        self.data_lineEdit.setObjectName("data_lineEdit")
+        self.horizontalLayout_2.addWidget(self.data_lineEdit)
+        self.label_11 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_11.setObjectName("label_11")
+        self.horizontalLayout_2.addWidget(self.label_11)
+        self.lower_data_doubleSpinBox = QtWidgets.QDoubleSpinBox(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lower_data_doubleSpinBox.sizePolicy().hasHeightForWidth())
+        self.lower_data_doubleSpinBox.setSizePolicy(sizePolicy)
+        self.lower_data_doubleSpinBox.setMaximum(9999.0)
+        self.lower_data_doubleSpinBox.setObjectName("lower_data_doubleSpinBox")
+        self.horizontalLayout_2.addWidget(self.lower_data_doubleSpinBox)
+        self.label_12 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_12.setObjectName("label_12")
+        self.horizontalLayout_2.addWidget(self.label_12)
+        self.higher_data_doubleSpinBox = QtWidgets.QDoubleSpinBox(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.higher_data_doubleSpinBox.sizePolicy().hasHeightForWidth())
+        self.higher_data_doubleSpinBox.setSizePolicy(sizePolicy)
+        self.higher_data_doubleSpinBox.setMaximum(9999.0)
+        self.higher_data_doubleSpinBox.setObjectName("higher_data_doubleSpinBox")
+        self.horizontalLayout_2.addWidget(self.higher_data_doubleSpinBox)
+        self.label_9 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_9.setObjectName("label_9")
+        self.horizontalLayout_2.addWidget(self.label_9)
+        self.lower_data_spinBox = QtWidgets.QSpinBox(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.lower_data_spinBox.sizePolicy().hasHeightForWidth())
+        self.lower_data_spinBox.setSizePolicy(sizePolicy)
+        self.lower_data_spinBox.setMaximum(9999)
+        self.lower_data_spinBox.setObjectName("lower_data_spinBox")
+        self.horizontalLayout_2.addWidget(self.lower_data_spinBox)
+        self.label_10 = QtWidgets.QLabel(self.dish_data_tab)
+        self.label_10.setObjectName("label_10")
+        self.horizontalLayout_2.addWidget(self.label_10)
+        self.higher_data_spinBox = QtWidgets.QSpinBox(self.dish_data_tab)
+        sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Fixed)
+        sizePolicy.setHorizontalStretch(0)
+        sizePolicy.setVerticalStretch(0)
+        sizePolicy.setHeightForWidth(self.higher_data_spinBox.sizePolicy().hasHeightForWidth())
+        self.higher_data_spinBox.setSizePolicy(sizePolicy)
+        self.higher_data_spinBox.setMaximum(9999)
+        self.higher_data_spinBox.setObjectName("higher_data_spinBox")
+        self.horizontalLayout_2.addWidget(self.higher_data_spinBox)
+        self.data_all_check_checkBox = QtWidgets.QCheckBox(self.dish_data_tab)
+        self.data_all_check_checkBox.setLayoutDirection(QtCore.Qt.RightToLeft)
+        self.data_all_check_checkBox.setObjectName("data_all_check_checkBox")
+        self.horizontalLayout_2.addWidget(self.data_all_check_checkBox)
+        self.data_invert_check_btn = QtWidgets.QPushButton(self.dish_data_tab)
+        self.data_invert_check_btn.setObjectName("data_invert_check_btn")
+        self.horizontalLayout_2.addWidget(self.data_invert_check_btn)
+        self.data_clear_check_btn = QtWidgets.QPushButton(self.dish_data_tab)
+        self.data_clear_check_btn.setObjectName("data_clear_check_btn")
+        self.horizontalLayout_2.addWidget(self.data_clear_check_btn)
+        self.gridLayout_3.addLayout(self.horizontalLayout_2, 0, 0, 1, 1)
+        self.data_tableView = QtWidgets.QTableView(self.dish_data_tab)
+        self.data_tableView.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.data_tableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.data_tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.data_tableView.setSortingEnabled(True)
+        self.data_tableView.setObjectName("data_tableView")
+        self.data_tableView.verticalHeader().setDefaultSectionSize(50)
+        self.gridLayout_3.addWidget(self.data_tableView, 1, 0, 1, 1)
+        self.tabWidget.addTab(self.dish_data_tab, "")
+        self.graph_tab = QtWidgets.QWidget()
+        self.graph_tab.setObjectName("graph_tab")
+        self.gridLayout_4 = QtWidgets.QGridLayout(self.graph_tab)
+        self.gridLayout_4.setObjectName("gridLayout_4")
+        self.horizontalLayout_graph = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_graph.setObjectName("horizontalLayout_graph")
+        self.label_13 = QtWidgets.QLabel(self.graph_tab)
+        self.label_13.setObjectName("label_13")
+        self.horizontalLayout_graph.addWidget(self.label_13)
+        self.graph_bucket_comboBox = QtWidgets.QComboBox(self.graph_tab)
+        self.graph_bucket_comboBox.setObjectName("graph_bucket_comboBox")
+        self.graph_bucket_comboBox.addItem("")
+        self.graph_bucket_comboBox.addItem("")
+        self.graph_bucket_comboBox.addItem("")
+        self.graph_bucket_comboBox.addItem("")
+        self.horizontalLayout_graph.addWidget(self.graph_bucket_comboBox)
+        self.label_14 = QtWidgets.QLabel(self.graph_tab)
+        self.label_14.setObjectName("label_14")
+        self.horizontalLayout_graph.addWidget(self.label_14)
+        self.graph_top_spinBox = QtWidgets.QSpinBox(self.graph_tab)
+        self.graph_top_spinBox.setMinimum(1)
+        self.graph_top_spinBox.setMaximum(50)
+        self.graph_top_spinBox.setProperty("value", 10)
+        self.graph_top_spinBox.setObjectName("graph_top_spinBox")
+        self.horizontalLayout_graph.addWidget(self.graph_top_spinBox)
+        spacerItem = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_graph.addItem(spacerItem)
+        self.gridLayout_4.addLayout(self.horizontalLayout_graph, 0, 0, 1, 1)
+        self.gridLayout_5 = QtWidgets.QGridLayout()
+        self.gridLayout_5.setObjectName("gridLayout_5")
+        self.gridLayout_4.addLayout(self.gridLayout_5, 1, 0, 1, 1)
+        self.tabWidget.addTab(self.graph_tab, "")
+        self.analytics_tab = QtWidgets.QWidget()
+        self.analytics_tab.setObjectName("analytics_tab")
+        self.gridLayout_analytics = QtWidgets.QGridLayout(self.analytics_tab)
+        self.gridLayout_analytics.setObjectName("gridLayout_analytics")
+        self.horizontalLayout_analytics = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_analytics.setObjectName("horizontalLayout_analytics")
+        self.label_17 = QtWidgets.QLabel(self.analytics_tab)
+        self.label_17.setObjectName("label_17")
+        self.horizontalLayout_analytics.addWidget(self.label_17)
+        self.lower_analytics_dateEdit = QtWidgets.QDateEdit(self.analytics_tab)
+        self.lower_analytics_dateEdit.setCurrentSection(QtWidgets.QDateTimeEdit.MonthSection)
+        self.lower_analytics_dateEdit.setCalendarPopup(True)
+        self.lower_analytics_dateEdit.setObjectName("lower_analytics_dateEdit")
+        self.horizontalLayout_analytics.addWidget(self.lower_analytics_dateEdit)
+        self.label_18 = QtWidgets.QLabel(self.analytics_tab)
+        self.label_18.setObjectName("label_18")
+        self.horizontalLayout_analytics.addWidget(self.label_18)
+        self.higher_analytics_dateEdit = QtWidgets.QDateEdit(self.analytics_tab)
+        self.higher_analytics_dateEdit.setCurrentSection(QtWidgets.QDateTimeEdit.MonthSection)
+        self.higher_analytics_dateEdit.setCalendarPopup(True)
+        self.higher_analytics_dateEdit.setObjectName("higher_analytics_dateEdit")
+        self.horizontalLayout_analytics.addWidget(self.higher_analytics_dateEdit)
+        spacerItem1 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
+        self.horizontalLayout_analytics.addItem(spacerItem1)
+        self.analytics_summary_label = QtWidgets.QLabel(self.analytics_tab)
+        self.analytics_summary_label.setText("")
+        self.analytics_summary_label.setObjectName("analytics_summary_label")
+        self.horizontalLayout_analytics.addWidget(self.analytics_summary_label)
+        self.gridLayout_analytics.addLayout(self.horizontalLayout_analytics, 0, 0, 1, 1)
+        self.analytics_tableView = QtWidgets.QTableView(self.analytics_tab)
+        self.analytics_tableView.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.analytics_tableView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.analytics_tableView.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.analytics_tableView.setSortingEnabled(True)
+        self.analytics_tableView.setObjectName("analytics_tableView")
+        self.gridLayout_analytics.addWidget(self.analytics_tableView, 1, 0, 1, 1)
+        self.horizontalLayout_analytics_charts = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_analytics_charts.setObjectName("horizontalLayout_analytics_charts")
+        self.gridLayout_analytics.addLayout(self.horizontalLayout_analytics_charts, 2, 0, 1, 1)
+        self.tabWidget.addTab(self.analytics_tab, "")
+        self.gridLayout.addWidget(self.tabWidget, 2, 0, 1, 1)
+        MainWindow.setCentralWidget(self.centralwidget)
+        self.menubar = QtWidgets.QMenuBar(MainWindow)
+        self.menubar.setGeometry(QtCore.QRect(0, 0, 941, 21))
+        self.menubar.setObjectName("menubar")
+        self.menu = QtWidgets.QMenu(self.menubar)
+        self.menu.setObjectName("menu")
+        self.menu_2 = QtWidgets.QMenu(self.menubar)
+        self.menu_2.setObjectName("menu_2")
+        self.menu_3 = QtWidgets.QMenu(self.menubar)
+        self.menu_3.setObjectName("menu_3")
+        self.menu_4 = QtWidgets.QMenu(self.menubar)
+        self.menu_4.setObjectName("menu_4")
+        MainWindow.setMenuBar(self.menubar)
+        self.statusbar = QtWidgets.QStatusBar(MainWindow)
+        self.statusbar.setObjectName("statusbar")
+        MainWindow.setStatusBar(self.statusbar)
+        self.action_new_dish = QtWidgets.QAction(MainWindow)
+        self.action_new_dish.setObjectName("action_new_dish")
+        self.action_new_data = QtWidgets.QAction(MainWindow)
+        self.action_new_data.setObjectName("action_new_data")
+        self.action_new_dish_multi = QtWidgets.QAction(MainWindow)
+        self.action_new_dish_multi.setObjectName("action_new_dish_multi")
+        self.action_new_data_multi = QtWidgets.QAction(MainWindow)
+        self.action_new_data_multi.setObjectName("action_new_data_multi")
+        self.action_import_sales = QtWidgets.QAction(MainWindow)
+        self.action_import_sales.setObjectName("action_import_sales")
+        self.action_open_branches = QtWidgets.QAction(MainWindow)
+        self.action_open_branches.setObjectName("action_open_branches")
+        self.action_open_own = QtWidgets.QAction(MainWindow)
+        self.action_open_own.setObjectName("action_open_own")
+        self.action_export_sales = QtWidgets.QAction(MainWindow)
+        self.action_export_sales.setObjectName("action_export_sales")
+        self.menu.addAction(self.action_new_dish)
+        self.menu_2.addAction(self.action_new_dish_multi)
+        self.menu_2.addAction(self.action_new_data_multi)
+        self.menu_2.addAction(self.action_import_sales)
+        self.menu_3.addAction(self.action_open_branches)
+        self.menu_3.addAction(self.action_open_own)
+        self.menu_4.addAction(self.action_export_sales)
+        self.menubar.addAction(self.menu.menuAction())
+        self.menubar.addAction(self.menu_2.menuAction())
+        self.menubar.addAction(self.menu_3.menuAction())
+        self.menubar.addAction(self.menu_4.menuAction())
+
+        self.retranslateUi(MainWindow)
+        self.tabWidget.setCurrentIndex(0)
+        QtCore.QMetaObject.connectSlotsByName(MainWindow)
+
+    def retranslateUi(self, MainWindow):
+        _translate = QtCore.QCoreApplication.translate
+        MainWindow.setWindowTitle(_translate("MainWindow", "流水管理系统"))
+        self.label_15.setText(_translate("MainWindow", "分店"))
+        self.dish_branch_comboBox.setItemText(0, _translate("MainWindow", "全部"))
+        self.label.setText(_translate("MainWindow", "菜品"))
+        self.label_2.setText(_translate("MainWindow", "价格"))
+        self.label_3.setText(_translate("MainWindow", "-"))
+        self.label_4.setText(_translate("MainWindow", "近七天总售出"))
+        self.label_5.setText(_translate("MainWindow", "-"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.dish_table_tab), _translate("MainWindow", "菜品表"))
+        self.label_16.setText(_translate("MainWindow", "分店"))
+        self.data_branch_comboBox.setItemText(0, _translate("MainWindow", "全部"))
+        self.label_7.setText(_translate("MainWindow", "开始日期"))
+        self.lower_data_dateEdit.setDisplayFormat(_translate("MainWindow", "yyyy年MM月dd日"))
+        self.label_8.setText(_translate("MainWindow", "结束日期"))
+        self.higher_data_dateEdit.setDisplayFormat(_translate("MainWindow", "yyyy年MM月dd日"))
+        self.label_6.setText(_translate("MainWindow", "菜品"))
+        self.label_11.setText(_translate("MainWindow", "价格"))
+        self.label_12.setText(_translate("MainWindow", "-"))
+        self.label_9.setText(_translate("MainWindow", "售出数量"))
+        self.label_10.setText(_translate("MainWindow", "-"))
+        self.data_all_check_checkBox.setText(_translate("MainWindow", "全选"))
+        self.data_invert_check_btn.setText(_translate("MainWindow", "反选"))
+        self.data_clear_check_btn.setText(_translate("MainWindow", "清空选择"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.dish_data_tab), _translate("MainWindow", "数据表"))
+        self.label_13.setText(_translate("MainWindow", "时间粒度"))
+        self.graph_bucket_comboBox.setItemText(0, _translate("MainWindow", "自动"))
+        self.graph_bucket_comboBox.setItemText(1, _translate("MainWindow", "按日"))
+        self.graph_bucket_comboBox.setItemText(2, _translate("MainWindow", "按周"))
+        self.graph_bucket_comboBox.setItemText(3, _translate("MainWindow", "按月"))
+        self.label_14.setText(_translate("MainWindow", "最多显示菜品"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.graph_tab), _translate("MainWindow", "图表"))
+        self.label_17.setText(_translate("MainWindow", "开始日期"))
+        self.lower_analytics_dateEdit.setDisplayFormat(_translate("MainWindow", "yyyy年MM月dd日"))
+        self.label_18.setText(_translate("MainWindow", "结束日期"))
+        self.higher_analytics_dateEdit.setDisplayFormat(_translate("MainWindow", "yyyy年MM月dd日"))
+        self.tabWidget.setTabText(self.tabWidget.indexOf(self.analytics_tab), _translate("MainWindow", "分析"))
+        self.menu.setTitle(_translate("MainWindow", "新建"))
+        self.menu_2.setTitle(_translate("MainWindow", "批量添加"))
+        self.menu_3.setTitle(_translate("MainWindow", "分店"))
+        self.menu_4.setTitle(_translate("MainWindow", "导出"))
+        self.action_new_dish.setText(_translate("MainWindow", "添加菜品"))
+        self.action_new_data.setText(_translate("MainWindow", "添加数据"))
+        self.action_new_dish_multi.setText(_translate("MainWindow", "菜品"))
+        self.action_new_data_multi.setText(_translate("MainWindow", "数据"))
+        self.action_import_sales.setText(_translate("MainWindow", "导入销售记录"))
+        self.action_open_branches.setText(_translate("MainWindow", "打开多个分店…"))
+        self.action_open_own.setText(_translate("MainWindow", "返回本店"))
+        self.action_export_sales.setText(_translate("MainWindow", "导出流水…"))
+
+
+UI_SOURCE_SHA1 = "518cc27615de15e2d1121e0f5bda306732eb9df8"
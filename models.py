@@ -1,52 +1,782 @@
-from PyQt5.QtCore import Qt
-from PyQt5.QtWidgets import (QWidget, QPushButton, QHBoxLayout, QItemDelegate, QCheckBox)
+from bisect import bisect_left
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex, QEvent, QRect, pyqtSignal
+from PyQt5.QtGui import QStandardItemModel
+from PyQt5.QtWidgets import QItemDelegate, QSpinBox, QStyle, QStyleOptionButton
+
+from archive import use_archives
+from database import SQL_SELECT_DISH_DATA, SQL_COUNT_DISH_DATA, SQL_SELECT_DISH_DATA_ROWS_OF_DISH, dish_data_order
+from diagnostics import timed
+from filters import SORT_ROLE
+
+
+def row_ranges(rows):
+    """Group rows into (first, count) runs of consecutive rows, last run first so they can be removed in order."""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][0] + ranges[-1][1] == row:
+            ranges[-1][1] += 1
+        else:
+            ranges.append([row, 1])
+    return [tuple(run) for run in reversed(ranges)]
+
+
+class DishTableModel(QStandardItemModel):
+    """
+    The menu, one row per dish with its id in column 0.
+
+    ``dish_items`` maps each dish id to the item of its id column, kept up to date as rows are inserted and
+    removed, so a dish is found without scanning the model. Qt knows the current row of an item.
+    """
+    def __init__(self, rows=0, columns=6, parent=None):
+        super(DishTableModel, self).__init__(rows, columns, parent)
+        self.dish_items = {}
+        self.rowsInserted.connect(self._rows_inserted)
+        self.rowsAboutToBeRemoved.connect(self._rows_about_to_be_removed)
+        self.modelReset.connect(self.dish_items.clear)
+
+    def _rows_inserted(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.item(row, 0)
+            if item is not None:
+                self.dish_items[int(item.text())] = item
+
+    def _rows_about_to_be_removed(self, parent, first, last):
+        for row in range(first, last + 1):
+            item = self.item(row, 0)
+            if item is not None:
+                self.dish_items.pop(int(item.text()), None)
+
+    def row_of(self, dish_id):
+        item = self.dish_items.get(int(dish_id))
+        return -1 if item is None else item.row()
+
+    def remove_dishes(self, dish_ids):
+        rows = [self.row_of(dish_id) for dish_id in dish_ids]
+        for first, count in row_ranges(row for row in rows if row >= 0):
+            self.removeRows(first, count)
+
+    def set_dish(self, dish_id, values):
+        # values maps columns to their new (text, sort value), only those items change
+        row = self.row_of(dish_id)
+        if row < 0:
+            return False
+        for col, (text, sort_value) in values.items():
+            item = self.item(row, col)
+            item.setText(text)
+            item.setData(sort_value, SORT_ROLE)
+        return True
 
 
 class DishTableDelegateCell(QItemDelegate):
+    """Paints the 修改/删除 buttons of a dish row with QStyle, no widget is created per row."""
+    BUTTON_TEXTS = ("修改", "删除")
+
     def __init__(self, modify_func, delete_func, parent=None):
         super(DishTableDelegateCell, self).__init__(parent)
         self.modify_func = modify_func
         self.delete_func = delete_func
+        # (row, button) currently held down by the mouse, drawn sunken, and the rect of its cell
+        self.pressed = None
+        self.pressed_rect = None
+
+    def button_rects(self, rect):
+        width = rect.width() // len(self.BUTTON_TEXTS)
+        return [QRect(rect.left() + idx * width, rect.top(), width, rect.height())
+                for idx in range(len(self.BUTTON_TEXTS))]
 
     def paint(self, painter, option, index):
-        if not self.parent().indexWidget(index):
-            layout = QHBoxLayout()
-            layout.setContentsMargins(0, 0, 0, 0)
-            layout.setSpacing(0)
-            id_idx = index.siblingAtColumn(0)
-            dish_id = self.parent().model().data(id_idx)
-            modify_btn = QPushButton("修改", self.parent())
-            modify_btn.clicked.connect(lambda *args, row_dish_id=dish_id: self.modify_func(row_dish_id))
-            layout.addWidget(modify_btn)
-            delete_btn = QPushButton("删除", self.parent())
-            delete_btn.clicked.connect(lambda *args, row_dish_id=dish_id: self.delete_func(row_dish_id))
-            layout.addWidget(delete_btn)
-            widget = QWidget()
-            widget.setLayout(layout)
-            self.parent().setIndexWidget(
-                index,
-                widget
-            )
+        style = self.parent().style()
+        for idx, (rect, text) in enumerate(zip(self.button_rects(option.rect), self.BUTTON_TEXTS)):
+            button = QStyleOptionButton()
+            button.rect = rect
+            button.text = text
+            button.state = QStyle.State_Enabled
+            button.state |= QStyle.State_Sunken if self.pressed == (index.row(), idx) else QStyle.State_Raised
+            style.drawControl(QStyle.CE_PushButton, button, painter, self.parent())
+
+    def set_pressed(self, pressed, option):
+        # Nothing repaints the cells on their own when only the button held down changed, the mouse may be
+        # released over another cell than it was pressed on
+        if pressed == self.pressed:
+            return
+        self.pressed = pressed
+        if option.widget is not None:
+            viewport = option.widget.viewport()
+            if self.pressed_rect is not None:
+                viewport.update(self.pressed_rect)
+            viewport.update(option.rect)
+        self.pressed_rect = QRect(option.rect) if pressed is not None else None
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease) or \
+                event.button() != Qt.LeftButton:
+            return False
+        clicked = None
+        for idx, rect in enumerate(self.button_rects(option.rect)):
+            if rect.contains(event.pos()):
+                clicked = (index.row(), idx)
+        if event.type() == QEvent.MouseButtonPress:
+            self.set_pressed(clicked, option)
+            return clicked is not None
+        pressed = self.pressed
+        self.set_pressed(None, option)
+        if clicked is None or clicked != pressed:
+            return False
+        dish_id = model.data(index.siblingAtColumn(0))
+        if clicked[1] == 0:
+            self.modify_func(dish_id)
+        else:
+            self.delete_func(dish_id)
+        return True
 
 
 class DishDataTableDelegateCell(QItemDelegate):
+    """Paints the 选择 checkbox with QStyle and toggles the cell text between "0" and "2" on click."""
+
     def __init__(self, parent=None):
         super(DishDataTableDelegateCell, self).__init__(parent)
 
+    def check_box_option(self, option, index):
+        style = self.parent().style()
+        check_box = QStyleOptionButton()
+        check_box.rect = option.rect
+        size = style.subElementRect(QStyle.SE_CheckBoxIndicator, check_box, self.parent()).size()
+        check_box.rect = QStyle.alignedRect(option.direction, Qt.AlignCenter, size, option.rect)
+        check_box.state = QStyle.State_Enabled
+        check_box.state |= QStyle.State_On if int(index.data()) == Qt.Checked else QStyle.State_Off
+        return check_box
+
     def paint(self, painter, option, index):
-        index_widget = self.parent().indexWidget(index)
-        if not index_widget:
-            layout = QHBoxLayout()
-            layout.setAlignment(Qt.AlignCenter)
-
-            check_state = int(self.parent().model().data(index))
-            check_box = QCheckBox()
-            check_box.setChecked(check_state == 2)
-            check_box.stateChanged.connect(lambda state: self.parent().model().setData(index, str(state), Qt.DisplayRole))
-            layout.addWidget(check_box)
-            widget = QWidget()
-            widget.setLayout(layout)
-            self.parent().setIndexWidget(index, widget)
+        self.drawBackground(painter, option, index)
+        if index.data() is None:
+            return
+        self.parent().style().drawControl(QStyle.CE_CheckBox, self.check_box_option(option, index), painter,
+                                          self.parent())
+
+    def editorEvent(self, event, model, option, index):
+        if index.data() is None:
+            return False
+        if event.type() in (QEvent.MouseButtonPress, QEvent.MouseButtonDblClick):
+            return self.check_box_option(option, index).rect.contains(event.pos())
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            if not self.check_box_option(option, index).rect.contains(event.pos()):
+                return False
+        elif event.type() != QEvent.KeyPress or event.key() not in (Qt.Key_Space, Qt.Key_Select):
+            return False
+        state = Qt.Unchecked if int(index.data()) == Qt.Checked else Qt.Checked
+        return model.setData(index, str(int(state)), Qt.DisplayRole)
+
+
+class DishDataTableModel(QAbstractTableModel):
+    """
+    Read-only view of dish_data joined with dish, paged in from SQLite on demand.
+
+    Rows become visible to the view through canFetchMore/fetchMore, one page at a time. Pages are queried on the
+    DatabaseWorker thread and show up when their result arrives. Only the MAX_PAGES most recently used pages are
+    held in memory; an evicted page is requested again when the view asks for one of its rows. The 选择 column
+    is not stored in the database, the (dish_id, date) of the checked rows are kept in the ``checked`` set so they
+    survive paging and refreshes; set_checked and clear_checked change many rows with one dataChanged.
+    ``row_index`` maps the (dish_id, date) of every cached row to its row, so writes can update, insert or remove
+    just the rows they touch (see replace_date and remove_dish) instead of refreshing.
+    With several branches open, ``branch_of`` names the branch of a dish id for the 分店 column.
+
+    Sorting is the query's job too: set_order pages the rows in again in the order of a column, see
+    database.SQL_DISH_DATA_ORDERS, so a sorting proxy never has to load and compare every row.
+    A page that fails to load emits load_failed with the error, for the status bar.
+    """
+    load_failed = pyqtSignal(str)
+    PAGE_SIZE = 256
+    MAX_PAGES = 64
+    COLUMN_COUNT = 7
+    CHOOSE_COLUMN = 5
+    BRANCH_COLUMN = 6
+    # database.SQL_DISH_DATA_ORDERS key of each column that can be sorted by
+    SORT_KEYS = {1: "date", 2: "name", 3: "price", 4: "sell_num", BRANCH_COLUMN: "branch"}
+
+    SQL_SELECT = SQL_SELECT_DISH_DATA
+
+    def __init__(self, parent=None):
+        super(DishDataTableModel, self).__init__(parent)
+        self.db_worker = None
+        self.branch_of = None
+        self.checked = set()
+        self.where = ""
+        self.where_params = ()
+        self.date_range = (None, None)
+        self.order_key = "date"
+        self.descending = True
+        self._headers = {}
+        self._pages = OrderedDict()
+        self.row_index = {}
+        # Runs of rows remove_rows has announced but not yet dropped from the cache
+        self._removed_runs = []
+        self._pending_pages = set()
+        # Bumped on every refresh, so pages requested before it are ignored when they arrive
+        self._generation = 0
+        self._row_count = 0
+        self._exhausted = True
+
+    def set_worker(self, db_worker):
+        self.db_worker = db_worker
+        self.refresh()
+
+    def set_filter(self, where, params=(), date_range=(None, None)):
+        # Extra SQL condition (see TableFilter.set_sql_columns) appended to the query, and the first and last day
+        # it lets through, None for no limit, which tell the archived years to read along
+        params = tuple(params)
+        date_range = tuple(date_range)
+        if where == self.where and params == self.where_params and date_range == self.date_range:
+            return
+        self.where = where
+        self.where_params = params
+        self.date_range = date_range
+        self.refresh()
+
+    def set_order(self, column, order=Qt.AscendingOrder):
+        """Sort by column, returns False for a column the database cannot sort by."""
+        key = self.SORT_KEYS.get(column)
+        if key is None:
+            return False
+        descending = order == Qt.DescendingOrder
+        if (key, descending) != (self.order_key, self.descending):
+            self.order_key = key
+            self.descending = descending
+            self.refresh()
+        return True
+
+    def order_sql(self):
+        return dish_data_order(self.order_key, self.descending)
+
+    @timed("data_table.reset")
+    def refresh(self):
+        # Drop every cached page and start paging again from the first row
+        self.beginResetModel()
+        if self.db_worker is not None:
+            for page_idx in self._pending_pages:
+                self.db_worker.cancel(self.page_key(page_idx))
+        self._pending_pages.clear()
+        self._pages.clear()
+        self.row_index.clear()
+        self._generation += 1
+        self._row_count = 0
+        self._exhausted = self.db_worker is None
+        self.endResetModel()
+        if self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+
+    def is_loading(self):
+        return bool(self._pending_pages)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.COLUMN_COUNT
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent):
+        if self.canFetchMore(parent):
+            self._request_page(self._row_count // self.PAGE_SIZE)
+
+    def where_sql(self):
+        return " AND " + self.where if self.where else ""
+
+    def query(self):
+        """(where, params, order, date_range) of the rows shown, see exporters.export_sales."""
+        return self.where_sql(), self.where_params, self.order_sql(), self.date_range
+
+    def page_key(self, page_idx):
+        return "dish_data_page", page_idx
+
+    def _request_page(self, page_idx):
+        if page_idx in self._pending_pages:
+            return
+        self._pending_pages.add(page_idx)
+        generation = self._generation
+        sql = self.SQL_SELECT.format(where=self.where_sql(), **self.order_sql())
+        params = self.where_params + (self.PAGE_SIZE, page_idx * self.PAGE_SIZE)
+        date_range = self.date_range
+
+        def run(connection):
+            use_archives(connection, *date_range)
+            return connection.execute(sql, params).fetchall()
+
+        self.db_worker.submit(
+            self.page_key(page_idx), run,
+            lambda records: self._page_loaded(generation, page_idx, records),
+            lambda error: self._page_failed(generation, page_idx, error)
+        )
+
+    def _cache_page(self, page_idx, records):
+        self._pages[page_idx] = records
+        first_row = page_idx * self.PAGE_SIZE
+        for offset, record in enumerate(records):
+            self.row_index[(record[0], record[1])] = first_row + offset
+        while len(self._pages) > self.MAX_PAGES:
+            self._uncache_page(next(iter(self._pages)))
+
+    def _uncache_page(self, page_idx):
+        first_row = page_idx * self.PAGE_SIZE
+        for offset, record in enumerate(self._pages.pop(page_idx)):
+            key = (record[0], record[1])
+            if self.row_index.get(key) == first_row + offset:
+                del self.row_index[key]
+
+    @timed("data_table.page")
+    def _page_loaded(self, generation, page_idx, records):
+        if generation != self._generation:
+            return
+        self._pending_pages.discard(page_idx)
+        self._cache_page(page_idx, records)
+        first_row = page_idx * self.PAGE_SIZE
+        last_row = first_row + len(records) - 1
+        if len(records) < self.PAGE_SIZE and first_row <= self._row_count:
+            self._exhausted = True
+        if first_row < self._row_count and records:
+            self.dataChanged.emit(self.index(first_row, 0),
+                                  self.index(min(last_row, self._row_count - 1), self.COLUMN_COUNT - 1))
+        # Rows shifted by replace_rows may leave the next page partly shown already
+        if first_row <= self._row_count <= last_row:
+            self.beginInsertRows(QModelIndex(), self._row_count, last_row)
+            self._row_count = last_row + 1
+            self.endInsertRows()
+
+    def _page_failed(self, generation, page_idx, error):
+        if generation != self._generation:
+            return
+        self._pending_pages.discard(page_idx)
+        if page_idx * self.PAGE_SIZE == self._row_count:
+            self._exhausted = True
+        self.load_failed.emit(error)
+
+    def row_of(self, dish_id, date):
+        # -1 unless the row of (dish_id, date) is cached
+        return self.row_index.get((dish_id, date), -1)
+
+    def _move_rows(self, first_page, move, records=(), start=0, row_count=None):
+        """
+        Re-cache the rows of the pages from first_page on at move(row), dropping those it maps to None, then put
+        records at start. Only pages with all of their rows known are kept, the others are paged in again; the
+        last page is short when row_count, the number of rows once all are loaded, is given.
+        """
+        moved = {}
+        for page_idx in [page_idx for page_idx in self._pages if page_idx >= first_page]:
+            for offset, record in enumerate(self._pages[page_idx]):
+                row = move(page_idx * self.PAGE_SIZE + offset)
+                if row is not None:
+                    moved[row] = record
+            self._uncache_page(page_idx)
+        # Pages requested before the write may hold rows at their old place
+        for page_idx in [page_idx for page_idx in self._pending_pages if page_idx >= first_page]:
+            self.db_worker.cancel(self.page_key(page_idx))
+            self._pending_pages.discard(page_idx)
+        moved.update(enumerate(records, start))
+        for page_idx in sorted({row // self.PAGE_SIZE for row in moved}):
+            first_row = page_idx * self.PAGE_SIZE
+            end_row = first_row + self.PAGE_SIZE
+            if row_count is not None:
+                end_row = min(end_row, row_count)
+            if all(row in moved for row in range(first_row, end_row)):
+                self._cache_page(page_idx, [moved[row] for row in range(first_row, end_row)])
+
+    @timed("data_table.replace")
+    def replace_rows(self, start, old_count, records):
+        """
+        Replace the old_count rows from row start on by records, after a write changed them in the database.
+
+        The rows after them move by the difference. Rows gained or lost are announced as one range at the end of
+        the block and the rest of the block as changed. Cached pages before the one holding start are not touched.
+        """
+        delta = len(records) - old_count
+        end = start + old_count
+        if start > self._row_count or start == self._row_count and not self._exhausted:
+            # Rows past the shown ones are paged in when the view gets there
+            self._replace_cached_rows(start, old_count, records)
+            return
+        if end <= self._row_count and delta > 0:
+            self.beginInsertRows(QModelIndex(), end, end + delta - 1)
+            self._replace_cached_rows(start, old_count, records)
+            self._row_count += delta
+            self.endInsertRows()
+        elif end <= self._row_count and delta < 0:
+            self.beginRemoveRows(QModelIndex(), start + len(records), end - 1)
+            self._replace_cached_rows(start, old_count, records)
+            self._row_count += delta
+            self.endRemoveRows()
+        else:
+            self._replace_cached_rows(start, old_count, records)
+        last_row = start + min(old_count, len(records)) - 1 if end <= self._row_count else self._row_count - 1
+        if last_row >= start:
+            self.dataChanged.emit(self.index(start, 0), self.index(last_row, self.COLUMN_COUNT - 1))
+
+    def _replace_cached_rows(self, start, old_count, records):
+        delta = len(records) - old_count
+        end = start + old_count
+        first_page = start // self.PAGE_SIZE
+        last_page = (start + len(records) - 1) // self.PAGE_SIZE
+        if delta == 0 and all(page_idx in self._pages for page_idx in range(first_page, last_page + 1)):
+            # Same rows with new values, the common case of editing a day again
+            for row, record in enumerate(records, start):
+                page = self._pages[row // self.PAGE_SIZE]
+                old_record = page[row % self.PAGE_SIZE]
+                self.row_index.pop((old_record[0], old_record[1]), None)
+                page[row % self.PAGE_SIZE] = record
+                self.row_index[(record[0], record[1])] = row
         else:
-            check_box = index_widget.layout().itemAt(0).widget()
-            check_box.setChecked(int(self.parent().model().data(index)) == 2)
+            self._move_rows(first_page, lambda row: row if row < start else row + delta if row >= end else None,
+                            records, start, self._row_count + delta if self._exhausted else None)
+
+    @timed("data_table.remove")
+    def remove_rows(self, rows):
+        """Drop rows that were deleted from the database, announcing each run of rows once."""
+        rows = sorted(set(rows))
+        if not rows:
+            return
+        row_count = self._row_count - bisect_left(rows, self._row_count) if self._exhausted else None
+        # The cache is rewritten in one pass at the end, meanwhile record() skips the runs already removed
+        for first, count in row_ranges(row for row in rows if row < self._row_count):
+            self.beginRemoveRows(QModelIndex(), first, first + count - 1)
+            self._removed_runs.insert(0, (first, count))
+            self._row_count -= count
+            self.endRemoveRows()
+        self._removed_runs = []
+        removed = set(rows)
+        self._move_rows(rows[0] // self.PAGE_SIZE,
+                        lambda row: None if row in removed else row - bisect_left(rows, row), row_count=row_count)
+
+    def replace_date(self, write, date, on_result=None, on_error=None):
+        """Run write(connection) on the worker thread, then replace the shown rows of date, see replace_dates."""
+        self.replace_dates(write, [date], on_result, on_error)
+
+    def replace_dates(self, write, dates, on_result=None, on_error=None):
+        """
+        Run write(connection) on the worker thread, then replace the shown rows of dates by what it left there.
+
+        The rows of one date are consecutive, so the worker counts them before and after the write and reads
+        them again; the model then only touches those blocks, in the order they are shown, see replace_rows.
+        Sorted by anything but the date they are not, and the rows are paged in again instead.
+        """
+        where = self.where_sql()
+        params = self.where_params
+        order = self.order_sql()
+        descending = self.descending
+        date_range = self.date_range
+        generation = self._generation
+
+        if self.order_key != "date":
+            def refresh(result):
+                if generation == self._generation:
+                    self.refresh()
+                if on_result is not None:
+                    on_result(result)
+
+            self.db_worker.submit(None, write, refresh, on_error)
+            return
+
+        dates = sorted(set(dates), reverse=descending)
+        count_sql = SQL_COUNT_DISH_DATA.format(where=where + " AND dish_data.date = ?")
+        # Rows before a block, the later dates unless sorted oldest first
+        count_before_sql = SQL_COUNT_DISH_DATA.format(
+            where=where + (" AND dish_data.date > ?" if descending else " AND dish_data.date < ?"))
+        select_sql = self.SQL_SELECT.format(where=where + " AND dish_data.date = ?", **order)
+
+        def run(connection):
+            use_archives(connection, *date_range)
+            old_counts = [connection.execute(count_sql, params + (date,)).fetchone()[0] for date in dates]
+            result = write(connection)
+            blocks = []
+            for date, old_count in zip(dates, old_counts):
+                start = connection.execute(count_before_sql, params + (date,)).fetchone()[0]
+                records = connection.execute(select_sql, params + (date, -1, 0)).fetchall()
+                blocks.append((start, old_count, records))
+            return result, blocks
+
+        def done(outcome):
+            result, blocks = outcome
+            # A refresh in between pages everything in again anyway
+            if generation == self._generation:
+                for block in blocks:
+                    self.replace_rows(*block)
+            if on_result is not None:
+                on_result(result)
+
+        self.db_worker.submit(None, run, done, on_error)
+
+    def remove_dish(self, write, dish_id, on_result=None, on_error=None):
+        """Run write(connection), which deletes dish_id, on the worker thread, then drop just the rows of the dish."""
+        where = self.where_sql()
+        params = self.where_params
+        order = self.order_sql()
+        date_range = self.date_range
+        generation = self._generation
+
+        def run(connection):
+            use_archives(connection, *date_range)
+            rows = [row for (row,) in connection.execute(
+                SQL_SELECT_DISH_DATA_ROWS_OF_DISH.format(where=where, **order), params + (int(dish_id),))]
+            return write(connection), rows
+
+        def done(outcome):
+            result, rows = outcome
+            self.checked.difference_update([key for key in self.checked if key[0] == int(dish_id)])
+            if generation == self._generation:
+                self.remove_rows(rows)
+            if on_result is not None:
+                on_result(result)
+
+        self.db_worker.submit(None, run, done, on_error)
+
+    def record(self, row, load=True):
+        # None while the page of the row is being (re)loaded, or without load while it is not cached
+        for first, count in self._removed_runs:
+            if row < first:
+                break
+            row += count
+        page_idx = row // self.PAGE_SIZE
+        page = self._pages.get(page_idx)
+        if page is None:
+            if load:
+                self._request_page(page_idx)
+            return None
+        self._pages.move_to_end(page_idx)
+        offset = row % self.PAGE_SIZE
+        return page[offset] if offset < len(page) else None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._row_count:
+            return None
+        col = index.column()
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter if 1 <= col <= 4 or col == self.BRANCH_COLUMN else None
+        if role not in (Qt.DisplayRole, Qt.EditRole, SORT_ROLE):
+            return None
+        record = self.record(index.row())
+        if record is None:
+            # The page of the row is loading: shown unchecked and blank until it arrives
+            return str(int(Qt.Unchecked)) if col == self.CHOOSE_COLUMN else None
+        dish_id, date, dish_name, dish_price, sell_num = record
+        if role == SORT_ROLE and 0 <= col <= 4:
+            return record[col]
+        if col == 0:
+            return str(dish_id)
+        elif col == 1:
+            return date
+        elif col == 2:
+            return dish_name
+        elif col == 3:
+            return "{:.2f}".format(dish_price if dish_price else -0.01)
+        elif col == 4:
+            return str(sell_num)
+        elif col == self.CHOOSE_COLUMN:
+            return str(int(Qt.Checked if (dish_id, date) in self.checked else Qt.Unchecked))
+        elif col == self.BRANCH_COLUMN:
+            return "" if self.branch_of is None else self.branch_of(dish_id)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != self.CHOOSE_COLUMN or role not in (Qt.DisplayRole, Qt.EditRole):
+            return False
+        return self.set_checked([index.row()], int(value)) > 0
+
+    def set_checked(self, rows, state):
+        """
+        Check the rows for Qt.Checked, uncheck them for Qt.Unchecked, toggle each of them for None; rows whose page
+        is not cached are left as they are. Emits one dataChanged over the rows changed and returns how many.
+        """
+        changed = []
+        for row in rows:
+            record = self.record(row, load=False)
+            if record is None:
+                continue
+            key = (record[0], record[1])
+            checked = key not in self.checked if state is None else bool(state)
+            if checked == (key in self.checked):
+                continue
+            if checked:
+                self.checked.add(key)
+            else:
+                self.checked.discard(key)
+            changed.append(row)
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), self.CHOOSE_COLUMN),
+                                  self.index(max(changed), self.CHOOSE_COLUMN), [Qt.DisplayRole])
+        return len(changed)
+
+    def clear_checked(self):
+        # Also the rows of pages not cached or filtered out
+        self.checked.clear()
+        if self._row_count:
+            self.dataChanged.emit(self.index(0, self.CHOOSE_COLUMN),
+                                  self.index(self._row_count - 1, self.CHOOSE_COLUMN), [Qt.DisplayRole])
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and (section, orientation) in self._headers:
+            return self._headers[(section, orientation)]
+        return super(DishDataTableModel, self).headerData(section, orientation, role)
+
+    def setHeaderData(self, section, orientation, value, role=Qt.EditRole):
+        if role not in (Qt.DisplayRole, Qt.EditRole):
+            return False
+        self._headers[(section, orientation)] = value
+        self.headerDataChanged.emit(orientation, section, section)
+        return True
+
+
+class NewDishDataTableDelegateCell(QItemDelegate):
+    """Edits the 售出 number of a row with a spin box, created only while that cell is being edited."""
+    MAX_SELL_NUM = 9999
+
+    def createEditor(self, parent, option, index):
+        spin_box = QSpinBox(parent)
+        spin_box.setMaximum(self.MAX_SELL_NUM)
+        return spin_box
+
+    def setEditorData(self, editor, index):
+        editor.setValue(int(index.data(Qt.EditRole)))
+
+    def setModelData(self, editor, model, index):
+        editor.interpretText()
+        model.setData(index, editor.value(), Qt.EditRole)
+
+
+class NewDishDataTableModel(QAbstractTableModel):
+    """
+    The dishes and what they sold on one date, entered in the 添加/修改数据 popup.
+
+    The (dish_id, name, price, sell_num) records of the latest CACHE_SIZE dates are kept by data version, see
+    cached and store, so the dates next to the one shown can be fetched ahead and stepping from day to day needs no
+    query. Numbers typed in that differ from the one shown before are kept in ``edits`` per date until take_edits
+    hands them over to be saved, switching to another date and back shows them again. ``queued`` gives the number still waiting in the sales queue for
+    (dish_id, date), shown over the one read from the database.
+    """
+    CACHE_SIZE = 16
+    COLUMN_COUNT = 4
+    SELL_NUM_COLUMN = 3
+    HEADERS = ("ID", "菜品", "价格", "售出")
+
+    def __init__(self, parent=None):
+        super(NewDishDataTableModel, self).__init__(parent)
+        self.date = None
+        self.records = []
+        # date -> {dish_id: sell_num} typed in and not saved yet
+        self.edits = {}
+        self.queued = None
+        self.cache = OrderedDict()
+
+    def cached(self, version, date):
+        key = (version, date)
+        if key not in self.cache:
+            return None
+        self.cache.move_to_end(key)
+        return self.cache[key]
+
+    def store(self, version, date, records):
+        self.cache[(version, date)] = records
+        while len(self.cache) > self.CACHE_SIZE:
+            self.cache.popitem(last=False)
+        return records
+
+    def show_date(self, date, records):
+        self.beginResetModel()
+        self.date = date
+        self.records = records
+        self.endResetModel()
+
+    def clear(self):
+        # The database changed for another one, nothing of it applies anymore
+        self.cache.clear()
+        self.edits.clear()
+        self.show_date(None, [])
+
+    def sell_num(self, row):
+        edited = self.edits.get(self.date, {}).get(self.records[row][0])
+        return self.unedited_sell_num(row) if edited is None else edited
+
+    def unedited_sell_num(self, row):
+        # The number read from the database, or the one still waiting in the sales queue
+        dish_id, _, _, sell_num = self.records[row]
+        queued = self.queued(dish_id, self.date) if self.queued is not None else None
+        return sell_num if queued is None else queued
+
+    def take_edits(self):
+        """
+        (dish_id, date, sell_num) of the numbers typed in on any date, which are forgotten then. Only the cells
+        changed are saved, so a day nobody touched is never written back over what another write stored meanwhile.
+        """
+        records = [(dish_id, date, sell_num) for date, date_edits in self.edits.items()
+                   for dish_id, sell_num in date_edits.items()]
+        self.edits.clear()
+        return records
+
+    def discard_edits(self):
+        self.edits.clear()
+        if self.records:
+            self.dataChanged.emit(self.index(0, self.SELL_NUM_COLUMN),
+                                  self.index(len(self.records) - 1, self.SELL_NUM_COLUMN))
+
+    def remove_dish(self, dish_id):
+        # The dish is being deleted: its row goes and its numbers are not saved
+        for date_edits in self.edits.values():
+            date_edits.pop(int(dish_id), None)
+        self.cache.clear()
+        for row, record in enumerate(self.records):
+            if record[0] == int(dish_id):
+                self.beginRemoveRows(QModelIndex(), row, row)
+                self.records = self.records[:row] + self.records[row + 1:]
+                self.endRemoveRows()
+                break
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.records)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.COLUMN_COUNT
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, Qt.EditRole):
+            return None
+        dish_id, name, price, _ = self.records[index.row()]
+        col = index.column()
+        if col == 0:
+            return str(dish_id)
+        elif col == 1:
+            return name
+        elif col == 2:
+            return "{:.2f}".format(price)
+        elif col == self.SELL_NUM_COLUMN:
+            sell_num = self.sell_num(index.row())
+            return sell_num if role == Qt.EditRole else str(sell_num)
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or index.column() != self.SELL_NUM_COLUMN or role != Qt.EditRole:
+            return False
+        date_edits = self.edits.setdefault(self.date, {})
+        dish_id = self.records[index.row()][0]
+        if int(value) == self.unedited_sell_num(index.row()):
+            # Typed back to what it was, nothing to save
+            date_edits.pop(dish_id, None)
+        else:
+            date_edits[dish_id] = int(value)
+        self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        return flags | Qt.ItemIsEditable if index.column() == self.SELL_NUM_COLUMN else flags
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and 0 <= section < self.COLUMN_COUNT:
+            return self.HEADERS[section]
+        return super(NewDishDataTableModel, self).headerData(section, orientation, role)
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file '/root/package/modify_dish_popup.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Form(object):
+    def setupUi(self, Form):
+        Form.setObjectName("Form")
+        Form.resize(328, 200)
+        self.gridLayout = QtWidgets.QGridLayout(Form)
+        self.gridLayout.setObjectName("gridLayout")
+        self.verticalLayout = QtWidgets.QVBoxLayout()
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.formLayout = QtWidgets.QFormLayout()
+        self.formLayout.setObjectName("formLayout")
+        self.label = QtWidgets.QLabel(Form)
+        self.label.setObjectName("label")
+        self.formLayout.setWidget(0, QtWidgets.QFormLayout.LabelRole, self.label)
+        self.dish_name = QtWidgets.QLineEdit(Form)
+        self.dish_name.setObjectName("dish_name")
+        self.formLayout.setWidget(0, QtWidgets.QFormLayout.FieldRole, self.dish_name)
+        self.label_2 = QtWidgets.QLabel(Form)
+        self.label_2.setObjectName("label_2")
+        self.formLayout.setWidget(1, QtWidgets.QFormLayout.LabelRole, self.label_2)
+        self.dish_price = QtWidgets.QDoubleSpinBox(Form)
+        self.dish_price.setMaximum(9999.0)
+        self.dish_price.setObjectName("dish_price")
+        self.formLayout.setWidget(1, QtWidgets.QFormLayout.FieldRole, self.dish_price)
+        self.label_3 = QtWidgets.QLabel(Form)
+        self.label_3.setObjectName("label_3")
+        self.formLayout.setWidget(2, QtWidgets.QFormLayout.LabelRole, self.label_3)
+        self.dish_remark = QtWidgets.QTextEdit(Form)
+        self.dish_remark.setObjectName("dish_remark")
+        self.formLayout.setWidget(2, QtWidgets.QFormLayout.FieldRole, self.dish_remark)
+        self.verticalLayout.addLayout(self.formLayout)
+        self.modify_dish_btn = QtWidgets.QPushButton(Form)
+        self.modify_dish_btn.setObjectName("modify_dish_btn")
+        self.verticalLayout.addWidget(self.modify_dish_btn)
+        self.gridLayout.addLayout(self.verticalLayout, 0, 0, 1, 1)
+
+        self.retranslateUi(Form)
+        QtCore.QMetaObject.connectSlotsByName(Form)
+
+    def retranslateUi(self, Form):
+        _translate = QtCore.QCoreApplication.translate
+        Form.setWindowTitle(_translate("Form", "修改菜品"))
+        self.label.setText(_translate("Form", "菜品"))
+        self.label_2.setText(_translate("Form", "价格"))
+        self.label_3.setText(_translate("Form", "备注"))
+        self.modify_dish_btn.setText(_translate("Form", "确定"))
+
+
+UI_SOURCE_SHA1 = "4ce487ab27ea229942a5f1f2e8ba4468f7d22284"
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file '/root/package/new_dish_data_popup.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Form(object):
+    def setupUi(self, Form):
+        Form.setObjectName("Form")
+        Form.resize(400, 300)
+        self.gridLayout = QtWidgets.QGridLayout(Form)
+        self.gridLayout.setObjectName("gridLayout")
+        self.verticalLayout = QtWidgets.QVBoxLayout()
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.horizontalLayout_2 = QtWidgets.QHBoxLayout()
+        self.horizontalLayout_2.setObjectName("horizontalLayout_2")
+        self.label = QtWidgets.QLabel(Form)
+        self.label.setAlignment(QtCore.Qt.AlignCenter)
+        self.label.setObjectName("label")
+        self.horizontalLayout_2.addWidget(self.label)
+        self.dateEdit = QtWidgets.QDateEdit(Form)
+        self.dateEdit.setCurrentSection(QtWidgets.QDateTimeEdit.DaySection)
+        self.dateEdit.setCalendarPopup(True)
+        self.dateEdit.setObjectName("dateEdit")
+        self.horizontalLayout_2.addWidget(self.dateEdit)
+        self.verticalLayout.addLayout(self.horizontalLayout_2)
+        self.tableView = QtWidgets.QTableView(Form)
+        self.tableView.setEditTriggers(QtWidgets.QAbstractItemView.AnyKeyPressed|QtWidgets.QAbstractItemView.DoubleClicked|QtWidgets.QAbstractItemView.EditKeyPressed|QtWidgets.QAbstractItemView.SelectedClicked)
+        self.tableView.setSelectionMode(QtWidgets.QAbstractItemView.SingleSelection)
+        self.tableView.setObjectName("tableView")
+        self.tableView.horizontalHeader().setStretchLastSection(True)
+        self.verticalLayout.addWidget(self.tableView)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.pushButton_ok = QtWidgets.QPushButton(Form)
+        self.pushButton_ok.setObjectName("pushButton_ok")
+        self.horizontalLayout.addWidget(self.pushButton_ok)
+        self.pushButton_cancel = QtWidgets.QPushButton(Form)
+        self.pushButton_cancel.setObjectName("pushButton_cancel")
+        self.horizontalLayout.addWidget(self.pushButton_cancel)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+        self.gridLayout.addLayout(self.verticalLayout, 1, 0, 1, 1)
+
+        self.retranslateUi(Form)
+        self.pushButton_cancel.clicked.connect(Form.hide) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(Form)
+
+    def retranslateUi(self, Form):
+        _translate = QtCore.QCoreApplication.translate
+        Form.setWindowTitle(_translate("Form", "添加/修改数据"))
+        self.label.setText(_translate("Form", "日期"))
+        self.dateEdit.setDisplayFormat(_translate("Form", "yyyy年MM月dd日"))
+        self.pushButton_ok.setText(_translate("Form", "确定"))
+        self.pushButton_cancel.setText(_translate("Form", "取消"))
+
+
+UI_SOURCE_SHA1 = "9203f3d337edea5768bb7d49d4ae6e11aacae156"
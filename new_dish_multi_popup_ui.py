@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+# Form implementation generated from reading ui file '/root/package/new_dish_multi_popup.ui'
+#
+# Created by: PyQt5 UI code generator 5.15.11
+#
+# WARNING: Any manual changes made to this file will be lost when pyuic5 is
+# run again.  Do not edit this file unless you know what you are doing.
+
+
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+
+class Ui_Form(object):
+    def setupUi(self, Form):
+        Form.setObjectName("Form")
+        Form.resize(400, 300)
+        self.gridLayout = QtWidgets.QGridLayout(Form)
+        self.gridLayout.setObjectName("gridLayout")
+        self.verticalLayout = QtWidgets.QVBoxLayout()
+        self.verticalLayout.setObjectName("verticalLayout")
+        self.tableWidget = QtWidgets.QTableWidget(Form)
+        self.tableWidget.setFocusPolicy(QtCore.Qt.NoFocus)
+        self.tableWidget.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tableWidget.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
+        self.tableWidget.setObjectName("tableWidget")
+        self.tableWidget.setColumnCount(3)
+        self.tableWidget.setRowCount(0)
+        item = QtWidgets.QTableWidgetItem()
+        item.setTextAlignment(QtCore.Qt.AlignCenter)
+        self.tableWidget.setHorizontalHeaderItem(0, item)
+        item = QtWidgets.QTableWidgetItem()
+        item.setTextAlignment(QtCore.Qt.AlignCenter)
+        self.tableWidget.setHorizontalHeaderItem(1, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidget.setHorizontalHeaderItem(2, item)
+        self.tableWidget.horizontalHeader().setStretchLastSection(True)
+        self.verticalLayout.addWidget(self.tableWidget)
+        self.summary_label = QtWidgets.QLabel(Form)
+        self.summary_label.setText("")
+        self.summary_label.setObjectName("summary_label")
+        self.verticalLayout.addWidget(self.summary_label)
+        self.progressBar = QtWidgets.QProgressBar(Form)
+        self.progressBar.setVisible(False)
+        self.progressBar.setObjectName("progressBar")
+        self.verticalLayout.addWidget(self.progressBar)
+        self.horizontalLayout = QtWidgets.QHBoxLayout()
+        self.horizontalLayout.setObjectName("horizontalLayout")
+        self.label_policy = QtWidgets.QLabel(Form)
+        self.label_policy.setObjectName("label_policy")
+        self.horizontalLayout.addWidget(self.label_policy)
+        self.policy_comboBox = QtWidgets.QComboBox(Form)
+        self.policy_comboBox.setObjectName("policy_comboBox")
+        self.policy_comboBox.addItem("")
+        self.policy_comboBox.addItem("")
+        self.policy_comboBox.addItem("")
+        self.horizontalLayout.addWidget(self.policy_comboBox)
+        self.pushButton_ok = QtWidgets.QPushButton(Form)
+        self.pushButton_ok.setObjectName("pushButton_ok")
+        self.horizontalLayout.addWidget(self.pushButton_ok)
+        self.pushButton_cancel = QtWidgets.QPushButton(Form)
+        self.pushButton_cancel.setObjectName("pushButton_cancel")
+        self.horizontalLayout.addWidget(self.pushButton_cancel)
+        self.verticalLayout.addLayout(self.horizontalLayout)
+        self.gridLayout.addLayout(self.verticalLayout, 0, 0, 1, 1)
+
+        self.retranslateUi(Form)
+        self.pushButton_cancel.clicked.connect(Form.hide) # type: ignore
+        QtCore.QMetaObject.connectSlotsByName(Form)
+
+    def retranslateUi(self, Form):
+        _translate = QtCore.QCoreApplication.translate
+        Form.setWindowTitle(_translate("Form", "批量添加"))
+        item = self.tableWidget.horizontalHeaderItem(0)
+        item.setText(_translate("Form", "菜品"))
+        item = self.tableWidget.horizontalHeaderItem(1)
+        item.setText(_translate("Form", "价格"))
+        item = self.tableWidget.horizontalHeaderItem(2)
+        item.setText(_translate("Form", "备注"))
+        self.label_policy.setText(_translate("Form", "重复菜品"))
+        self.policy_comboBox.setItemText(0, _translate("Form", "跳过"))
+        self.policy_comboBox.setItemText(1, _translate("Form", "覆盖备注"))
+        self.policy_comboBox.setItemText(2, _translate("Form", "全部取消"))
+        self.pushButton_ok.setText(_translate("Form", "确定"))
+        self.pushButton_cancel.setText(_translate("Form", "取消"))
+
+
+UI_SOURCE_SHA1 = "ef8443694bf2c18d689cbd3642bcdc7a97c25a42"
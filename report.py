@@ -0,0 +1,133 @@
+"""
+Sales reports on the command line, without starting the GUI, e.g. from cron:
+
+    python report.py revenue --from 2024-01-01 --to 2024-06-30 --group month
+    python report.py top --limit 20 --by revenue --format json
+    python report.py dishes --db /path/to/restaurant.db > dishes.csv
+    python report.py top --db north.db --db south.db --db east.db
+
+Rows are streamed from SQLite to stdout as CSV (the default) or JSON. The database is opened read-only. With
+--db given several times the branches are reported together (see branches.BranchSet): top sellers are then
+matched across branches by name and price, and the dishes report has a branch column.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+import database
+import repository
+from branches import BranchSet
+
+REPORTS = {
+    "revenue": (("period", "sell_num", "revenue"),
+                lambda connection, args: repository.period_revenue(connection, args.start, args.end, args.group)),
+    "top": (("dish_id", "name", "price", "sell_num", "revenue"),
+            lambda connection, args: repository.top_sellers(connection, args.start, args.end, args.limit, args.by)),
+    "dishes": (("dish_id", "name", "price", "sell_num", "revenue"),
+               lambda connection, args: repository.dish_totals(connection, args.start, args.end)),
+}
+
+# The same reports over several branches, given the BranchSet instead of a connection
+BRANCH_REPORTS = {
+    "revenue": (("period", "sell_num", "revenue"),
+                lambda branch_set, args: branch_set.period_revenue(args.start, args.end, args.group)),
+    "top": (("name", "price", "sell_num", "revenue"),
+            lambda branch_set, args: branch_set.top_sellers(args.start, args.end, args.limit, args.by)),
+    "dishes": (("branch", "dish_id", "name", "price", "sell_num", "revenue"),
+               lambda branch_set, args: branch_set.dish_totals(args.start, args.end)),
+}
+
+
+def write_csv(columns, rows, out):
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(columns, rows, out):
+    # One object per row, written as they come so memory does not grow with the report
+    out.write("[")
+    for row_idx, row in enumerate(rows):
+        out.write(",\n " if row_idx else "\n ")
+        out.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False))
+    out.write("\n]\n")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Sales reports of restaurant.db as CSV or JSON on stdout")
+    parser.add_argument("report", choices=sorted(REPORTS))
+    parser.add_argument("--db", action="append",
+                        help="database file, repeated to report several branches together (default: restaurant.db)")
+    parser.add_argument("--from", dest="start", type=date.fromisoformat,
+                        help="first day, yyyy-mm-dd (default: 29 days before --to)")
+    parser.add_argument("--to", dest="end", type=date.fromisoformat, default=date.today(),
+                        help="last day, yyyy-mm-dd (default: today)")
+    parser.add_argument("--group", choices=("day", "week", "month"), default="month",
+                        help="period of the revenue report (default: %(default)s)")
+    parser.add_argument("--limit", type=int, default=10, help="number of top sellers (default: %(default)s)")
+    parser.add_argument("--by", choices=sorted(repository.TOP_SELLER_ORDERS), default="sell_num",
+                        help="what top sellers are ranked by (default: %(default)s)")
+    parser.add_argument("--format", choices=("csv", "json"), default="csv")
+    args = parser.parse_args(argv)
+    if not args.db:
+        args.db = ["restaurant.db"]
+    if args.start is None:
+        args.start = args.end - timedelta(days=29)
+    if args.start > args.end:
+        parser.error("--from is after --to")
+    return args
+
+
+def write_report(args, columns, rows):
+    """Write the report of the rows() cursor to stdout, returns the exit status."""
+    writer = write_json if args.format == "json" else write_csv
+    try:
+        writer(columns, rows(), sys.stdout)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader, like head, has seen enough: no traceback, and nothing left for Python to flush at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+    except sqlite3.Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    return 0
+
+
+def main_branches(args):
+    try:
+        branch_set = BranchSet(args.db)
+    except sqlite3.Error as error:
+        print(error, file=sys.stderr)
+        return 1
+    try:
+        columns, query = BRANCH_REPORTS[args.report]
+        return write_report(args, columns, lambda: query(branch_set, args))
+    finally:
+        branch_set.close()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if len(args.db) > 1:
+        return main_branches(args)
+    db_file = args.db[0]
+    try:
+        connection = database.connect_readonly(db_file)
+    except sqlite3.Error as error:
+        print("{}: {}".format(db_file, error) if db_file not in str(error) else error, file=sys.stderr)
+        return 1
+    try:
+        columns, query = REPORTS[args.report]
+        return write_report(args, columns, lambda: query(connection, args))
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
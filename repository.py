@@ -0,0 +1,104 @@
+"""
+Reads and writes of the restaurant data without any GUI, shared by the main window and report.py.
+
+Every function takes an open connection (see database.connect). Queries that may return many rows hand back the
+cursor, so callers stream the rows instead of building lists. The ones reading a date range read the archived
+years it reaches into as well, see archive.py.
+"""
+from datetime import date
+
+import database
+import search
+from archive import use_archives
+
+SQL_INSERT_DISH = """
+    INSERT INTO dish(name, price, remarks)
+    VALUES (?, ?, ?);"""
+
+SQL_UPDATE_DISH = """
+    UPDATE dish
+    SET name = ?, price = ?, remarks = ?
+    WHERE id = ?;"""
+
+SQL_DELETE_DISH = "DELETE FROM dish WHERE id = ?;"
+
+SQL_SELECT_PERIOD_REVENUE = """
+    SELECT totals.period, SUM(totals.sell_num), ROUND(SUM(totals.sell_num * dish.price), 2)
+    FROM ({totals}) AS totals JOIN dish
+    ON dish.id = totals.dish_id
+    GROUP BY totals.period
+    ORDER BY totals.period;"""
+
+SQL_SELECT_DISH_TOTALS = """
+    SELECT dish.id, dish.name, dish.price, COALESCE(totals.sell_num, 0),
+           ROUND(COALESCE(totals.sell_num, 0) * dish.price, 2) AS revenue
+    FROM dish LEFT JOIN ({totals}) AS totals
+    ON dish.id = totals.dish_id{where}
+    ORDER BY {order}
+    LIMIT ?;"""
+
+TOP_SELLER_ORDERS = {
+    "sell_num": "COALESCE(totals.sell_num, 0) DESC, dish.name, dish.price",
+    "revenue": "revenue DESC, dish.name, dish.price",
+}
+
+
+def insert_dish(connection, name, price, remarks):
+    dish_id = connection.execute(SQL_INSERT_DISH, (name, price, remarks)).lastrowid
+    connection.commit()
+    search.index_initials(connection)
+    return dish_id
+
+
+def update_dish(connection, dish_id, name, price, remarks):
+    connection.execute(SQL_UPDATE_DISH, (name, price, remarks, dish_id))
+    connection.commit()
+    search.index_initials(connection)
+
+
+def delete_dish(connection, dish_id):
+    connection.execute(SQL_DELETE_DISH, (dish_id,))
+    connection.commit()
+
+
+def save_sales(connection, records):
+    """Store (dish_id, "yyyy-MM-dd", sell_num) records, replacing the numbers already entered for those days."""
+    connection.executemany(database.SQL_UPSERT_DISH_DATA, records)
+    connection.commit()
+
+
+def sales_of_date(connection, day):
+    """(dish_id, name, price, sell_num) of every dish on day, 0 where nothing was entered."""
+    use_archives(connection, date.fromisoformat(day), date.fromisoformat(day))
+    return connection.execute(database.SQL_SELECT_DISH_SALES_OF_DATE, (day,))
+
+
+def dish_table(connection, start, end):
+    """(dish_id, name, price, sell_num, remarks) of every dish, sell_num summed over [start, end]."""
+    use_archives(connection, start, end)
+    return connection.execute(*database.dish_table_query(start, end, database.rollups_current(connection)))
+
+
+def period_revenue(connection, start, end, group="month"):
+    """(period, sell_num, revenue) per day, week or month within [start, end], see database.grouped_totals_query."""
+    use_archives(connection, start, end)
+    totals_sql, params = database.grouped_totals_query(start, end, group, database.rollups_current(connection))
+    return connection.execute(SQL_SELECT_PERIOD_REVENUE.format(totals=totals_sql), params)
+
+
+def dish_totals(connection, start, end):
+    """(dish_id, name, price, sell_num, revenue) of every dish over [start, end], ordered by name and price."""
+    use_archives(connection, start, end)
+    totals_sql, params = database.period_totals_query(start, end, database.rollups_current(connection))
+    return connection.execute(SQL_SELECT_DISH_TOTALS.format(totals=totals_sql, where="", order="dish.name, dish.price"),
+                              params + (-1,))
+
+
+def top_sellers(connection, start, end, limit=10, by="sell_num"):
+    """Like dish_totals, for the limit dishes that sold the most over [start, end] by sell_num or by revenue."""
+    if by not in TOP_SELLER_ORDERS:
+        raise ValueError("Unknown top seller order {!r}".format(by))
+    use_archives(connection, start, end)
+    totals_sql, params = database.period_totals_query(start, end, database.rollups_current(connection))
+    return connection.execute(SQL_SELECT_DISH_TOTALS.format(totals=totals_sql, where=" WHERE totals.sell_num > 0",
+                                                            order=TOP_SELLER_ORDERS[by]), params + (limit,))
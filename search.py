@@ -0,0 +1,119 @@
+"""
+Search of the dishes by what is typed into the filter boxes above the dish and data tables.
+
+Every word of the text has to be found in the name or the remarks of a dish, anywhere in them, or has to start
+the pinyin initials of its name, "gbjd" finding 宫保鸡丁. Words of three characters or more are looked up in the
+dish_search FTS5 table, whose trigram index finds any part of a text, Chinese or not; shorter ones, which it has no
+trigrams for, scan the dish table. A text that is a regular expression, like 鸡|鸭, is matched as one against the
+names and remarks instead, and one that is not a valid expression yet, like "(", is searched for as it is.
+
+A search returns the ids of the dishes found, the tables then filter by id (see TableFilter.set_col_match_filter).
+The initials need pypinyin, without it they are never filled in. Nothing here imports Qt.
+"""
+import re
+from collections import OrderedDict
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # Dishes are not found by their initials
+    lazy_pinyin = None
+
+# (schema, offset added to its dish ids) of the databases a connection searches, see BranchSet.search_schemas
+MAIN_SCHEMA = (("main", 0),)
+
+SQL_SEARCH_TEXT = "SELECT rowid FROM {schema}.dish_search(?);"
+
+SQL_SEARCH_SHORT_TEXT = "SELECT id FROM {schema}.dish WHERE name LIKE ? ESCAPE '\\' OR remarks LIKE ? ESCAPE '\\';"
+
+SQL_SEARCH_INITIALS = "SELECT dish_id FROM {schema}.dish_initials WHERE initials GLOB ?;"
+
+SQL_SEARCH_REGEX = "SELECT id FROM {schema}.dish WHERE name REGEXP ? OR remarks REGEXP ?;"
+
+SQL_SELECT_UNINDEXED_DISHES = """
+    SELECT id, name FROM dish
+    WHERE NOT EXISTS (SELECT 1 FROM dish_initials WHERE dish_initials.dish_id = dish.id);"""
+
+SQL_INSERT_INITIALS = "INSERT OR REPLACE INTO dish_initials (dish_id, initials) VALUES (?, ?);"
+
+REGEX_CHARACTERS = set(".^$*+?{}[]|()\\")
+LIKE_CHARACTERS = re.compile(r"([\\%_])")
+
+
+def name_initials(name):
+    # First letter of the pinyin of every character, and of every word of other text: 宫保鸡丁 is gbjd
+    return "".join(syllable[0] for syllable in lazy_pinyin(name, style=Style.FIRST_LETTER) if syllable).lower()
+
+
+def index_initials(connection):
+    """Store the initials of the dishes added or renamed since the last call, returns how many."""
+    if lazy_pinyin is None:
+        return 0
+    rows = connection.execute(SQL_SELECT_UNINDEXED_DISHES).fetchall()
+    if rows:
+        connection.executemany(SQL_INSERT_INITIALS, [(dish_id, name_initials(name)) for dish_id, name in rows])
+        connection.commit()
+    return len(rows)
+
+
+def regex_of(text):
+    # The compiled text if it is meant as a regular expression, None for plain words or a half typed pattern
+    if not REGEX_CHARACTERS.intersection(text):
+        return None
+    try:
+        return re.compile(text)
+    except re.error:
+        return None
+
+
+def word_query(word):
+    # (sql, params) pairs finding the dishes of one word
+    queries = []
+    if len(word) >= 3:
+        queries.append((SQL_SEARCH_TEXT, ('"{}"'.format(word.replace('"', '""')),)))
+    else:
+        pattern = "%" + LIKE_CHARACTERS.sub(r"\\\1", word) + "%"
+        queries.append((SQL_SEARCH_SHORT_TEXT, (pattern, pattern)))
+    if word.isascii() and word.isalnum():
+        queries.append((SQL_SEARCH_INITIALS, (word.lower() + "*",)))
+    return queries
+
+
+def matching_dish_ids(connection, text, schemas=MAIN_SCHEMA):
+    """Ids of the dishes text finds, see above; None for a text without words, which filters nothing."""
+    regex = regex_of(text.strip())
+    if regex is not None:
+        queries = [[(SQL_SEARCH_REGEX, (regex.pattern, regex.pattern))]]
+    else:
+        queries = [word_query(word) for word in text.split()]
+    if not queries:
+        return None
+    dish_ids = None
+    for word_queries in queries:
+        found = {dish_id + offset for sql, params in word_queries for schema, offset in schemas
+                 for (dish_id,) in connection.execute(sql.format(schema=schema), params)}
+        dish_ids = found if dish_ids is None else dish_ids & found
+    return frozenset(dish_ids)
+
+
+class SearchCache:
+    """The dish ids of the latest CACHE_SIZE searches, by data version (see analytics.Analytics) and text."""
+    CACHE_SIZE = 64
+
+    def __init__(self):
+        self.results = OrderedDict()
+
+    def get(self, version, text):
+        key = (version, text)
+        if key not in self.results:
+            return None
+        self.results.move_to_end(key)
+        return self.results[key]
+
+    def store(self, version, text, dish_ids):
+        self.results[(version, text)] = dish_ids
+        while len(self.results) > self.CACHE_SIZE:
+            self.results.popitem(last=False)
+        return dish_ids
+
+    def clear(self):
+        self.results.clear()
@@ -0,0 +1,15 @@
+import analytics
+import database
+
+
+def test_load_counts_null_sales_as_zero(tmp_path):
+    connection = database.connect(str(tmp_path / "restaurant.db"))
+    try:
+        connection.execute("INSERT INTO dish (id, name, price) VALUES (1, '宫保鸡丁', 28)")
+        connection.execute("INSERT INTO dish_data (dish_id, date, sell_num) VALUES (1, '2026-01-01', NULL)")
+        connection.execute("INSERT INTO dish_data (dish_id, date, sell_num) VALUES (1, '2026-01-02', 5)")
+        connection.commit()
+        history = analytics.SalesHistory.load(connection, 0)
+        assert history.units.tolist() == [[0, 5]]
+    finally:
+        connection.close()
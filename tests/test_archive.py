@@ -0,0 +1,63 @@
+import os
+import sqlite3
+from datetime import date
+
+import pytest
+
+import archive
+import database
+import repository
+
+SALES = [
+    (1, "2024-03-01", 3), (2, "2024-03-01", 1), (1, "2024-12-30", 2),
+    # A week across the new year, part of it archived with 2024
+    (1, "2024-12-31", 4), (2, "2025-01-02", 5), (1, "2025-06-01", 6),
+]
+RANGES = [
+    (date(2024, 1, 1), date(2025, 12, 31)),
+    (date(2024, 12, 30), date(2025, 1, 5)),
+    (date(2024, 12, 31), date(2024, 12, 31)),
+    (date(2025, 1, 1), date(2025, 12, 31)),
+]
+
+
+def totals(connection):
+    return [(repository.period_revenue(connection, start, end, group).fetchall(),
+             repository.dish_table(connection, start, end).fetchall(),
+             repository.dish_totals(connection, start, end).fetchall())
+            for start, end in RANGES for group in ("day", "week", "month")]
+
+
+def test_archive_year_keeps_totals(tmp_path):
+    db_file = str(tmp_path / "restaurant.db")
+    connection = database.connect(db_file)
+    try:
+        connection.executemany("INSERT INTO dish (id, name, price) VALUES (?, ?, ?)",
+                               [(1, "宫保鸡丁", 28), (2, "麻婆豆腐", 12.5)])
+        connection.executemany(database.SQL_UPSERT_DISH_DATA, SALES)
+        connection.commit()
+        before = totals(connection)
+        assert before[0][0] == [('2024-03-01', 4, 96.5), ('2024-12-30', 2, 56.0), ('2024-12-31', 4, 112.0),
+                                ('2025-01-02', 5, 62.5), ('2025-06-01', 6, 168.0)]
+
+        assert archive.archive_year(connection, 2024) == 4
+        assert os.path.exists(archive.archive_file(db_file, 2024))
+        archive.use_archives(connection, date(2025, 1, 1))
+        assert connection.execute("SELECT COUNT(*) FROM main.dish_data WHERE date < '2025-01-01'").fetchone()[0] == 0
+        assert connection.execute("SELECT COUNT(*) FROM main.dish_data WHERE date IS NOT NULL").fetchone()[0] == 2
+        assert totals(connection) == before
+
+        with pytest.raises(ValueError):
+            archive.archive_year(connection, 2024)
+        with pytest.raises(sqlite3.DatabaseError):
+            connection.execute(database.SQL_UPSERT_DISH_DATA, (1, "2024-05-01", 1))
+        connection.rollback()
+    finally:
+        connection.close()
+
+    # Opened again, the archived year is still read along
+    connection = database.connect(db_file)
+    try:
+        assert totals(connection) == before
+    finally:
+        connection.close()
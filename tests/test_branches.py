@@ -0,0 +1,66 @@
+from datetime import date
+
+import database
+from branches import BRANCH_ID_SHIFT, BranchSet
+
+# The same dish ids in both branches, for different dishes
+BRANCHES = {
+    "east": ([(1, "宫保鸡丁", 28), (2, "麻婆豆腐", 12.5)], [(1, "2024-03-01", 3), (2, "2024-03-02", 1)]),
+    "west": ([(1, "鱼香肉丝", 22), (2, "宫保鸡丁", 28), (3, "清炒时蔬", 9)],
+             [(1, "2024-03-01", 5), (2, "2024-03-01", 2), (3, "2024-03-03", 7)]),
+}
+START, END = date(2024, 3, 1), date(2024, 3, 31)
+
+
+def branch_files(tmp_path):
+    files = []
+    for name, (dishes, sales) in BRANCHES.items():
+        files.append(str(tmp_path / (name + ".db")))
+        connection = database.connect(files[-1])
+        connection.executemany("INSERT INTO dish (id, name, price) VALUES (?, ?, ?)", dishes)
+        connection.executemany(database.SQL_UPSERT_DISH_DATA, sales)
+        connection.commit()
+        connection.close()
+    return files
+
+
+def test_branch_dish_ids_are_unique_and_decode_to_their_branch(tmp_path):
+    branch_set = BranchSet(branch_files(tmp_path))
+    connection = branch_set.connect()
+    try:
+        dishes = connection.execute("SELECT id, branch, name FROM dish").fetchall()
+        assert len({dish_id for dish_id, _, _ in dishes}) == len(dishes) == 5
+        for dish_id, branch, name in dishes:
+            assert branch_set.branch_of(dish_id) == branch
+            id_in_branch = dish_id & ((1 << BRANCH_ID_SHIFT) - 1)
+            assert dish_id == branch_set.dish_id(branch_set.names.index(branch), id_in_branch)
+            assert (id_in_branch, name) in [row[:2] for row in BRANCHES[branch][0]]
+        # Every sale joins the dish of its own branch
+        sales = connection.execute("""
+            SELECT dish.branch, dish.name, dish_data.date, dish_data.sell_num
+            FROM dish_data JOIN dish ON dish.id = dish_data.dish_id
+            WHERE dish_data.date IS NOT NULL""").fetchall()
+        names = {(branch, dish_id): name for branch, (branch_dishes, _) in BRANCHES.items()
+                 for dish_id, name, _ in branch_dishes}
+        assert sorted(sales) == sorted((branch, names[(branch, dish_id)], day, sell_num)
+                                       for branch, (_, branch_sales) in BRANCHES.items()
+                                       for dish_id, day, sell_num in branch_sales)
+    finally:
+        connection.close()
+        branch_set.close()
+
+
+def test_branch_pool_matches_attached_views(tmp_path):
+    branch_set = BranchSet(branch_files(tmp_path), processes=2)
+    connection = branch_set.connect()
+    try:
+        attached = sorted(branch_set.dish_table(connection, START, END))
+        revenue = branch_set.period_revenue(START, END)
+        branch_set.POOL_MIN_BRANCHES = 2
+        assert branch_set.use_pool()
+        assert sorted(branch_set.dish_table(connection, START, END)) == attached
+        assert branch_set.period_revenue(START, END) == revenue == [("2024-03", 18, 325.5)]
+        assert [row[0] for row in attached if row[1] == "宫保鸡丁"] == [1, (1 << BRANCH_ID_SHIFT) + 2]
+    finally:
+        connection.close()
+        branch_set.close()
@@ -0,0 +1,66 @@
+import sqlite3
+from datetime import date, timedelta
+
+import database
+
+SQL_WEEKLY = "SELECT dish_id, week, sell_num FROM dish_sales_weekly WHERE sell_num != 0 ORDER BY dish_id, week"
+SQL_MONTHLY = "SELECT dish_id, month, sell_num FROM dish_sales_monthly WHERE sell_num != 0 ORDER BY dish_id, month"
+
+
+def rollups(connection):
+    return connection.execute(SQL_WEEKLY).fetchall(), connection.execute(SQL_MONTHLY).fetchall()
+
+
+def test_resume_rollups_rebuilds_days_written_by_other_connections(tmp_path):
+    db_file = str(tmp_path / "restaurant.db")
+    importer = database.connect(db_file)
+    front_desk = database.connect(db_file)
+    try:
+        importer.execute("INSERT INTO dish (name, price) VALUES ('菜', 10)")
+        importer.commit()
+        today = date.today()
+        suspension_id = database.suspend_rollups(importer)
+        imported = today - timedelta(days=400)
+        importer.execute(database.SQL_UPSERT_DISH_DATA, (1, imported.isoformat(), 3))
+        importer.commit()
+        # Back-dated outside the range of the import and before the suspension started
+        front_desk.execute(database.SQL_UPSERT_DISH_DATA, (1, (today - timedelta(days=100)).isoformat(), 5))
+        front_desk.commit()
+        database.resume_rollups(importer, suspension_id, imported, imported)
+
+        resumed = rollups(importer)
+        database.rebuild_rollups(importer)
+        assert resumed == rollups(importer)
+        assert importer.execute("SELECT COUNT(*) FROM rollup_dirty").fetchone()[0] == 0
+        # The triggers are back on, and no longer note the days written
+        front_desk.execute(database.SQL_UPSERT_DISH_DATA, (1, today.isoformat(), 7))
+        front_desk.commit()
+        assert importer.execute("SELECT COUNT(*) FROM rollup_dirty").fetchone()[0] == 0
+        triggered = rollups(importer)
+        database.rebuild_rollups(importer)
+        assert triggered == rollups(importer)
+    finally:
+        front_desk.close()
+        importer.close()
+
+
+def test_migration_keeps_sales_of_deleted_dishes(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "restaurant.db")
+    old = sqlite3.connect(db_file)
+    monkeypatch.setattr(database, "MIGRATIONS", [m for m in database.MIGRATIONS if m.version < 5])
+    database.migrate(old)
+    # Deleted without foreign keys, the sales stay behind
+    old.execute("INSERT INTO dish (id, name, price) VALUES (7, '菜', 10)")
+    old.execute("INSERT INTO dish_data (dish_id, date, sell_num) VALUES (7, '2024-03-01', 3)")
+    old.execute("DELETE FROM dish WHERE id = 7")
+    old.commit()
+    old.close()
+    monkeypatch.undo()
+
+    connection = database.connect(db_file)
+    try:
+        sql = database.SQL_SELECT_DISH_DATA.format(where="", **database.dish_data_order("name"))
+        assert connection.execute(sql, (256, 0)).fetchall() == [(7, "2024-03-01", "已删除菜品 7", 0, 3)]
+        assert connection.execute(database.SQL_COUNT_ORPHAN_SALES).fetchone() == (0, 0)
+    finally:
+        connection.close()
@@ -0,0 +1,24 @@
+import zipfile
+from xml.etree import ElementTree
+
+import database
+import exporters
+
+XLSX_NAMESPACE = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def test_export_xlsx_drops_invalid_xml_characters(tmp_path):
+    db_file = str(tmp_path / "restaurant.db")
+    xlsx_file = str(tmp_path / "sales.xlsx")
+    connection = database.connect(db_file)
+    try:
+        connection.execute("INSERT INTO dish (id, name, price) VALUES (1, ?, 28)", ("宫保\x0b鸡丁\x00",))
+        connection.execute("INSERT INTO dish_data (dish_id, date, sell_num) VALUES (1, '2024-03-01', 2)")
+        connection.commit()
+        assert exporters.export_sales(connection, xlsx_file) == 1
+    finally:
+        connection.close()
+    with zipfile.ZipFile(xlsx_file) as zip_file:
+        sheet = ElementTree.fromstring(zip_file.read("xl/worksheets/sheet1.xml"))
+    texts = [t.text for t in sheet.iter(XLSX_NAMESPACE + "t")]
+    assert "宫保鸡丁" in texts
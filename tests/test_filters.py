@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+from PyQt5.QtCore import QDate
+from PyQt5.QtGui import QStandardItem, QStandardItemModel
+
+from filters import SORT_ROLE, TableFilter, sql_regexp
+
+ROWS = [
+    (1, "2024-03-01", "宫保鸡丁", 28.0, 3, "东店"),
+    (2, "2024-03-02", "鱼香(肉丝)", 22.5, 0, "西店"),
+    (3, "2024-03-05", "麻婆豆腐", 12.0, 10, "东店"),
+    (4, "2024-02-28", "Kung Pao", 30.0, 7, ""),
+    (5, "2024-03-03", "宫保虾球", 58.0, 1, "西店"),
+]
+SQL_COLUMNS = {0: "id", 1: "date", 2: "name", 3: "price", 4: "sell_num", 5: "branch"}
+METHODS = {0: "Match", 1: "Date", 2: "Regex", 3: "Number", 4: "Number", 5: "Set"}
+
+
+class SqlSourceModel(QStandardItemModel):
+    """Source model taking the filters pushed down, as DishDataTableModel does."""
+    def __init__(self):
+        super(SqlSourceModel, self).__init__(0, len(SQL_COLUMNS))
+        self.where = ""
+        self.params = ()
+
+    def set_filter(self, where, params=(), date_range=(None, None)):
+        self.where = where
+        self.params = params
+
+
+def table_model():
+    model = QStandardItemModel(0, len(SQL_COLUMNS))
+    for row in ROWS:
+        items = []
+        for value in row:
+            item = QStandardItem(str(value))
+            item.setData(value, SORT_ROLE)
+            items.append(item)
+        model.appendRow(items)
+    return model
+
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.create_function("REGEXP", 2, sql_regexp, deterministic=True)
+    connection.execute("CREATE TABLE t (id integer, date date, name text, price numeric, sell_num integer, branch text)")
+    connection.executemany("INSERT INTO t VALUES (?, ?, ?, ?, ?, ?)", ROWS)
+    yield connection
+    connection.close()
+
+
+def in_memory_ids(set_filter):
+    proxy = TableFilter()
+    proxy.filter_method.update(METHODS)
+    proxy.setSourceModel(table_model())
+    set_filter(proxy)
+    return sorted(proxy.index(row, 0).data(SORT_ROLE) for row in range(proxy.rowCount()))
+
+
+def sql_ids(connection, set_filter):
+    proxy = TableFilter()
+    proxy.filter_method.update(METHODS)
+    source_model = SqlSourceModel()
+    proxy.setSourceModel(source_model)
+    proxy.set_sql_columns(SQL_COLUMNS)
+    set_filter(proxy)
+    proxy.apply_sql_filter()
+    where = " WHERE " + source_model.where if source_model.where else ""
+    return sorted(row_id for (row_id,) in connection.execute("SELECT id FROM t" + where, source_model.params))
+
+
+def day(text):
+    return QDate.fromString(text, "yyyy-MM-dd")
+
+
+@pytest.mark.parametrize("set_filter, ids", [
+    (lambda proxy: proxy.set_col_number_filter(3, 20, 30), [1, 2, 4]),
+    (lambda proxy: proxy.set_col_number_filter(3, 0, 12), [3]),
+    (lambda proxy: proxy.set_col_number_filter(4, 1, 7), [1, 4, 5]),
+    # No upper bound, or one below the lower: no filter
+    (lambda proxy: proxy.set_col_number_filter(3, 0, 0), [1, 2, 3, 4, 5]),
+    (lambda proxy: proxy.set_col_number_filter(3, 30, 20), [1, 2, 3, 4, 5]),
+    (lambda proxy: proxy.set_col_date_filter(1, day("2024-03-01"), day("2024-03-03")), [1, 2, 5]),
+    (lambda proxy: proxy.set_col_date_filter(1, day("2024-03-05"), day("2024-03-01")), []),
+    (lambda proxy: proxy.set_col_regex_filter(2, "宫保"), [1, 5]),
+    (lambda proxy: proxy.set_col_regex_filter(2, "^k"), []),
+    (lambda proxy: proxy.set_col_regex_filter(2, "(?i)^k"), [4]),
+    (lambda proxy: proxy.set_col_regex_filter(2, ""), [1, 2, 3, 4, 5]),
+    # Half typed patterns are matched as text
+    (lambda proxy: proxy.set_col_regex_filter(2, "("), [2]),
+    (lambda proxy: proxy.set_col_regex_filter(2, "[宫"), []),
+    (lambda proxy: proxy.set_col_set_filter(5, ["东店"]), [1, 3]),
+    (lambda proxy: proxy.set_col_set_filter(5, ["东店", ""]), [1, 3, 4]),
+    (lambda proxy: proxy.set_col_set_filter(5, []), [1, 2, 3, 4, 5]),
+    (lambda proxy: proxy.set_col_match_filter(0, [1, 3, 9]), [1, 3]),
+    (lambda proxy: proxy.set_col_match_filter(0, []), []),
+    (lambda proxy: proxy.set_col_match_filter(0, None), [1, 2, 3, 4, 5]),
+    (lambda proxy: (proxy.set_col_regex_filter(2, "宫保"), proxy.set_col_number_filter(4, 2, 10)), [1]),
+])
+def test_sql_filter_matches_in_memory_filter(app, connection, set_filter, ids):
+    assert in_memory_ids(set_filter) == ids
+    assert sql_ids(connection, set_filter) == ids
@@ -0,0 +1,34 @@
+from datetime import date
+
+import pytest
+
+import database
+import importers
+
+
+@pytest.mark.parametrize("text, sell_num", [("3", 3), (" 12 ", 12), ("4.00", 4), ("0", 0)])
+def test_parse_sales_row_whole_numbers(text, sell_num):
+    row = ["2024-03-01", "宫保鸡丁", "28", text]
+    assert importers.parse_sales_row(row) == (date(2024, 3, 1), "宫保鸡丁", 28.0, sell_num)
+
+
+@pytest.mark.parametrize("text", ["2.7", "1e3", "-1", "", "三"])
+def test_parse_sales_row_rejects_other_numbers(text):
+    with pytest.raises(ValueError):
+        importers.parse_sales_row(["2024-03-01", "宫保鸡丁", "28", text])
+
+
+def test_import_sales_csv_reports_fractions(tmp_path):
+    db_file = str(tmp_path / "restaurant.db")
+    csv_file = tmp_path / "sales.csv"
+    csv_file.write_text("日期,菜品,价格,售出\n2024-03-01,宫保鸡丁,28,2\n2024-03-02,宫保鸡丁,28,2.7\n", encoding="utf-8")
+    connection = database.connect(db_file)
+    try:
+        connection.execute("INSERT INTO dish (name, price) VALUES ('宫保鸡丁', 28)")
+        connection.commit()
+        result = importers.import_sales_csv(connection, str(csv_file))
+        assert [line_no for line_no, _ in result.errors] == [3]
+        assert connection.execute("SELECT date, sell_num FROM dish_data WHERE date IS NOT NULL").fetchall() == [
+            ("2024-03-01", 2)]
+    finally:
+        connection.close()
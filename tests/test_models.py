@@ -0,0 +1,227 @@
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QDate, QEvent, QModelIndex, QObject, QPointF
+from PyQt5.QtGui import QMouseEvent, QStandardItemModel
+from PyQt5.QtTest import QTest
+from PyQt5.QtWidgets import QTableView
+
+import pytest
+
+import benchmark
+from models import DishDataTableModel, DishTableDelegateCell, NewDishDataTableModel
+
+
+def test_paint_data_table_past_the_page_cache(app, tmp_path):
+    # More rows than DishDataTableModel keeps cached, so the first pages are evicted and paged in again
+    db_file = str(tmp_path / "restaurant.db")
+    benchmark.generate_db(db_file, dishes=300, days=80, density=1.0)
+    bench = benchmark.Bench(app, db_file)
+    window = bench.window = bench.open_window()
+    try:
+        window.lower_data_dateEdit.setDate(QDate.currentDate().addDays(-100))
+        window.dish_data_table_proxy.apply_sql_filter()
+        bench.wait()
+        model = window.dish_data_table_model
+        while model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
+            bench.wait()
+        assert model.rowCount() > model.PAGE_SIZE * model.MAX_PAGES
+
+        view = window.data_tableView
+        window.tabWidget.setCurrentWidget(view.parentWidget())
+        view.scrollToBottom()
+        app.processEvents()
+        view.scrollToTop()
+        assert model.record(0, load=False) is None
+        assert model.data(model.index(0, model.CHOOSE_COLUMN)) == "0"
+        assert model.data(model.index(0, 2)) is None
+        assert not view.viewport().grab().isNull()
+        bench.wait()
+        assert model.data(model.index(0, 2)) is not None
+    finally:
+        bench.close_window(window)
+
+
+class PaintCounter(QObject):
+    def __init__(self):
+        super(PaintCounter, self).__init__()
+        self.paints = 0
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            self.paints += 1
+        return False
+
+
+def test_dish_table_buttons_repaint_when_pressed(app):
+    clicked = []
+    model = QStandardItemModel(2, 5)
+    view = QTableView()
+    view.setModel(model)
+    delegate = DishTableDelegateCell(clicked.append, clicked.append, view)
+    view.setItemDelegateForColumn(4, delegate)
+    view.resize(800, 300)
+    view.show()
+    assert QTest.qWaitForWindowExposed(view)
+    counter = PaintCounter()
+    view.viewport().installEventFilter(counter)
+
+    index = model.index(0, 4)
+    option = view.viewOptions()
+    option.rect = view.visualRect(index)
+    option.widget = view
+    pos = delegate.button_rects(option.rect)[0].center()
+    for event_type in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease):
+        counter.paints = 0
+        event = QMouseEvent(event_type, QPointF(pos), Qt.LeftButton, Qt.LeftButton, Qt.NoModifier)
+        assert delegate.editorEvent(event, model, option, index)
+        app.processEvents()
+        assert counter.paints > 0
+    assert delegate.pressed is None and len(clicked) == 1
+    view.close()
+
+
+class SmallPagesModel(DishDataTableModel):
+    PAGE_SIZE = 4
+
+
+class PageWorker:
+    """Stands in for the DatabaseWorker of a DishDataTableModel, answering its page requests from rows."""
+    def __init__(self, rows):
+        self.rows = rows
+        self.requests = OrderedDict()
+
+    def submit(self, key, func, on_result=None, on_error=None):
+        self.requests[key] = on_result
+
+    def cancel(self, key):
+        self.requests.pop(key, None)
+
+    def answer(self):
+        while self.requests:
+            (_, page_idx), on_result = self.requests.popitem(last=False)
+            size = SmallPagesModel.PAGE_SIZE
+            on_result(self.rows[page_idx * size:(page_idx + 1) * size])
+
+
+def sale(dish_id, day, sell_num=1):
+    return dish_id, "2024-03-{:02d}".format(day), "菜{}".format(dish_id), 10.0, sell_num
+
+
+def check_row_index(model, rows):
+    # Every cached row is the one the database has there, and row_index holds exactly the cached rows
+    cached = {}
+    for row in range(model.rowCount()):
+        record = model.record(row, load=False)
+        if record is not None:
+            assert record == rows[row]
+            cached[record[:2]] = row
+    assert model.row_index == cached
+    # Paging in what is missing then shows every row
+    for row in range(model.rowCount()):
+        model.record(row)
+    model.db_worker.answer()
+    assert model.rowCount() == len(rows)
+    assert [model.record(row, load=False) for row in range(len(rows))] == rows
+    assert model.row_index == {record[:2]: row for row, record in enumerate(rows)}
+
+
+@pytest.fixture
+def paged_model(app):
+    rows = [sale(dish_id, day) for day in range(1, 4) for dish_id in range(1, 6)]
+    model = SmallPagesModel()
+    model.set_worker(PageWorker(rows))
+    while model.db_worker.requests:
+        model.db_worker.answer()
+        if model.canFetchMore(QModelIndex()):
+            model.fetchMore(QModelIndex())
+    assert model.rowCount() == 15 and not model.canFetchMore(QModelIndex())
+    return model, rows
+
+
+def test_replace_rows_in_place(paged_model):
+    model, rows = paged_model
+    records = [sale(dish_id, 2, 9) for dish_id in range(1, 6)]
+    rows[5:10] = records
+    model.replace_rows(5, 5, records)
+    assert model.row_of(3, "2024-03-02") == 7
+    check_row_index(model, rows)
+
+
+def test_replace_rows_growing_across_pages(paged_model):
+    model, rows = paged_model
+    # A page longer, so the pages after it come out complete and stay cached
+    records = [sale(dish_id, 2, 9) for dish_id in range(1, 10)]
+    rows[5:10] = records
+    model.replace_rows(5, 5, records)
+    assert model.rowCount() == 19
+    assert model.row_of(2, "2024-03-03") == 15
+    check_row_index(model, rows)
+
+
+def test_replace_rows_shrinking_across_pages(paged_model):
+    model, rows = paged_model
+    records = [sale(4, 2, 9)]
+    rows[5:10] = records
+    model.replace_rows(5, 5, records)
+    assert model.rowCount() == 11
+    assert model.row_of(1, "2024-03-03") == 6
+    check_row_index(model, rows)
+
+
+def test_remove_rows_across_pages(paged_model):
+    model, rows = paged_model
+    removed = [1, 2, 9, 14]
+    model.remove_rows(removed)
+    rows[:] = [record for row, record in enumerate(rows) if row not in removed]
+    assert model.rowCount() == 11
+    # The second page is made up of rows of the second and third ones
+    assert model.row_of(2, "2024-03-02") == 4 and model.row_of(1, "2024-03-03") == 7
+    check_row_index(model, rows)
+
+
+def test_replace_rows_with_pages_not_loaded(app):
+    # Only the first pages are shown and some of them evicted, the moved rows of those must not linger in row_index
+    rows = [sale(dish_id, day) for day in range(1, 6) for dish_id in range(1, 6)]
+    model = SmallPagesModel()
+    model.MAX_PAGES = 2
+    model.set_worker(PageWorker(rows))
+    for _ in range(3):
+        model.db_worker.answer()
+        model.fetchMore(QModelIndex())
+    # The request of the fourth page is still out when the write lands
+    assert model.rowCount() == 12 and model.canFetchMore(QModelIndex())
+    records = [sale(dish_id, 1, 9) for dish_id in range(1, 8)]
+    rows[0:5] = records
+    model.replace_rows(0, 5, records)
+    assert model.rowCount() == 14
+    cached = {model.record(row, load=False)[:2]: row for row in range(model.rowCount())
+              if model.record(row, load=False) is not None}
+    assert model.row_index == cached
+    assert all(rows[row][:2] == key for key, row in cached.items())
+    model.db_worker.answer()
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+        model.db_worker.answer()
+    model.MAX_PAGES = 64
+    check_row_index(model, rows)
+
+
+def test_take_edits_returns_only_changed_cells(app):
+    model = NewDishDataTableModel()
+    queued = {(2, "2024-03-02"): 6}
+    model.queued = lambda dish_id, date: queued.get((dish_id, date))
+    day_records = [(1, "宫保鸡丁", 28.0, 3), (2, "麻婆豆腐", 12.5, 0), (3, "鱼香肉丝", 22.0, 1)]
+    column = model.SELL_NUM_COLUMN
+    model.show_date("2024-03-01", day_records)
+    assert model.setData(model.index(0, column), 5)
+    # Typed in as it was, and changed and typed back
+    assert model.setData(model.index(1, column), 0)
+    assert model.setData(model.index(2, column), 4)
+    assert model.setData(model.index(2, column), 1)
+    model.show_date("2024-03-02", day_records)
+    assert model.index(1, column).data() == "6"
+    assert model.setData(model.index(0, column), 2)
+    assert model.setData(model.index(1, column), 6)
+    assert sorted(model.take_edits()) == [(1, "2024-03-01", 5), (1, "2024-03-02", 2)]
+    assert model.take_edits() == []
@@ -0,0 +1,10 @@
+import report
+
+
+def test_report_database_error(tmp_path, capsys):
+    db_file = tmp_path / "bad.db"
+    db_file.write_bytes(b"garbage" * 500)
+    assert report.main(["dishes", "--db", str(db_file)]) == 1
+    captured = capsys.readouterr()
+    assert captured.out == ""
+    assert "not a database" in captured.err
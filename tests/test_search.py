@@ -0,0 +1,103 @@
+import pytest
+
+import database
+import repository
+import search
+from filters import sql_regexp
+
+DISHES = [
+    (1, "宫保鸡丁", "微辣"),
+    (2, "鱼香肉丝", None),
+    (3, "100%果汁", "鲜榨"),
+    (4, "a_b 套餐", '含"饮料"'),
+    (5, "Kung Pao AND rice", "(大份)"),
+]
+
+
+@pytest.fixture
+def connection(tmp_path):
+    connection = database.connect(str(tmp_path / "restaurant.db"))
+    connection.create_function("REGEXP", 2, sql_regexp, deterministic=True)
+    connection.executemany("INSERT INTO dish (id, name, price, remarks) VALUES (?, ?, 10, ?)", DISHES)
+    # Written by index_initials where pypinyin is installed
+    connection.executemany(search.SQL_INSERT_INITIALS, [(1, "gbjd"), (2, "yxrs")])
+    connection.commit()
+    yield connection
+    connection.close()
+
+
+def found(connection, text):
+    dish_ids = search.matching_dish_ids(connection, text)
+    return None if dish_ids is None else sorted(dish_ids)
+
+
+@pytest.mark.parametrize("text, dish_ids", [
+    # Shorter than a trigram
+    ("鸡", [1]),
+    ("宫保", [1]),
+    ("辣", [1]),
+    ("ab", []),
+    ("a", [4, 5]),
+    # LIKE wildcards are searched for as they are
+    ("%", [3]),
+    ("_", [4]),
+    ("%果", [3]),
+    # Trigrams, and every word has to be found
+    ("宫保鸡", [1]),
+    ("鸡丁 微辣", [1]),
+    ("鸡丁 肉丝", []),
+    ("   ", None),
+])
+def test_short_and_long_words(connection, text, dish_ids):
+    assert found(connection, text) == dish_ids
+
+
+@pytest.mark.parametrize("text, dish_ids", [
+    # FTS5 query syntax is searched for as text, not run
+    ('"饮料"', [4]),
+    ('"饮', [4]),
+    ("AND", [5]),
+    ("and rice", [5]),
+    ("NOT", []),
+    ("Pao:", []),
+    ("name:宫保", []),
+    ("-鸡丁", []),
+    # Not a valid regular expression, searched for as it is
+    ("(大份", [5]),
+    ("(", [5]),
+    # A regular expression
+    ("鸡|肉", [1, 2]),
+    ("^a_", [4]),
+])
+def test_special_characters(connection, text, dish_ids):
+    assert found(connection, text) == dish_ids
+
+
+def test_initials(connection):
+    assert found(connection, "gb") == [1]
+    assert found(connection, "GBJD") == [1]
+    assert found(connection, "yx gbjd") == []
+
+
+def test_rename_keeps_the_index_in_sync(connection):
+    connection.execute("UPDATE dish SET name = '麻婆豆腐', remarks = '特辣' WHERE id = 1")
+    connection.commit()
+    assert found(connection, "宫保鸡") == []
+    assert found(connection, "微辣") == []
+    assert found(connection, "婆豆腐") == [1]
+    assert found(connection, "特辣") == [1]
+    # The initials of the old name are dropped, a remark change keeps those of the name
+    assert found(connection, "gbjd") == []
+    connection.execute("UPDATE dish SET remarks = NULL WHERE id = 2")
+    connection.commit()
+    assert found(connection, "yxrs") == [2]
+    connection.execute("DELETE FROM dish WHERE id = 2")
+    connection.commit()
+    assert found(connection, "鱼香肉") == []
+    assert found(connection, "yxrs") == []
+
+
+@pytest.mark.skipif(search.lazy_pinyin is None, reason="pypinyin is not installed")
+def test_renamed_dish_found_by_its_new_initials(connection):
+    repository.update_dish(connection, 1, "麻婆豆腐", 10, None)
+    assert found(connection, "mpdf") == [1]
@@ -0,0 +1,106 @@
+import json
+import os
+
+import pytest
+
+from PyQt5.QtTest import QSignalSpy
+
+from workers import DatabaseTask, DatabaseWorker, SalesWriteQueue
+
+
+class FakeWrite:
+    """write() of a SalesWriteQueue storing the batches, failing those holding a sale of fail_date."""
+    def __init__(self, fail_date=None):
+        self.fail_date = fail_date
+        self.batches = []
+        self.stored = {}
+
+    def __call__(self, records, on_result, on_error):
+        self.batches.append(sorted(records))
+        if any(date == self.fail_date for _, date, _ in records):
+            on_error("archived")
+            return
+        for dish_id, date, sell_num in records:
+            self.stored[(dish_id, date)] = sell_num
+        on_result(None)
+
+
+@pytest.fixture
+def journal_file(tmp_path):
+    return str(tmp_path / "restaurant.db-pending")
+
+
+def write_all(queue):
+    while queue.pending or queue.writing:
+        queue.flush()
+
+
+def test_put_coalesces_by_dish_and_date(app, journal_file):
+    write = FakeWrite()
+    queue = SalesWriteQueue(journal_file, write, flush_ms=60000)
+    queue.put([(1, "2024-03-01", 2), (2, "2024-03-01", 4)])
+    queue.put([(1, "2024-03-01", 5), (1, "2024-03-02", 1)])
+    assert queue.sell_num(1, "2024-03-01") == 5
+    with open(journal_file, encoding="utf-8") as journal:
+        assert len(journal.readlines()) == 2
+    queue.flush()
+    assert write.batches == [[(1, "2024-03-01", 5), (1, "2024-03-02", 1), (2, "2024-03-01", 4)]]
+    assert queue.sell_num(1, "2024-03-01") is None
+    assert not os.path.exists(journal_file)
+
+
+def test_recover_replays_the_journal(app, journal_file):
+    with open(journal_file, "w", encoding="utf-8") as journal:
+        journal.write(json.dumps([[1, "2024-03-01", 2], [2, "2024-03-01", 4]]) + "\n")
+        journal.write(json.dumps([[1, "2024-03-01", 3]]) + "\n")
+        # Cut off by the crash
+        journal.write('[[3, "2024-03-0')
+    write = FakeWrite()
+    queue = SalesWriteQueue(journal_file, write, flush_ms=60000)
+    assert queue.recover() == 3
+    assert write.stored == {(1, "2024-03-01"): 3, (2, "2024-03-01"): 4}
+    assert not os.path.exists(journal_file)
+
+
+def test_failed_batch_is_retried_date_by_date(app, journal_file):
+    write = FakeWrite(fail_date="2024-03-02")
+    queue = SalesWriteQueue(journal_file, write, flush_ms=60000)
+    errors = []
+    queue.write_failed.connect(errors.append)
+    queue.put([(1, "2024-03-01", 2), (1, "2024-03-02", 4), (2, "2024-03-02", 6), (1, "2024-03-03", 8)])
+    write_all(queue)
+    assert write.stored == {(1, "2024-03-01"): 2, (1, "2024-03-03"): 8}
+    assert len(errors) == 1 and errors[0].startswith("2 条流水未能保存")
+    assert not queue.by_date
+    assert not os.path.exists(journal_file)
+    # Back to one batch for every date
+    queue.put([(1, "2024-03-04", 1), (1, "2024-03-05", 1)])
+    queue.flush()
+    assert write.batches[-1] == [(1, "2024-03-04", 1), (1, "2024-03-05", 1)]
+
+
+def test_worker_reports_errors_without_on_error(app, tmp_path):
+    db_file = tmp_path / "bad.db"
+    db_file.write_bytes(b"garbage" * 500)
+    worker = DatabaseWorker(str(db_file), readers=0)
+    spy = QSignalSpy(worker.failed)
+    try:
+        assert spy.wait(5000)
+        assert "not a database" in spy[0][0]
+        worker.submit(None, lambda connection: None)
+        assert spy.wait(5000)
+        assert "not a database" in spy[1][0]
+    finally:
+        worker.stop()
+
+
+def test_task_reports_the_error_it_failed_with(app, tmp_path):
+    def fail(connection, progress):
+        raise KeyError()
+
+    task = DatabaseTask(str(tmp_path / "restaurant.db"), fail)
+    spy = QSignalSpy(task.failed)
+    task.start()
+    assert spy.wait(5000)
+    task.wait()
+    assert spy[0][0] == "KeyError()"
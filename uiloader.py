@@ -0,0 +1,63 @@
+"""
+Set up widgets from the Qt Designer files, using the Python modules compiled from them ahead of time.
+
+    python uiloader.py
+
+compiles every .ui file next to it into <name>_ui.py. A compiled module records the hash of the .ui file it
+was made from; when the .ui file was edited since, or the module is missing, setup_ui falls back to parsing the
+.ui file with uic.loadUi, so the designs can be changed during development without recompiling.
+"""
+import glob
+import hashlib
+import importlib
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def source_hash(ui_file):
+    with open(ui_file, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def compiled_module_name(ui_file):
+    return os.path.splitext(os.path.basename(ui_file))[0] + "_ui"
+
+
+def compiled_ui_class(ui_file):
+    # None unless a compiled module of the current .ui file exists
+    try:
+        module = importlib.import_module(compiled_module_name(ui_file))
+    except ImportError:
+        return None
+    if getattr(module, "UI_SOURCE_SHA1", None) != source_hash(ui_file):
+        return None
+    return next((value for name, value in vars(module).items() if name.startswith("Ui_")), None)
+
+
+def setup_ui(widget, ui_file):
+    """Like uic.loadUi(ui_file, widget): build the design into widget and set its children as attributes."""
+    ui_class = compiled_ui_class(ui_file)
+    if ui_class is None:
+        from PyQt5 import uic
+        uic.loadUi(ui_file, widget)
+        return widget
+    ui = ui_class()
+    ui.setupUi(widget)
+    for name, child in vars(ui).items():
+        setattr(widget, name, child)
+    return widget
+
+
+def compile_ui(ui_file):
+    from PyQt5 import uic
+    module_file = os.path.join(os.path.dirname(ui_file), compiled_module_name(ui_file) + ".py")
+    with open(module_file, "w", encoding="utf-8") as file:
+        uic.compileUi(ui_file, file)
+        file.write("\n\nUI_SOURCE_SHA1 = \"{}\"\n".format(source_hash(ui_file)))
+    return module_file
+
+
+if __name__ == "__main__":
+    for ui_file in sorted(glob.glob(os.path.join(BASE_DIR, "*.ui"))):
+        print("{} -> {}".format(os.path.basename(ui_file), os.path.basename(compile_ui(ui_file))))
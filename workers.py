@@ -0,0 +1,408 @@
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+
+from PyQt5.QtCore import Qt, QObject, QThread, QMetaObject, QEventLoop, QTimer, pyqtSignal, pyqtSlot
+
+import database
+import diagnostics
+
+
+class DatabaseTask(QThread):
+    """
+    Run func(connection, *args, progress=...) on its own thread with its own connection to db_file.
+
+    sqlite3 connections cannot be shared between threads, so the task connects when it starts and closes the
+    connection when func returns. The result, or the error message, is delivered by signal on the GUI thread.
+    connect() opens a different connection, a read-only one for instance, instead of database.connect(db_file).
+    cancel() interrupts the statement func is running, the task then emits cancelled instead of failed.
+    """
+    progress = pyqtSignal(int)
+    succeeded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+
+    def __init__(self, db_file, func, *args, parent=None, connect=None):
+        super(DatabaseTask, self).__init__(parent)
+        self.db_file = db_file
+        self.func = func
+        self.args = args
+        self.connect = connect or (lambda: database.connect(db_file))
+        # Only the connection of db_file is written to and has a WAL to checkpoint
+        self.writes = connect is None
+        self.connection = None
+
+    def run(self):
+        try:
+            connection = self.connection = self.connect()
+            try:
+                if self.isInterruptionRequested():
+                    raise sqlite3.OperationalError("interrupted")
+                with diagnostics.Request(self.func.__name__):
+                    result = self.func(connection, *self.args, progress=self.progress.emit)
+                if self.writes:
+                    database.checkpoint(connection, database.WAL_CHECKPOINT_BYTES)
+            finally:
+                self.connection = None
+                connection.close()
+        except Exception as error:
+            if self.isInterruptionRequested():
+                self.cancelled.emit()
+                return
+            self.failed.emit(str(error) or repr(error))
+        else:
+            self.succeeded.emit(result)
+
+    def cancel(self):
+        self.requestInterruption()
+        connection = self.connection
+        if connection is not None:
+            connection.interrupt()
+
+
+class QueryRunner(QObject):
+    """Executes requests on its own thread with the connection it owns, see DatabaseWorker."""
+    requested = pyqtSignal(int, object, object)
+    opened = pyqtSignal()
+    open_failed = pyqtSignal(str)
+    done = pyqtSignal(int, object, str)
+
+    def __init__(self, connect, latest, on_connect=None, writer=False):
+        super(QueryRunner, self).__init__()
+        self.connect = connect
+        self.on_connect = on_connect
+        self.writer = writer
+        self.connection = None
+        self.open_error = ""
+        # Latest request id per key, shared with the GUI thread and the other runners; requests no longer in it
+        # are stale
+        self.latest = latest
+        self.current_key = None
+        # Requests sent to this runner and not answered yet, counted on the GUI thread
+        self.pending = 0
+        self.runner_thread = None
+        self.requested.connect(self.run)
+
+    @pyqtSlot()
+    def open(self):
+        try:
+            self.connection = self.connect()
+            if self.on_connect is not None:
+                self.on_connect(self.connection)
+        except sqlite3.Error as error:
+            # Every request fails with this instead
+            self.connection = None
+            self.open_error = str(error) or repr(error)
+            self.open_failed.emit(self.open_error)
+            return
+        self.opened.emit()
+
+    @pyqtSlot()
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    @pyqtSlot(int, object, object)
+    def run(self, request_id, key, func):
+        if key is not None and self.latest.get(key) != request_id:
+            self.done.emit(request_id, None, DatabaseWorker.CANCELLED)
+            return
+        if self.connection is None:
+            self.done.emit(request_id, None, self.open_error or "The database is closed")
+            return
+        self.current_key = key
+        try:
+            with diagnostics.Request("write" if key is None else key):
+                result = func(self.connection)
+        except sqlite3.OperationalError as error:
+            if self.connection.in_transaction:
+                self.connection.rollback()
+            stale = key is not None and self.latest.get(key) != request_id
+            self.done.emit(request_id, None, DatabaseWorker.CANCELLED if stale else str(error) or repr(error))
+        except Exception as error:
+            if self.connection.in_transaction:
+                self.connection.rollback()
+            self.done.emit(request_id, None, str(error) or repr(error))
+        else:
+            self.done.emit(request_id, result, "")
+        finally:
+            self.current_key = None
+        if self.writer and key is None:
+            # Between writes, so the WAL is copied back while nothing waits on this connection
+            database.checkpoint(self.connection, database.WAL_CHECKPOINT_BYTES)
+
+
+class DatabaseWorker(QObject):
+    """
+    Runs database requests off the GUI thread: writes one after the other on a dedicated writer thread, reads
+    on a pool of read-only connections, each on its own thread, which WAL lets run alongside the writer.
+
+    submit(key, func, on_result) queues func(connection) and calls on_result(result) on the GUI thread, or
+    on_error(message) if it raised. A newer request with the same key makes older ones stale: they are skipped if
+    still queued, interrupted if running, and their results are dropped. Requests with key None, the writes, are
+    never dropped. A read sees every write submitted before it: while writes are queued, reads queue behind them on
+    the writer, and a read that overlapped a write is run again before its result is delivered.
+
+    Given a branch_set (see branches.py) every connection reads the branches together instead of db_file.
+    failed carries the errors nobody else hears of: of the requests without on_error, and of opening a connection.
+    """
+    CANCELLED = "cancelled"
+    READERS = 2
+    busy_changed = pyqtSignal(bool)
+    failed = pyqtSignal(str)
+
+    def __init__(self, db_file, on_connect=None, readers=READERS, parent=None, branch_set=None):
+        super(DatabaseWorker, self).__init__(parent)
+        self.db_file = db_file
+        self.branch_set = branch_set
+        self.on_connect = on_connect
+        self.reader_count = readers
+        self.callbacks = {}
+        self.next_request_id = 0
+        # Writes answered so far, a read that saw this change while it ran may have missed one
+        self.writes_done = 0
+        self.latest = {}
+        self.stopped = False
+        self.writer = self.start_runner(QueryRunner(
+            branch_set.connect if branch_set is not None else lambda: database.connect(db_file), self.latest,
+            on_connect, writer=True))
+        # Readers open once the writer has created or upgraded the schema
+        self.readers = []
+        self.writer.opened.connect(self.start_readers)
+
+    def start_runner(self, runner):
+        runner.runner_thread = QThread(self)
+        runner.moveToThread(runner.runner_thread)
+        runner.runner_thread.started.connect(runner.open)
+        runner.done.connect(self.request_done)
+        runner.open_failed.connect(self.failed)
+        runner.runner_thread.start()
+        return runner
+
+    def start_readers(self):
+        if self.stopped:
+            return
+        for _ in range(self.reader_count - len(self.readers)):
+            self.readers.append(self.start_runner(QueryRunner(
+                self.branch_set.connect if self.branch_set is not None else
+                lambda: database.connect_readonly(self.db_file), self.latest, self.on_connect)))
+
+    def pick_runner(self, key):
+        if key is None or self.writer.pending or not self.readers:
+            return self.writer
+        return min(self.readers, key=lambda runner: runner.pending)
+
+    def submit(self, key, func, on_result=None, on_error=None):
+        self.next_request_id += 1
+        request_id = self.next_request_id
+        if key is not None:
+            self.latest[key] = request_id
+            for runner in [self.writer] + self.readers:
+                if runner.current_key == key and runner.connection is not None:
+                    # The running query of this key is stale now
+                    runner.connection.interrupt()
+        if not self.callbacks:
+            self.busy_changed.emit(True)
+        runner = self.pick_runner(key)
+        runner.pending += 1
+        self.callbacks[request_id] = (key, func, on_result, on_error, self.writes_done)
+        runner.requested.emit(request_id, key, func)
+        return request_id
+
+    def query(self, key, sql, params=(), on_result=None, on_error=None):
+        return self.submit(key, lambda connection: connection.execute(sql, params).fetchall(), on_result, on_error)
+
+    def cancel(self, key):
+        self.latest.pop(key, None)
+
+    def is_busy(self):
+        return bool(self.callbacks)
+
+    @pyqtSlot(int, object, str)
+    def request_done(self, request_id, result, error):
+        runner = self.sender()
+        runner.pending -= 1
+        key, func, on_result, on_error, writes_done = self.callbacks.pop(request_id, (None, None, None, None, 0))
+        if runner.writer and key is None:
+            self.writes_done += 1
+        elif runner is not self.writer and writes_done != self.writes_done and error != self.CANCELLED:
+            # The read ran alongside a write and may not have seen it, run it again after the write
+            runner = self.pick_runner(key)
+            runner.pending += 1
+            self.callbacks[request_id] = (key, func, on_result, on_error, self.writes_done)
+            runner.requested.emit(request_id, key, func)
+            return
+        if not self.callbacks:
+            self.busy_changed.emit(False)
+        if error == self.CANCELLED:
+            return
+        if error:
+            if on_error is not None:
+                on_error(error)
+            else:
+                self.failed.emit(error)
+        elif on_result is not None:
+            on_result(result)
+
+    def stop(self):
+        # Finish the queued requests, then close the connections on their own threads, the writer last
+        self.stopped = True
+        for runner in self.readers + [self.writer]:
+            if runner.runner_thread.isRunning():
+                QMetaObject.invokeMethod(runner, "close", Qt.BlockingQueuedConnection)
+            runner.runner_thread.quit()
+            runner.runner_thread.wait()
+
+
+class SalesWriteQueue(QObject):
+    """
+    Write-behind queue of the sales entered in the app, (dish_id, date, sell_num) records.
+
+    put() coalesces them by (dish_id, date), the last number wins, and flush() hands what is waiting to
+    write(records, on_result, on_error), which stores it in one transaction: flush_ms after the first record was put,
+    or at once when max_pending are waiting. One batch is written at a time; when one of several dates fails, they
+    are written again date by date, so only the sales of the failing date are dropped and reported.
+
+    Every put is appended to the journal file and synced to disk before it returns, and the journal is emptied once
+    what it holds is in the database. After a crash of the app, the operating system or the power, recover() writes
+    what it still holds.
+    """
+    FLUSH_MS = 1000
+    MAX_PENDING = 256
+    # After each batch, written or failed
+    flushed = pyqtSignal()
+    write_failed = pyqtSignal(str)
+
+    def __init__(self, journal_file, write, flush_ms=FLUSH_MS, max_pending=MAX_PENDING, parent=None):
+        super(SalesWriteQueue, self).__init__(parent)
+        self.journal_file = journal_file
+        self.write = write
+        self.max_pending = max_pending
+        # sell_num by (dish_id, date), of the records waiting and of the batch being written
+        self.pending = OrderedDict()
+        self.writing = {}
+        # Write one date per batch, after a batch of several dates failed
+        self.by_date = False
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(int(flush_ms))
+        self.timer.timeout.connect(self.flush)
+
+    def put(self, records, journal=True):
+        records = [(int(dish_id), date, int(sell_num)) for dish_id, date, sell_num in records]
+        if journal:
+            with open(self.journal_file, "a", encoding="utf-8") as journal_file:
+                journal_file.write(json.dumps(records) + "\n")
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+        for dish_id, date, sell_num in records:
+            self.pending[(dish_id, date)] = sell_num
+        self.schedule()
+
+    def schedule(self):
+        if len(self.pending) >= self.max_pending:
+            self.flush()
+        elif self.pending and not self.timer.isActive():
+            self.timer.start()
+
+    def sell_num(self, dish_id, date):
+        # The number still to be written for (dish_id, date), None if there is none
+        key = (int(dish_id), date)
+        return self.pending.get(key, self.writing.get(key))
+
+    def discard_dish(self, dish_id):
+        # The dish is being deleted, its sales would only make the batch fail
+        for key in [key for key in self.pending if key[0] == int(dish_id)]:
+            del self.pending[key]
+        self.rewrite_journal()
+
+    def flush(self):
+        self.timer.stop()
+        if self.writing or not self.pending:
+            return
+        if self.by_date:
+            date = next(iter(self.pending))[1]
+            self.writing = {key: sell_num for key, sell_num in self.pending.items() if key[1] == date}
+            for key in self.writing:
+                del self.pending[key]
+        else:
+            self.writing = dict(self.pending)
+            self.pending.clear()
+        records = [(dish_id, date, sell_num) for (dish_id, date), sell_num in self.writing.items()]
+        self.write(records, self.written, self.failed)
+
+    def written(self, result=None):
+        self.writing = {}
+        self.by_date = self.by_date and bool(self.pending)
+        self.rewrite_journal()
+        self.flushed.emit()
+        self.schedule()
+
+    def failed(self, error):
+        if len({date for _, date in self.writing}) > 1:
+            # Find the date that fails, the others are written
+            self.pending = OrderedDict(list(self.writing.items()) + list(self.pending.items()))
+            self.writing = {}
+            self.by_date = True
+            self.flush()
+            return
+        # Retrying would fail the same way, as for a sale of an archived year; the records are dropped and reported
+        records = len(self.writing)
+        self.writing = {}
+        self.by_date = self.by_date and bool(self.pending)
+        self.rewrite_journal()
+        self.write_failed.emit("{} 条流水未能保存：{}".format(records, error))
+        self.flushed.emit()
+        self.schedule()
+
+    def rewrite_journal(self):
+        # Down to the records not in the database yet
+        records = [(dish_id, date, sell_num) for (dish_id, date), sell_num in
+                   list(self.writing.items()) + list(self.pending.items())]
+        if not records:
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+            return
+        with open(self.journal_file + ".tmp", "w", encoding="utf-8") as journal_file:
+            journal_file.write(json.dumps(records) + "\n")
+            # On disk before it replaces the journal, or a power cut could leave neither of them
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+        os.replace(self.journal_file + ".tmp", self.journal_file)
+
+    def recover(self):
+        """Write what the journal holds from before a crash, returns the number of records."""
+        records = []
+        try:
+            with open(self.journal_file, encoding="utf-8") as journal_file:
+                for line in journal_file:
+                    try:
+                        records.extend(json.loads(line))
+                    except ValueError:
+                        # The last line may have been cut off by the crash
+                        continue
+        except FileNotFoundError:
+            return 0
+        self.put(records, journal=False)
+        self.flush()
+        return len(records)
+
+    def drain(self, timeout_ms=(database.WRITE_TIMEOUT + 5) * 1000):
+        """Write everything queued before returning, e.g. before the app quits or the worker is replaced."""
+        loop = QEventLoop()
+        self.flushed.connect(loop.quit)
+        deadline = QTimer()
+        deadline.setSingleShot(True)
+        deadline.timeout.connect(loop.quit)
+        try:
+            while self.pending or self.writing:
+                self.flush()
+                deadline.start(timeout_ms)
+                loop.exec_()
+                if not deadline.isActive():
+                    return False
+        finally:
+            self.flushed.disconnect(loop.quit)
+        return True